@@ -0,0 +1,65 @@
+"""Add `offer_booking_count` table and the trigger that maintains it
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# pre/post deployment: pre
+# revision identifiers, used by Alembic.
+revision = "a62669c337d8"
+down_revision = "e0d7e16bcbaa"
+branch_labels: tuple[str] | None = None
+depends_on: list[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "offer_booking_count",
+        sa.Column("offerId", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("count", sa.Integer(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["offerId"], ["offer.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("offerId", "day"),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_offer_booking_count()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            delta integer := 0;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.status != 'CANCELLED' THEN
+                    delta := 1;
+                END IF;
+            ELSIF OLD.status = 'CANCELLED' AND NEW.status != 'CANCELLED' THEN
+                delta := 1;
+            ELSIF OLD.status != 'CANCELLED' AND NEW.status = 'CANCELLED' THEN
+                delta := -1;
+            END IF;
+
+            IF delta != 0 THEN
+                INSERT INTO offer_booking_count ("offerId", day, count)
+                SELECT stock."offerId", NEW."dateCreated"::date, delta FROM stock WHERE stock.id = NEW."stockId"
+                ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER booking_offer_booking_count
+        AFTER INSERT OR UPDATE OF status ON booking
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_offer_booking_count()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS booking_offer_booking_count ON booking")
+    op.execute("DROP FUNCTION IF EXISTS update_offer_booking_count")
+    op.drop_table("offer_booking_count")
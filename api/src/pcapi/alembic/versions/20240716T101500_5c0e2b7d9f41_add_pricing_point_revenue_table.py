@@ -0,0 +1,120 @@
+"""Add `pricing_point_revenue` table and the triggers that maintain it
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# pre/post deployment: pre
+# revision identifiers, used by Alembic.
+revision = "5c0e2b7d9f41"
+down_revision = "a62669c337d8"
+branch_labels: tuple[str] | None = None
+depends_on: list[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pricing_point_revenue",
+        sa.Column("pricingPointId", sa.BigInteger(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.BigInteger(), server_default="0", nullable=False),
+        sa.ForeignKeyConstraint(["pricingPointId"], ["venue.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("pricingPointId", "year"),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_pricing_point_revenue()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            old_is_counted boolean := false;
+            new_is_counted boolean := false;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                old_is_counted := OLD."bookingId" IS NOT NULL AND OLD.status NOT IN ('cancelled', 'rejected');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                new_is_counted := NEW."bookingId" IS NOT NULL AND NEW.status NOT IN ('cancelled', 'rejected');
+            END IF;
+
+            IF TG_OP = 'UPDATE' AND old_is_counted = new_is_counted AND (
+                NOT old_is_counted OR (
+                    OLD."bookingId" = NEW."bookingId"
+                    AND OLD."pricingPointId" = NEW."pricingPointId"
+                    AND EXTRACT(YEAR FROM timezone('Europe/Paris', timezone('UTC', OLD."valueDate")))::integer
+                        = EXTRACT(YEAR FROM timezone('Europe/Paris', timezone('UTC', NEW."valueDate")))::integer
+                )
+            ) THEN
+                -- e.g. a pricing that is processed, then invoiced
+                RETURN NULL;
+            END IF;
+
+            IF old_is_counted THEN
+                INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+                SELECT
+                    OLD."pricingPointId",
+                    EXTRACT(YEAR FROM timezone('Europe/Paris', timezone('UTC', OLD."valueDate")))::integer,
+                    -(booking.amount * booking.quantity * 100)::bigint
+                FROM booking WHERE booking.id = OLD."bookingId"
+                ON CONFLICT ("pricingPointId", year)
+                DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+            END IF;
+            IF new_is_counted THEN
+                INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+                SELECT
+                    NEW."pricingPointId",
+                    EXTRACT(YEAR FROM timezone('Europe/Paris', timezone('UTC', NEW."valueDate")))::integer,
+                    (booking.amount * booking.quantity * 100)::bigint
+                FROM booking WHERE booking.id = NEW."bookingId"
+                ON CONFLICT ("pricingPointId", year)
+                DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER pricing_update_pricing_point_revenue
+        AFTER INSERT OR DELETE OR UPDATE OF status, "bookingId", "pricingPointId", "valueDate" ON pricing
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_pricing_point_revenue()
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_pricing_point_revenue_on_booking_amount()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+            SELECT
+                pricing."pricingPointId",
+                EXTRACT(YEAR FROM timezone('Europe/Paris', timezone('UTC', pricing."valueDate")))::integer,
+                ((NEW.amount * NEW.quantity - OLD.amount * OLD.quantity) * 100)::bigint
+            FROM pricing
+            WHERE pricing."bookingId" = NEW.id AND pricing.status NOT IN ('cancelled', 'rejected')
+            ON CONFLICT ("pricingPointId", year)
+            DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER booking_update_pricing_point_revenue
+        AFTER UPDATE OF amount, quantity ON booking
+        FOR EACH ROW
+        WHEN (OLD.amount * OLD.quantity IS DISTINCT FROM NEW.amount * NEW.quantity)
+        EXECUTE PROCEDURE update_pricing_point_revenue_on_booking_amount()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS booking_update_pricing_point_revenue ON booking")
+    op.execute("DROP FUNCTION IF EXISTS update_pricing_point_revenue_on_booking_amount")
+    op.execute("DROP TRIGGER IF EXISTS pricing_update_pricing_point_revenue ON pricing")
+    op.execute("DROP FUNCTION IF EXISTS update_pricing_point_revenue")
+    op.drop_table("pricing_point_revenue")
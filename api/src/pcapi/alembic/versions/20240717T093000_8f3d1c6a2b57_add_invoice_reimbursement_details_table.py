@@ -0,0 +1,37 @@
+"""Add `invoice_reimbursement_details` table
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# pre/post deployment: pre
+# revision identifiers, used by Alembic.
+revision = "8f3d1c6a2b57"
+down_revision = "5c0e2b7d9f41"
+branch_labels: tuple[str] | None = None
+depends_on: list[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "invoice_reimbursement_details",
+        sa.Column("invoiceId", sa.BigInteger(), nullable=False),
+        sa.Column("cashflowBatchId", sa.BigInteger(), nullable=False),
+        sa.Column("rows", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.ForeignKeyConstraint(["cashflowBatchId"], ["cashflow_batch.id"]),
+        sa.ForeignKeyConstraint(["invoiceId"], ["invoice.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("invoiceId"),
+    )
+    op.create_index(
+        op.f("ix_invoice_reimbursement_details_cashflowBatchId"),
+        "invoice_reimbursement_details",
+        ["cashflowBatchId"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_invoice_reimbursement_details_cashflowBatchId"), table_name="invoice_reimbursement_details")
+    op.drop_table("invoice_reimbursement_details")
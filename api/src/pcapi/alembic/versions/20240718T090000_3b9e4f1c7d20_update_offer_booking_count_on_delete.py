@@ -0,0 +1,102 @@
+"""Update `offer_booking_count` when bookings are deleted or moved to another stock
+"""
+
+from alembic import op
+
+
+# pre/post deployment: pre
+# revision identifiers, used by Alembic.
+revision = "3b9e4f1c7d20"
+down_revision = "8f3d1c6a2b57"
+branch_labels: tuple[str] | None = None
+depends_on: list[str] | None = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_offer_booking_count()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            old_is_counted boolean := false;
+            new_is_counted boolean := false;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                old_is_counted := OLD.status != 'CANCELLED';
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                new_is_counted := NEW.status != 'CANCELLED';
+            END IF;
+
+            IF TG_OP = 'UPDATE' AND old_is_counted = new_is_counted AND (
+                NOT old_is_counted OR (
+                    OLD."stockId" = NEW."stockId" AND OLD."dateCreated"::date = NEW."dateCreated"::date
+                )
+            ) THEN
+                -- e.g. a booking that is used
+                RETURN NULL;
+            END IF;
+
+            IF old_is_counted THEN
+                INSERT INTO offer_booking_count ("offerId", day, count)
+                SELECT stock."offerId", OLD."dateCreated"::date, -1 FROM stock WHERE stock.id = OLD."stockId"
+                ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+            END IF;
+            IF new_is_counted THEN
+                INSERT INTO offer_booking_count ("offerId", day, count)
+                SELECT stock."offerId", NEW."dateCreated"::date, 1 FROM stock WHERE stock.id = NEW."stockId"
+                ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS booking_offer_booking_count ON booking")
+    op.execute(
+        """
+        CREATE TRIGGER booking_offer_booking_count
+        AFTER INSERT OR DELETE OR UPDATE OF status, "stockId", "dateCreated" ON booking
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_offer_booking_count()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION update_offer_booking_count()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            delta integer := 0;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.status != 'CANCELLED' THEN
+                    delta := 1;
+                END IF;
+            ELSIF OLD.status = 'CANCELLED' AND NEW.status != 'CANCELLED' THEN
+                delta := 1;
+            ELSIF OLD.status != 'CANCELLED' AND NEW.status = 'CANCELLED' THEN
+                delta := -1;
+            END IF;
+
+            IF delta != 0 THEN
+                INSERT INTO offer_booking_count ("offerId", day, count)
+                SELECT stock."offerId", NEW."dateCreated"::date, delta FROM stock WHERE stock.id = NEW."stockId"
+                ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS booking_offer_booking_count ON booking")
+    op.execute(
+        """
+        CREATE TRIGGER booking_offer_booking_count
+        AFTER INSERT OR UPDATE OF status ON booking
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_offer_booking_count()
+        """
+    )
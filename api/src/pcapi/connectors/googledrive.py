@@ -37,6 +37,11 @@ from pcapi import settings
 from pcapi.utils.module_loading import import_string
 
 
+# Files are uploaded by chunks of this size, so that they are never
+# loaded in memory all at once.
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024  # bytes
+
+
 def get_backend() -> "BaseBackend":
     backend_class = import_string(settings.GOOGLE_DRIVE_BACKEND)
     return backend_class()
@@ -163,7 +168,7 @@ class GoogleDriveBackend(BaseBackend):
                 "parents": [parent_folder_id],
                 "name": name,
             },
-            media_body=MediaFileUpload(filename=str(local_path)),
+            media_body=MediaFileUpload(filename=str(local_path), chunksize=UPLOAD_CHUNK_SIZE, resumable=True),
             fields="id",  # yes, it's a string, not a list
             supportsAllDrives=True,
         )
@@ -7,6 +7,7 @@ import typing
 from flask import current_app
 import sentry_sdk
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import joinedload
 
 from pcapi.connectors.ems import EMSAPIException
@@ -17,6 +18,7 @@ from pcapi.core.bookings.models import BookingCancellationReasons
 from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.bookings.models import BookingValidationAuthorType
 from pcapi.core.bookings.models import ExternalBooking
+from pcapi.core.bookings.models import OfferBookingCount
 from pcapi.core.bookings.repository import generate_booking_token
 from pcapi.core.educational import utils as educational_utils
 from pcapi.core.educational.models import CollectiveBooking
@@ -394,6 +396,8 @@ def _book_cinema_external_ticket(booking: Booking, stock: Stock, beneficiary: Us
     except external_bookings_exceptions.ExternalBookingSoldOutError as exc:
         logger.exception("Could not book this offer as it's sold out.")
         raise exc
+    except external_bookings_exceptions.ExternalBookingUnavailableError:
+        raise  # already logged by the circuit breaker
     except Exception as exc:
         logger.exception("Could not book external ticket: %s", exc)
         raise external_bookings_exceptions.ExternalBookingException
@@ -882,6 +886,10 @@ def auto_mark_as_used_after_event() -> None:
     now = datetime.datetime.utcnow()
     threshold = now - constants.AUTO_USE_AFTER_EVENT_TIME_DELAY
 
+    if FeatureToggle.WIP_CHUNKED_AUTO_MARK_AS_USED.is_active():
+        _auto_mark_as_used_after_event_by_chunks(now, threshold)
+        return
+
     # Revisit with SQLAlchemy 2.
     #
     # I tried to update and select bookings in a single query, like this:
@@ -996,6 +1004,149 @@ def auto_mark_as_used_after_event() -> None:
     )
 
 
+# Mark a chunk of bookings as used and add their finance events, like
+# `finance_api.add_event()` does. Table aliases allow the same query to
+# be used for individual and collective bookings.
+# IMPORTANT: if you change how `pricingOrderingDate` is computed, you
+# must also adapt `finance_api.get_pricing_ordering_date()`.
+_AUTO_MARK_AS_USED_CHUNK_QUERY = """
+  WITH candidate AS (
+    SELECT booking.id
+    FROM {booking_table} AS booking
+    JOIN {stock_table} AS stock ON stock.id = booking."{stock_id_column}"
+    WHERE
+      booking.status = :confirmed
+      AND stock."beginningDatetime" < :threshold
+      AND booking.id > :last_id
+    ORDER BY booking.id
+    LIMIT :chunk_size
+    FOR UPDATE OF booking
+  ),
+  used AS (
+    UPDATE {booking_table} AS booking
+    SET {set_clause}
+    FROM candidate
+    WHERE booking.id = candidate.id
+    RETURNING booking.id, booking."venueId", booking."{stock_id_column}" AS "stockId", booking."dateUsed"
+  ),
+  new_event AS (
+    INSERT INTO finance_event (
+      "{event_booking_column}", status, motive, "valueDate", "venueId", "pricingPointId", "pricingOrderingDate"
+    )
+    SELECT
+      used.id,
+      CASE WHEN link."pricingPointId" IS NULL THEN :event_status_pending ELSE :event_status_ready END,
+      :event_motive,
+      used."dateUsed",
+      used."venueId",
+      link."pricingPointId",
+      CASE WHEN link."pricingPointId" IS NOT NULL THEN greatest(
+        lower(link.timespan),
+        coalesce(stock."{stock_datetime}", used."dateUsed"),
+        used."dateUsed"
+      ) END
+    FROM used
+    JOIN {stock_table} AS stock ON stock.id = used."stockId"
+    LEFT JOIN venue_pricing_point_link AS link
+      ON link."venueId" = used."venueId" AND link.timespan @> used."dateUsed"
+  )
+  SELECT used.id, used."stockId" FROM used ORDER BY used.id
+"""
+
+
+def _auto_mark_as_used_after_event_by_chunks(now: datetime.datetime, threshold: datetime.datetime) -> None:
+    """Mark bookings as used and add their finance events by chunks of
+    bookings (in id order), with a single statement per chunk.
+
+    Each chunk is committed on its own, so that memory use does not
+    depend on the number of bookings. If it stops before its end, this
+    can be run again: remaining bookings are still confirmed.
+    """
+    if FeatureToggle.USE_END_DATE_FOR_COLLECTIVE_PRICING.is_active():
+        collective_stock_datetime = "endDatetime"
+    else:
+        collective_stock_datetime = "beginningDatetime"
+    params = {
+        "now": now,
+        "threshold": threshold,
+        "event_status_pending": finance_models.FinanceEventStatus.PENDING.value,
+        "event_status_ready": finance_models.FinanceEventStatus.READY.value,
+        "event_motive": finance_models.FinanceEventMotive.BOOKING_USED.value,
+        "chunk_size": constants.AUTO_USE_AFTER_EVENT_CHUNK_SIZE,
+    }
+
+    individual_query = sa.text(
+        _AUTO_MARK_AS_USED_CHUNK_QUERY.format(
+            booking_table="booking",
+            stock_table="stock",
+            stock_id_column="stockId",
+            stock_datetime="beginningDatetime",
+            event_booking_column="bookingId",
+            set_clause='"dateUsed" = :now, status = :used, "validationAuthorType" = :validation_author_type',
+        )
+    )
+    individual_params = params | {
+        "confirmed": BookingStatus.CONFIRMED.value,
+        "used": BookingStatus.USED.value,
+        "validation_author_type": BookingValidationAuthorType.AUTO.value,
+    }
+    n_individual_bookings_updated = 0
+    for rows in _execute_auto_mark_as_used_chunks(individual_query, individual_params):
+        n_individual_bookings_updated += len(rows)
+
+    collective_query = sa.text(
+        _AUTO_MARK_AS_USED_CHUNK_QUERY.format(
+            booking_table="collective_booking",
+            stock_table="collective_stock",
+            stock_id_column="collectiveStockId",
+            stock_datetime=collective_stock_datetime,
+            event_booking_column="collectiveBookingId",
+            set_clause='"dateUsed" = :now, status = :used',
+        )
+    )
+    collective_params = params | {
+        "confirmed": CollectiveBookingStatus.CONFIRMED.value,
+        "used": CollectiveBookingStatus.USED.value,
+    }
+    n_collective_bookings_updated = 0
+    for rows in _execute_auto_mark_as_used_chunks(collective_query, collective_params):
+        n_collective_bookings_updated += len(rows)
+        for booking_id, stock_id in rows:
+            educational_utils.log_information_for_data_purpose(
+                event_name="BookingUsed",
+                extra_data={"bookingId": booking_id, "stockId": stock_id},
+                uai=None,
+                user_role=None,
+            )
+
+    logger.info(
+        "Automatically marked bookings as used after event",
+        extra={
+            "dateUsed": now,
+            "individualBookingsUpdatedCount": n_individual_bookings_updated,
+            "collectiveBookingsUpdatedCount": n_collective_bookings_updated,
+        },
+    )
+
+
+def _execute_auto_mark_as_used_chunks(
+    query: sa.sql.elements.TextClause, params: dict
+) -> typing.Generator[list[tuple[int, int]], None, None]:
+    last_id = 0
+    while True:
+        result = db.session.execute(query, params | {"last_id": last_id})
+        rows = [(booking_id, stock_id) for booking_id, stock_id in result]
+        db.session.commit()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        logger.info(
+            "Automatically marked chunk of bookings as used after event",
+            extra={"first_booking": rows[0][0], "last_booking": last_id, "count": len(rows)},
+        )
+        yield rows
+
+
 def get_individual_bookings_from_stock(
     stock_id: int,
 ) -> typing.Generator[Booking, None, None]:
@@ -1043,6 +1194,73 @@ def archive_old_bookings() -> None:
     )
 
 
+def backfill_offer_booking_counts(days: int) -> None:
+    """(Re)compute the daily booking counts of offers from the booking
+    table, for the last `days` days (including today).
+
+    Counts are maintained by a trigger on the booking table: this is
+    only needed to initialize the table, or to fix it.
+
+    The booking table is not locked: each day is fixed in its own
+    transaction by adding to the stored count the difference between
+    the number of bookings and the stored count, both read from the
+    same snapshot. Increments of concurrent transactions are thus not
+    overwritten: they are in neither side of the difference, and the
+    update is applied on top of them.
+    """
+    first_day = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    fixed_rows = 0
+    for day in (first_day + datetime.timedelta(days=offset) for offset in range(days)):
+        booking_counts = (
+            sa.select(
+                Stock.offerId.label("offerId"),
+                sa.literal(day, sa.Date).label("day"),
+                sa.func.count(Booking.id).label("delta"),
+            )
+            .select_from(Booking)
+            .join(Booking.stock)
+            .filter(
+                Booking.dateCreated >= day,
+                Booking.dateCreated < day + datetime.timedelta(days=1),
+                Booking.status != BookingStatus.CANCELLED,
+            )
+            .group_by(Stock.offerId)
+        )
+        stored_counts = sa.select(
+            OfferBookingCount.offerId,
+            OfferBookingCount.day,
+            -OfferBookingCount.count,
+        ).filter(OfferBookingCount.day == day)
+        deltas = sa.union_all(booking_counts, stored_counts).subquery()
+        corrections = (
+            sa.select(deltas.c.offerId, deltas.c.day, sa.cast(sa.func.sum(deltas.c.delta), sa.Integer))
+            .group_by(deltas.c.offerId, deltas.c.day)
+            .having(sa.func.sum(deltas.c.delta) != 0)
+        )
+        insert = postgresql.insert(OfferBookingCount).from_select(["offerId", "day", "count"], corrections)
+        result = db.session.execute(
+            insert.on_conflict_do_update(
+                index_elements=[OfferBookingCount.offerId, OfferBookingCount.day],
+                set_={"count": OfferBookingCount.count + insert.excluded.count},
+            )
+        )
+        db.session.commit()
+        fixed_rows += result.rowcount
+
+    logger.info(
+        "Backfilled daily booking counts of offers",
+        extra={"first_day": first_day.isoformat(), "rows": fixed_rows},
+    )
+
+
+def delete_old_offer_booking_counts() -> None:
+    limit = datetime.datetime.utcnow().date() - constants.OFFER_BOOKING_COUNT_RETENTION_DELAY
+    deleted = OfferBookingCount.query.filter(OfferBookingCount.day < limit).delete(synchronize_session=False)
+    db.session.commit()
+
+    logger.info("Deleted old daily booking counts of offers", extra={"deleted": deleted})
+
+
 def cancel_unstored_external_bookings() -> None:
     """
     Cancel external bookings if we don't have a corresponding Booking object on our side.
@@ -1,5 +1,7 @@
 import logging
 
+import click
+
 import pcapi.scheduled_tasks.decorators as cron_decorators
 from pcapi.utils.blueprint import Blueprint
 
@@ -14,3 +16,15 @@ logger = logging.getLogger(__name__)
 @cron_decorators.log_cron_with_transaction
 def archive_old_bookings() -> None:
     api.archive_old_bookings()
+
+
+@blueprint.cli.command("delete_old_offer_booking_counts")
+@cron_decorators.log_cron_with_transaction
+def delete_old_offer_booking_counts() -> None:
+    api.delete_old_offer_booking_counts()
+
+
+@blueprint.cli.command("backfill_offer_booking_counts")
+@click.option("--days", help="Number of days to backfill (including today)", type=int, default=31)
+def backfill_offer_booking_counts(days: int) -> None:
+    api.backfill_offer_booking_counts(days)
@@ -13,6 +13,7 @@ class RedisExternalBookingType(str, enum.Enum):
 
 
 ARCHIVE_DELAY = datetime.timedelta(days=30)
+OFFER_BOOKING_COUNT_RETENTION_DELAY = datetime.timedelta(days=45)
 CONFIRM_BOOKING_AFTER_CREATION_DELAY = datetime.timedelta(hours=48)
 CONFIRM_BOOKING_BEFORE_EVENT_DELAY = datetime.timedelta(hours=48)
 BOOKINGS_AUTO_EXPIRY_DELAY = datetime.timedelta(days=30)
@@ -20,6 +21,7 @@ BOOKS_BOOKINGS_AUTO_EXPIRY_DELAY = datetime.timedelta(days=10)
 BOOKINGS_EXPIRY_NOTIFICATION_DELAY = datetime.timedelta(days=7)
 BOOKS_BOOKINGS_EXPIRY_NOTIFICATION_DELAY = datetime.timedelta(days=5)
 AUTO_USE_AFTER_EVENT_TIME_DELAY = datetime.timedelta(hours=48)
+AUTO_USE_AFTER_EVENT_CHUNK_SIZE = 1000
 REDIS_EXTERNAL_BOOKINGS_NAME = "api:external_bookings:barcodes"
 EXTERNAL_BOOKINGS_MINIMUM_ITEM_AGE_IN_QUEUE = 60
 ONE_SIDE_BOOKINGS_CANCELLATION_PROVIDERS = {"CDSStocks", "CGRStocks", "EMSStocks"}
@@ -1,3 +1,4 @@
+from datetime import date
 from datetime import datetime
 import decimal
 from decimal import Decimal
@@ -8,6 +9,7 @@ from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import DDL
+from sqlalchemy import Date
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import ForeignKey
@@ -503,3 +505,68 @@ Booking.trig_update_cancellationDate_on_isCancelled_ddl = f"""
     """
 
 event.listen(Booking.__table__, "after_create", DDL(Booking.trig_update_cancellationDate_on_isCancelled_ddl))
+
+
+class OfferBookingCount(Base, Model):
+    """Number of non-cancelled bookings of an offer, by day of creation
+    of the bookings.
+
+    This table is maintained by the `update_offer_booking_count`
+    trigger on the booking table. It is used to compute the number of
+    recent bookings of offers (see `pcapi.core.search`) without
+    scanning the booking table.
+    """
+
+    __tablename__ = "offer_booking_count"
+
+    offerId: int = Column(BigInteger, ForeignKey("offer.id", ondelete="CASCADE"), primary_key=True)
+    day: date = Column(Date, primary_key=True)
+    count: int = Column(Integer, nullable=False, server_default="0")
+
+
+OfferBookingCount.trig_ddl = f"""
+    CREATE OR REPLACE FUNCTION update_offer_booking_count()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        old_is_counted boolean := false;
+        new_is_counted boolean := false;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            old_is_counted := OLD.status != '{BookingStatus.CANCELLED.value}';
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            new_is_counted := NEW.status != '{BookingStatus.CANCELLED.value}';
+        END IF;
+
+        IF TG_OP = 'UPDATE' AND old_is_counted = new_is_counted AND (
+            NOT old_is_counted OR (
+                OLD."stockId" = NEW."stockId" AND OLD."dateCreated"::date = NEW."dateCreated"::date
+            )
+        ) THEN
+            -- e.g. a booking that is used
+            RETURN NULL;
+        END IF;
+
+        IF old_is_counted THEN
+            INSERT INTO offer_booking_count ("offerId", day, count)
+            SELECT stock."offerId", OLD."dateCreated"::date, -1 FROM stock WHERE stock.id = OLD."stockId"
+            ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+        END IF;
+        IF new_is_counted THEN
+            INSERT INTO offer_booking_count ("offerId", day, count)
+            SELECT stock."offerId", NEW."dateCreated"::date, 1 FROM stock WHERE stock.id = NEW."stockId"
+            ON CONFLICT ("offerId", day) DO UPDATE SET count = offer_booking_count.count + EXCLUDED.count;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS booking_offer_booking_count ON booking;
+    CREATE TRIGGER booking_offer_booking_count
+    AFTER INSERT OR DELETE OR UPDATE OF status, "stockId", "dateCreated" ON booking
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_offer_booking_count()
+    """
+
+# The trigger is set on the booking table, which must exist.
+event.listen(Booking.__table__, "after_create", DDL(OfferBookingCount.trig_ddl))
@@ -3,6 +3,7 @@ from datetime import date
 from datetime import datetime
 from datetime import time
 from datetime import timedelta
+from datetime import timezone
 from io import BytesIO
 from io import StringIO
 from operator import and_
@@ -21,6 +22,7 @@ from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.sql.elements import not_
+from sqlalchemy.sql.functions import Function
 from sqlalchemy.sql.functions import coalesce
 import xlsxwriter
 from xlsxwriter.format import Format
@@ -51,6 +53,11 @@ from pcapi.utils.token import random_token
 
 
 DUO_QUANTITY = 2
+EXPORT_BATCH_SIZE = 1000
+# Number of characters of CSV exports that are buffered before being sent.
+CSV_EXPORT_CHUNK_SIZE = 64 * 1024
+EXCEL_EXPORT_DATE_COLUMNS = (2, 8, 9, 14)
+EXCEL_EXPORT_AMOUNT_COLUMN = 12
 
 
 BOOKING_STATUS_LABELS = {
@@ -437,6 +444,65 @@ def get_export(
     return _serialize_csv_report(bookings_query)
 
 
+def export_bookings_by_offer_id_in_chunks(
+    offer_id: int,
+    event_beginning_date: date,
+    export_type: BookingExportType,
+    validated_only: bool = False,
+) -> typing.Iterator[bytes]:
+    """Like `export_bookings_by_offer_id()` (or
+    `export_validated_bookings_by_offer_id()`), but yield the encoded
+    export by chunks instead of building it in memory.
+
+    Excel exports are yielded in a single chunk, since the file can
+    only be compressed once all rows have been written.
+    """
+    query = _create_export_query(offer_id, event_beginning_date)
+    if validated_only:
+        query = query.filter(
+            or_(
+                and_(Booking.isConfirmed, Booking.status != BookingStatus.CANCELLED),
+                Booking.status == BookingStatus.USED,
+            )
+        )
+    rows = _iter_offer_export_rows(_with_venue_local_dates(query))
+    if export_type == BookingExportType.EXCEL:
+        yield _write_rows_to_excel(booking_export_header(), rows)
+    else:
+        yield from _stream_rows_to_csv(booking_export_header(), rows)
+
+
+def get_export_in_chunks(
+    user: User,
+    booking_period: tuple[date, date] | None = None,
+    status_filter: BookingStatusFilter | None = BookingStatusFilter.BOOKED,
+    event_date: date | None = None,
+    venue_id: int | None = None,
+    offer_id: int | None = None,
+    export_type: BookingExportType | None = BookingExportType.CSV,
+) -> typing.Iterator[bytes]:
+    """Like `get_export()`, but yield the encoded export by chunks
+    instead of building it in memory.
+    """
+    bookings_query = _get_filtered_booking_report(
+        pro_user=user,
+        period=booking_period,
+        status_filter=status_filter,
+        event_date=event_date,
+        venue_id=venue_id,
+        offer_id=offer_id,
+    )
+    bookings_query = _duplicate_booking_when_quantity_is_two(_with_venue_local_dates(bookings_query))
+    rows = (
+        _get_export_row(booking, "Oui" if booking.quantity == DUO_QUANTITY else "Non")
+        for booking in bookings_query.yield_per(EXPORT_BATCH_SIZE)
+    )
+    if export_type == BookingExportType.EXCEL:
+        yield _write_rows_to_excel(LEGACY_BOOKING_EXPORT_HEADER, rows)
+    else:
+        yield from _stream_rows_to_csv(LEGACY_BOOKING_EXPORT_HEADER, rows)
+
+
 # FIXME (Gautier, 03-25-2022): also used in collective_booking. SHould we move it to core or some other place?
 def field_to_venue_timezone(field: InstrumentedAttribute) -> cast:
     return cast(func.timezone(Venue.timezone, func.timezone("UTC", field)), Date)
@@ -836,6 +902,110 @@ def _serialize_excel_report(query: BaseQuery) -> bytes:
     return output.getvalue()
 
 
+def _field_to_venue_local_datetime(field: InstrumentedAttribute) -> Function:
+    return func.timezone(Venue.timezone, func.timezone("UTC", field))
+
+
+def _with_venue_local_dates(query: BaseQuery) -> BaseQuery:
+    """Add the dates of the export, converted by the database to the
+    timezone of the venue, to the columns of ``query``.
+    """
+    return query.add_columns(
+        _field_to_venue_local_datetime(Stock.beginningDatetime).label("localStockBeginningDatetime"),
+        _field_to_venue_local_datetime(Booking.dateCreated).label("localBookedAt"),
+        _field_to_venue_local_datetime(Booking.dateUsed).label("localUsedAt"),
+        _field_to_venue_local_datetime(Booking.reimbursementDate).label("localReimbursedAt"),
+    )
+
+
+def _to_aware_datetime(utc_datetime: datetime | None, local_datetime: datetime | None) -> datetime | None:
+    # The UTC offset of the venue at that date is the difference
+    # between both datetimes.
+    if local_datetime is None or utc_datetime is None:
+        return None
+    return local_datetime.replace(tzinfo=timezone(local_datetime - utc_datetime))
+
+
+def _get_export_row(booking: Booking, duo_column: str) -> tuple:
+    return (
+        booking.venueName,
+        booking.offerName,
+        _to_aware_datetime(booking.stockBeginningDatetime, booking.localStockBeginningDatetime),
+        booking.ean,
+        booking.beneficiaryFirstName,
+        booking.beneficiaryLastName,
+        booking.beneficiaryEmail,
+        booking.beneficiaryPhoneNumber,
+        _to_aware_datetime(booking.bookedAt, booking.localBookedAt),
+        _to_aware_datetime(booking.usedAt, booking.localUsedAt),
+        booking_recap_utils.get_booking_token(
+            booking.token,
+            booking.status,
+            booking.isExternal,
+            booking.stockBeginningDatetime,
+        ),
+        booking.priceCategoryLabel or "",
+        booking.amount,
+        _get_booking_status(booking.status, booking.isConfirmed),
+        _to_aware_datetime(booking.reimbursedAt, booking.localReimbursedAt),
+        serialize_offer_type_educational_or_individual(offer_is_educational=False),
+        booking.beneficiaryPostalCode or "",
+        duo_column,
+    )
+
+
+def _iter_offer_export_rows(query: BaseQuery) -> typing.Iterator[tuple]:
+    for booking in query.yield_per(EXPORT_BATCH_SIZE):
+        if booking.quantity == DUO_QUANTITY:
+            yield _get_export_row(booking, "DUO 1")
+            yield _get_export_row(booking, "DUO 2")
+        else:
+            yield _get_export_row(booking, "Non")
+
+
+def _stream_rows_to_csv(header: list[str], rows: typing.Iterable[tuple]) -> typing.Iterator[bytes]:
+    output = StringIO()
+    writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
+    output.write("\ufeff")  # same BOM as the "utf-8-sig" encoding of non-streamed exports
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if output.tell() >= CSV_EXPORT_CHUNK_SIZE:
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue().encode("utf-8")
+
+
+def _write_rows_to_excel(header: list[str], rows: typing.Iterable[tuple]) -> bytes:
+    # In "constant_memory" mode, each row is flushed to a temporary file
+    # once the next one is written: only the compressed file is kept in
+    # memory.
+    output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+
+    bold = workbook.add_format({"bold": 1})
+    currency_format = workbook.add_format({"num_format": "###0.00[$€-fr-FR]"})
+    col_width = 18
+
+    worksheet = workbook.add_worksheet()
+    for col_num, title in enumerate(header):
+        worksheet.write(0, col_num, title, bold)
+        worksheet.set_column(col_num, col_num, col_width)
+
+    for row_num, row in enumerate(rows, start=1):
+        for col_num, value in enumerate(row):
+            if col_num in EXCEL_EXPORT_DATE_COLUMNS:
+                worksheet.write(row_num, col_num, str(value))
+            elif col_num == EXCEL_EXPORT_AMOUNT_COLUMN:
+                worksheet.write(row_num, col_num, value, currency_format)
+            else:
+                worksheet.write(row_num, col_num, value)
+
+    workbook.close()
+    return output.getvalue()
+
+
 def get_soon_expiring_bookings(expiration_days_delta: int) -> typing.Generator[Booking, None, None]:
     """Find bookings expiring in exactly `expiration_days_delta` days"""
     query = (
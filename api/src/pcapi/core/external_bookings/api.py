@@ -25,6 +25,7 @@ from pcapi.models import feature
 from pcapi.utils import requests
 from pcapi.utils.queue import add_to_queue
 
+from . import circuit_breaker
 from . import exceptions
 from . import serialize
 
@@ -41,24 +42,51 @@ EXTERNAL_BOOKINGS_FF = (
 
 def get_shows_stock(venue_id: int, shows_id: list[int]) -> dict[str, int]:
     client = _get_external_bookings_client_api(venue_id)
-    return client.get_shows_remaining_places(shows_id)
+    if _use_cinema_showtimes_stocks(client):
+        cinema_stocks = _get_cinema_showtimes_stocks(client)
+        return {
+            show_id: remaining_places
+            for film_stocks in cinema_stocks.values()
+            for show_id, remaining_places in film_stocks.items()
+            if int(show_id) in shows_id
+        }
+    with circuit_breaker.protect(type(client).__name__, client.cinema_id, "get_shows_remaining_places"):
+        return client.get_shows_remaining_places(shows_id)
 
 
 def get_movie_stocks(venue_id: int, movie_id: str) -> dict[str, int]:
     client = _get_external_bookings_client_api(venue_id)
-    return client.get_film_showtimes_stocks(movie_id)
+    if _use_cinema_showtimes_stocks(client):
+        return _get_cinema_showtimes_stocks(client).get(str(movie_id), {})
+    with circuit_breaker.protect(type(client).__name__, client.cinema_id, "get_film_showtimes_stocks"):
+        return client.get_film_showtimes_stocks(movie_id)
+
+
+def _use_cinema_showtimes_stocks(client: external_bookings_models.ExternalBookingsClientAPI) -> bool:
+    return client.CAN_GET_CINEMA_SHOWTIMES_STOCKS and feature.FeatureToggle.WIP_CINEMA_SHOWTIMES_SNAPSHOT.is_active()
+
+
+def _get_cinema_showtimes_stocks(
+    client: external_bookings_models.ExternalBookingsClientAPI,
+) -> dict[str, dict[str, int]]:
+    # A single snapshot of the whole cinema is fetched (and cached) for
+    # all its films and shows, instead of one call per film or offer.
+    with circuit_breaker.protect(type(client).__name__, client.cinema_id, "get_cinema_showtimes_stocks"):
+        return client.get_cinema_showtimes_stocks()
 
 
 def cancel_booking(venue_id: int, barcodes: list[str]) -> None:
     client = _get_external_bookings_client_api(venue_id)
-    client.cancel_booking(barcodes)
+    with circuit_breaker.protect(type(client).__name__, client.cinema_id, "cancel_booking"):
+        client.cancel_booking(barcodes)
 
 
 def book_cinema_ticket(
     venue_id: int, show_id: int, booking: bookings_models.Booking, beneficiary: users_models.User
 ) -> list[external_bookings_models.Ticket]:
     client = _get_external_bookings_client_api(venue_id)
-    return client.book_ticket(show_id, booking, beneficiary)
+    with circuit_breaker.protect(type(client).__name__, client.cinema_id, "book_ticket"):
+        return client.book_ticket(show_id, booking, beneficiary)
 
 
 def disable_external_bookings() -> None:
@@ -66,6 +94,7 @@ def disable_external_bookings() -> None:
         {"isActive": True}, synchronize_session=False
     )
     db.session.commit()
+    feature.invalidate_features_cache()
 
 
 def _get_external_bookings_client_api(venue_id: int) -> external_bookings_models.ExternalBookingsClientAPI:
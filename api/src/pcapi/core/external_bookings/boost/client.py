@@ -45,6 +45,8 @@ def get_pcu_pricing_if_exists(
 
 
 class BoostClientAPI(external_bookings_models.ExternalBookingsClientAPI):
+    CAN_GET_CINEMA_SHOWTIMES_STOCKS = True
+
     # FIXME: define those later
     def get_shows_remaining_places(self, shows_id: list[int]) -> dict[str, int]:
         raise NotImplementedError()
@@ -56,6 +58,17 @@ class BoostClientAPI(external_bookings_models.ExternalBookingsClientAPI):
         showtimes = self.get_showtimes(film=int(film_id))
         return json.dumps({showtime.id: showtime.numberSeatsRemaining for showtime in showtimes})
 
+    @external_bookings_models.cache_external_call(
+        key_template=constants.BOOST_CINEMA_SHOWTIMES_STOCKS_CACHE_KEY,
+        expire=constants.BOOST_SHOWTIMES_STOCKS_CACHE_TIMEOUT,
+        single_flight=True,
+    )
+    def get_cinema_showtimes_stocks(self) -> str:
+        showtimes_stocks: dict[int, dict[int, int]] = {}
+        for showtime in self.get_showtimes():
+            showtimes_stocks.setdefault(showtime.film.id, {})[showtime.id] = showtime.numberSeatsRemaining
+        return json.dumps(showtimes_stocks)
+
     def cancel_booking(self, barcodes: list[str]) -> None:
         barcodes = list(set(barcodes))
         sale_cancel_items = []
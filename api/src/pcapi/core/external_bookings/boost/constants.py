@@ -6,3 +6,4 @@ BOOST_PASS_CULTURE_PAYMENT_METHOD = "external:credit:passculture"
 BOOST_HIDE_FULL_RESERVATION = 1
 BOOST_SHOWTIMES_STOCKS_CACHE_KEY = "api:cinema_provider:boost:stocks:%s:%s"
 BOOST_SHOWTIMES_STOCKS_CACHE_TIMEOUT = 60
+BOOST_CINEMA_SHOWTIMES_STOCKS_CACHE_KEY = "api:cinema_provider:boost:cinema_stocks:%s"
@@ -32,6 +32,8 @@ CDS_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
 
 
 class CineDigitalServiceAPI(external_bookings_models.ExternalBookingsClientAPI):
+    CAN_GET_CINEMA_SHOWTIMES_STOCKS = True
+
     def __init__(self, cinema_id: str, account_id: str, api_url: str, cinema_api_token: str | None):
         super().__init__(cinema_id=cinema_id)
         if not cinema_api_token:
@@ -70,6 +72,21 @@ class CineDigitalServiceAPI(external_bookings_models.ExternalBookingsClientAPI):
             return json.dumps({show.id: show.internet_remaining_place for show in shows if show.id in show_ids})
         return json.dumps({show.id: show.remaining_place for show in shows if show.id in show_ids})
 
+    @external_bookings_models.cache_external_call(
+        key_template=constants.CDS_CINEMA_SHOWTIMES_STOCKS_CACHE_KEY,
+        expire=cds_constants.CDS_SHOWTIMES_STOCKS_CACHE_TIMEOUT,
+        single_flight=True,
+    )
+    def get_cinema_showtimes_stocks(self) -> str:
+        data = get_resource(self.api_url, self.account_id, self.token, ResourceCDS.SHOWS)
+        shows = parse_obj_as(list[cds_serializers.ShowCDS], data)
+        internet_sale_gauge_active = self.get_internet_sale_gauge_active()
+        showtimes_stocks: dict[int, dict[int, int]] = {}
+        for show in shows:
+            remaining_places = show.internet_remaining_place if internet_sale_gauge_active else show.remaining_place
+            showtimes_stocks.setdefault(show.media.id, {})[show.id] = remaining_places
+        return json.dumps(showtimes_stocks)
+
     def get_shows(self) -> list[cds_serializers.ShowCDS]:
         data = get_resource(self.api_url, self.account_id, self.token, ResourceCDS.SHOWS)
         shows = parse_obj_as(list[cds_serializers.ShowCDS], data)
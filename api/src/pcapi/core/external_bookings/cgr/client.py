@@ -21,6 +21,8 @@ logger = logging.getLogger(__name__)
 
 
 class CGRClientAPI(external_bookings_models.ExternalBookingsClientAPI):
+    CAN_GET_CINEMA_SHOWTIMES_STOCKS = True
+
     def __init__(self, cinema_id: str):
         super().__init__(cinema_id=cinema_id)
         self.cgr_cinema_details = get_cgr_cinema_details(cinema_id)
@@ -45,6 +47,19 @@ class CGRClientAPI(external_bookings_models.ExternalBookingsClientAPI):
             return json.dumps({})
         return json.dumps({show.IDSeance: show.NbPlacesRestantes for show in film.Seances})
 
+    @external_bookings_models.cache_external_call(
+        key_template=constants.CGR_CINEMA_SHOWTIMES_STOCKS_CACHE_KEY,
+        expire=constants.CGR_SHOWTIMES_STOCKS_CACHE_TIMEOUT,
+        single_flight=True,
+    )
+    def get_cinema_showtimes_stocks(self) -> str:
+        logger.info("Fetching CGR showtimes of all films", extra={"cinema_id": self.cinema_id})
+        response = get_seances_pass_culture(self.cgr_cinema_details)
+        showtimes_stocks = {}
+        for film in response.ObjetRetour.Films:
+            showtimes_stocks[film.IDFilmAlloCine] = {show.IDSeance: show.NbPlacesRestantes for show in film.Seances}
+        return json.dumps(showtimes_stocks)
+
     def book_ticket(
         self, show_id: int, booking: bookings_models.Booking, beneficiary: users_models.User
     ) -> list[external_bookings_models.Ticket]:
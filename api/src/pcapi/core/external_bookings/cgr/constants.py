@@ -1,2 +1,3 @@
 CGR_SHOWTIMES_STOCKS_CACHE_KEY = "api:cinema_provider:cgr:stocks:%s:%s"
 CGR_SHOWTIMES_STOCKS_CACHE_TIMEOUT = 60
+CGR_CINEMA_SHOWTIMES_STOCKS_CACHE_KEY = "api:cinema_provider:cgr:cinema_stocks:%s"
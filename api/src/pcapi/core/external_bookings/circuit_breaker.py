@@ -0,0 +1,225 @@
+"""Circuit breaker and adaptive timeouts of external cinema booking
+clients (CDS, Boost, CGR and EMS).
+
+Each cinema of each provider has its own breaker, since each cinema is
+reached on its own host (or account): a broken cinema must not block
+the others. Breakers are shared by all processes through Redis:
+
+- closed: calls go through. Provider failures (timeouts and connection
+  errors) are counted over EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_WINDOW
+  seconds. When EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_THRESHOLD is
+  reached, the breaker opens.
+- open: calls fail at once with `ExternalBookingUnavailableError`,
+  during EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_OPEN_DURATION seconds.
+- half-open: a single call (the probe) goes through, other calls fail
+  at once. The breaker closes if the probe succeeds, and opens again
+  otherwise.
+
+Requests of read endpoints that do not set their own timeout use a
+timeout derived from the latency of the last responses of the same
+endpoint of the provider, between EXTERNAL_BOOKINGS_MIN_TIMEOUT and
+EXTERNAL_BOOKINGS_MAX_TIMEOUT. Booking and cancellation calls are not
+idempotent: cutting them short could leave a ticket booked at the
+provider but not on our side, so they keep the default timeout.
+
+Each call is logged with its duration and outcome, so that latency and
+error rates can be followed per provider and endpoint.
+
+If Redis is unavailable, calls go through with the default timeout.
+"""
+
+import collections.abc
+import contextlib
+import enum
+import logging
+import math
+import time
+
+from flask import current_app
+import redis
+
+from pcapi import settings
+from pcapi.models.feature import FeatureToggle
+from pcapi.utils import requests
+
+from . import exceptions
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 100
+MIN_LATENCY_SAMPLES = 20
+LATENCY_PERCENTILE = 0.95
+TIMEOUT_TO_LATENCY_RATIO = 3
+# The "tripped" key outlives the "open" key: while it exists without
+# the "open" key, the breaker is half-open.
+TRIPPED_DURATION_RATIO = 10
+NON_IDEMPOTENT_ENDPOINTS = ("book_ticket", "cancel_booking")
+
+
+class BreakerState(enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+def _key(provider: str, cinema_id: str, name: str) -> str:
+    return f"api:external_bookings:circuit_breaker:{provider}:{cinema_id}:{name}"
+
+
+def _latencies_key(provider: str, endpoint: str) -> str:
+    return f"api:external_bookings:latencies:{provider}:{endpoint}"
+
+
+def compute_timeout(latencies: list[float]) -> float | None:
+    """Return a timeout that is a few times the given percentile of
+    ``latencies``, or None if there are too few of them.
+    """
+    if len(latencies) < MIN_LATENCY_SAMPLES:
+        return None
+    latencies = sorted(latencies)
+    index = min(len(latencies) - 1, math.ceil(LATENCY_PERCENTILE * len(latencies)) - 1)
+    timeout = latencies[index] * TIMEOUT_TO_LATENCY_RATIO
+    return min(max(timeout, settings.EXTERNAL_BOOKINGS_MIN_TIMEOUT), settings.EXTERNAL_BOOKINGS_MAX_TIMEOUT)
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """Return whether ``exc`` (or an exception that caused it) shows
+    that the provider is slow or unreachable. Other errors (invalid
+    requests, sold out shows, etc.) do not count.
+    """
+    seen = set()
+    current: BaseException | None = exc
+    while current is not None and id(current) not in seen:
+        if isinstance(current, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+        seen.add(id(current))
+        current = current.__cause__ or current.__context__
+    return False
+
+
+def _get_state(
+    redis_client: redis.Redis, provider: str, cinema_id: str, endpoint: str
+) -> tuple[BreakerState, float | None]:
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.exists(_key(provider, cinema_id, "open"))
+    pipeline.exists(_key(provider, cinema_id, "tripped"))
+    pipeline.lrange(_latencies_key(provider, endpoint), 0, -1)
+    is_open, is_tripped, latencies = pipeline.execute()
+    if endpoint in NON_IDEMPOTENT_ENDPOINTS:
+        timeout = None
+    else:
+        timeout = compute_timeout([float(latency) for latency in latencies])
+
+    if is_open:
+        return BreakerState.OPEN, timeout
+    if not is_tripped:
+        return BreakerState.CLOSED, timeout
+    probe_duration = settings.EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_OPEN_DURATION
+    if redis_client.set(_key(provider, cinema_id, "probe"), "1", nx=True, ex=probe_duration):
+        return BreakerState.HALF_OPEN, timeout
+    return BreakerState.OPEN, timeout  # another call is probing the provider
+
+
+def _open(redis_client: redis.Redis, provider: str, cinema_id: str) -> None:
+    open_duration = settings.EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_OPEN_DURATION
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.set(_key(provider, cinema_id, "open"), "1", ex=open_duration)
+    pipeline.set(_key(provider, cinema_id, "tripped"), "1", ex=open_duration * TRIPPED_DURATION_RATIO)
+    pipeline.delete(_key(provider, cinema_id, "failures"), _key(provider, cinema_id, "probe"))
+    pipeline.execute()
+    logger.warning(
+        "Opened circuit breaker of external bookings cinema", extra={"provider": provider, "cinema_id": cinema_id}
+    )
+
+
+def _close(redis_client: redis.Redis, provider: str, cinema_id: str) -> None:
+    redis_client.delete(
+        _key(provider, cinema_id, "tripped"), _key(provider, cinema_id, "probe"), _key(provider, cinema_id, "failures")
+    )
+    logger.info(
+        "Closed circuit breaker of external bookings cinema", extra={"provider": provider, "cinema_id": cinema_id}
+    )
+
+
+def _record_call(
+    redis_client: redis.Redis,
+    provider: str,
+    cinema_id: str,
+    endpoint: str,
+    state: BreakerState,
+    durations: list[float],
+    is_failure: bool,
+) -> None:
+    if durations:
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.lpush(_latencies_key(provider, endpoint), *durations)
+        pipeline.ltrim(_latencies_key(provider, endpoint), 0, LATENCY_SAMPLES - 1)
+        pipeline.execute()
+
+    if not is_failure:
+        if state == BreakerState.HALF_OPEN:
+            _close(redis_client, provider, cinema_id)
+        return
+    if state == BreakerState.HALF_OPEN:
+        _open(redis_client, provider, cinema_id)
+        return
+    failures_key = _key(provider, cinema_id, "failures")
+    failures = redis_client.incr(failures_key)
+    if failures == 1:
+        redis_client.expire(failures_key, settings.EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_WINDOW)
+    if failures >= settings.EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_THRESHOLD:
+        _open(redis_client, provider, cinema_id)
+
+
+@contextlib.contextmanager
+def protect(provider: str, cinema_id: str, endpoint: str) -> collections.abc.Generator[None, None, None]:
+    """A context manager that protects a call to ``endpoint`` of the
+    client of ``provider`` for ``cinema_id`` with the circuit breaker of
+    this cinema.
+
+    Raise `ExternalBookingUnavailableError` without calling the provider
+    if the breaker is open.
+    """
+    if not FeatureToggle.WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER.is_active():
+        yield
+        return
+
+    redis_client = current_app.redis_client
+    log_extra = {"provider": provider, "cinema_id": cinema_id, "endpoint": endpoint}
+    try:
+        state, timeout = _get_state(redis_client, provider, cinema_id, endpoint)
+    except redis.exceptions.RedisError:
+        logger.warning("Could not get state of external bookings circuit breaker", extra=log_extra, exc_info=True)
+        yield
+        return
+
+    log_extra |= {"breaker_state": state.value, "timeout": timeout}
+    if state == BreakerState.OPEN:
+        logger.info("External bookings call skipped by circuit breaker", extra=log_extra)
+        raise exceptions.ExternalBookingUnavailableError(f"Circuit breaker of {provider} cinema {cinema_id} is open")
+
+    error: Exception | None = None
+    start = time.perf_counter()
+    with requests.track_calls(default_timeout=timeout) as durations:
+        try:
+            yield
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            is_failure = error is not None and is_provider_failure(error)
+            logger.info(
+                "External bookings call",
+                extra=log_extra
+                | {
+                    "duration": time.perf_counter() - start,
+                    "requests": len(durations),
+                    "error": type(error).__name__ if error else None,
+                    "provider_failure": is_failure,
+                },
+            )
+            try:
+                _record_call(redis_client, provider, cinema_id, endpoint, state, durations, is_failure)
+            except redis.exceptions.RedisError:
+                logger.warning("Could not update external bookings circuit breaker", extra=log_extra, exc_info=True)
@@ -16,3 +16,9 @@ class ExternalBookingNotEnoughSeatsError(Exception):
     def __init__(self, remainingQuantity: int) -> None:
         self.remainingQuantity = remainingQuantity
         super().__init__()
+
+
+class ExternalBookingUnavailableError(ExternalBookingException):
+    """The provider is not called because it has recently been too slow
+    or unreachable (see `circuit_breaker`).
+    """
@@ -28,6 +28,10 @@ class Movie:
 
 
 class ExternalBookingsClientAPI:
+    # Whether the provider can return the remaining places of all shows
+    # of a cinema at once, see `get_cinema_showtimes_stocks()`.
+    CAN_GET_CINEMA_SHOWTIMES_STOCKS = False
+
     def __init__(self, cinema_id: str) -> None:
         self.cinema_id = cinema_id
 
@@ -39,6 +43,12 @@ class ExternalBookingsClientAPI:
     def get_film_showtimes_stocks(self, film_id: str) -> dict[str, int]:
         raise NotImplementedError("Should be implemented in subclass (abstract method)")
 
+    def get_cinema_showtimes_stocks(self) -> dict[str, dict[str, int]]:
+        """Return the remaining places of all shows of the cinema, by film
+        id and show id.
+        """
+        raise NotImplementedError("Should be implemented in subclass (abstract method)")
+
     def cancel_booking(self, barcodes: list[str]) -> None:
         raise NotImplementedError("Should be implemented in subclass (abstract method)")
 
@@ -48,13 +58,17 @@ class ExternalBookingsClientAPI:
         raise NotImplementedError("Should be implemented in subclass (abstract method)")
 
 
-def cache_external_call(key_template: str, expire: int | None = None) -> typing.Callable:
+def cache_external_call(
+    key_template: str, expire: int | None = None, single_flight: bool = False
+) -> typing.Callable:
     """
     Cache the result of a external call to a provider.
     Uses the cinema_id of ClientAPI instance and the arguments pass to the function as key
     (similar to what `@lru_cache` is doing)
 
     The function cached should return a string using `json.dumps`
+
+    With `single_flight`, concurrent cache misses share a single call to the provider (see `get_from_cache`).
     """
 
     def decorator(func: typing.Callable) -> typing.Callable:
@@ -63,7 +77,11 @@ def cache_external_call(key_template: str, expire: int | None = None) -> typing.
             key_args = (instance.cinema_id, *args)
             retriever = partial(func, instance, *args, **kwargs)
             result_as_json = get_from_cache(
-                key_template=key_template, key_args=key_args, expire=expire, retriever=retriever
+                key_template=key_template,
+                key_args=key_args,
+                expire=expire,
+                retriever=retriever,
+                single_flight=single_flight,
             )
             if not isinstance(result_as_json, str):
                 raise AssertionError("This function is meant to be used with functions returning data as JSON")
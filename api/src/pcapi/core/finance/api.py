@@ -24,9 +24,14 @@ details).
 """
 
 from collections import defaultdict
+from collections import deque
+import concurrent.futures
+import contextlib
+import contextvars
 import csv
 import datetime
 import decimal
+import io
 import itertools
 import logging
 import math
@@ -38,11 +43,13 @@ import typing
 import zipfile
 
 from dateutil.relativedelta import relativedelta
+import flask
 from flask import current_app as app
 from flask import render_template
 from flask_sqlalchemy import BaseQuery
 import pytz
 import sqlalchemy as sqla
+import sqlalchemy.dialects.postgresql as sqla_psql
 import sqlalchemy.orm as sqla_orm
 import sqlalchemy.sql.functions as sqla_func
 
@@ -60,6 +67,8 @@ import pcapi.core.mails.transactional as transactional_mails
 from pcapi.core.mails.transactional import send_booking_cancellation_by_pro_to_beneficiary_email
 from pcapi.core.mails.transactional.finance_incidents.finance_incident_notification import send_commercial_gesture_email
 from pcapi.core.mails.transactional.finance_incidents.finance_incident_notification import send_finance_incident_emails
+from pcapi.core.object_storage import FileNotFound
+from pcapi.core.object_storage import get_public_object
 from pcapi.core.object_storage import store_public_object
 import pcapi.core.offerers.models as offerers_models
 import pcapi.core.offers.models as offers_models
@@ -69,6 +78,7 @@ import pcapi.core.users.models as users_models
 from pcapi.domain import reimbursement
 from pcapi.models import db
 from pcapi.models import feature
+from pcapi.repository import on_commit
 from pcapi.repository import transaction
 from pcapi.tasks import finance_tasks
 from pcapi.utils import human_ids
@@ -78,6 +88,7 @@ import pcapi.utils.pdf as pdf_utils
 
 from . import conf
 from . import exceptions
+from . import metrics
 from . import models
 from . import repository
 from . import utils
@@ -92,6 +103,9 @@ RECREDIT_UNDERAGE_USERS_BATCH_SIZE = 1000
 MIN_DATE_TO_PRICE = datetime.datetime(2021, 12, 31, 23, 0)  # UTC
 PRICE_EVENTS_BATCH_SIZE = 100
 CASHFLOW_BATCH_LABEL_PREFIX = "VIR"
+CASHFLOW_GENERATION_CHUNK_SIZE = 1000  # number of bank accounts
+CSV_EXPORT_BATCH_SIZE = 1000  # number of rows fetched at once by finance CSV files
+REIMBURSEMENT_DETAILS_CHUNK_SIZE = 100  # number of invoices
 
 
 def get_pricing_ordering_date(
@@ -243,10 +257,18 @@ def cancel_latest_event(
 def price_events(
     min_date: datetime.datetime = MIN_DATE_TO_PRICE,
     batch_size: int = PRICE_EVENTS_BATCH_SIZE,
+    workers: int | None = None,
 ) -> None:
     """Price finance events that are ready to be priced.
 
     This function is normally called by a cron job.
+
+    ``workers`` (by default: PRICE_EVENTS_WORKERS) is the number of
+    concurrent workers. Events are partitioned by pricing point: each
+    worker prices the events of its own pricing points, in order, in
+    its own thread, with its own application context and database
+    session. Pricing points are independent, so the result is the
+    same as with a single worker.
     """
     # The upper bound on `pricingOrderingDate` avoids selecting a very
     # recent event that may have been COMMITed to the database just
@@ -255,6 +277,52 @@ def price_events(
     threshold = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
     window = (min_date, threshold)
 
+    workers = workers or settings.PRICE_EVENTS_WORKERS
+    with metrics.measure_stage("price_events", {"workers": workers}):
+        if workers <= 1:
+            _price_events(window, batch_size)
+            return
+
+        flask_app = app._get_current_object()  # type: ignore[attr-defined]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-events") as executor:
+            futures = [
+                # Workers run in a copy of the current context, so that
+                # they contribute to the metrics of this stage.
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _price_events_in_app_context,
+                    flask_app,
+                    window,
+                    batch_size,
+                    (worker, workers),
+                )
+                for worker in range(workers)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+
+def _price_events_in_app_context(
+    flask_app: flask.Flask,
+    window: tuple[datetime.datetime, datetime.datetime],
+    batch_size: int,
+    partition: tuple[int, int],
+) -> None:
+    with flask_app.app_context():
+        try:
+            _price_events(window, batch_size, partition)
+        finally:
+            db.session.remove()
+
+
+def _price_events(
+    window: tuple[datetime.datetime, datetime.datetime],
+    batch_size: int,
+    partition: tuple[int, int] | None = None,
+) -> None:
+    """Price events of the given window, or only those whose pricing
+    point belongs to the given ``(index, count)`` partition.
+    """
     errored_pricing_point_ids = set()
 
     # This is a quick hack to avoid fetching all events at once,
@@ -262,6 +330,9 @@ def price_events(
     # commit, which takes a lot of time (up to 1 or 2 seconds per
     # commit).
     event_query = _get_events_to_price(window)
+    if partition:
+        index, count = partition
+        event_query = event_query.filter(models.FinanceEvent.pricingPointId % count == index)
     loops = math.ceil(event_query.count() / batch_size)
 
     def _get_loop_query(
@@ -281,34 +352,62 @@ def price_events(
         return query.limit(batch_size)
 
     last_event = None
+    rule_finder = None
+    by_batch = feature.FeatureToggle.WIP_BATCHED_PRICING.is_active()
     while loops > 0:
         with log_elapsed(logger, "Fetched batch of events to price"):
             events = list(_get_loop_query(event_query, last_event))
+        if not rule_finder or rule_finder.is_outdated():
+            with log_elapsed(logger, "Loaded custom reimbursement rules"):
+                rule_finder = reimbursement.CustomRuleFinder()
+        if events:
+            last_event = events[-1]
+
+        events_by_pricing_point: dict[int, list[models.FinanceEvent]] = defaultdict(list)
         for event in events:
-            last_event = event
-            try:
-                if event.pricingPointId in errored_pricing_point_ids:
+            events_by_pricing_point[event.pricingPointId].append(event)
+        for pricing_point_id, pricing_point_events in events_by_pricing_point.items():
+            if pricing_point_id in errored_pricing_point_ids:
+                continue
+            if by_batch and len(pricing_point_events) > 1:
+                extra = {"pricing_point": pricing_point_id, "count": len(pricing_point_events)}
+                try:
+                    with log_elapsed(logger, "Priced events of pricing point", extra):
+                        pricings = price_events_of_pricing_point(pricing_point_events, rule_finder=rule_finder)
+                    metrics.add_rows(len(pricings))
                     continue
-                extra = {
-                    "event": event.id,
-                    "pricing_point": event.pricingPointId,
-                }
-                with log_elapsed(logger, "Priced event", extra):
-                    price_event(event)
-            except Exception as exc:  # pylint: disable=broad-except
-                errored_pricing_point_ids.add(event.pricingPointId)
-                logger.info(
-                    "Ignoring further events from pricing point",
-                    extra={"pricing_point": event.pricingPointId},
-                )
-                logger.exception(
-                    "Could not price event",
-                    extra={
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Price events one by one, so that events that
+                    # precede the erroneous one are priced, as usual.
+                    logger.info(
+                        "Could not price events of pricing point at once, pricing them one by one",
+                        extra=extra | {"exc": str(exc)},
+                    )
+            for event in pricing_point_events:
+                try:
+                    extra = {
                         "event": event.id,
                         "pricing_point": event.pricingPointId,
-                        "exc": str(exc),
-                    },
-                )
+                    }
+                    with log_elapsed(logger, "Priced event", extra):
+                        pricing = price_event(event, rule_finder=rule_finder)
+                    if pricing:
+                        metrics.add_rows(1)
+                except Exception as exc:  # pylint: disable=broad-except
+                    errored_pricing_point_ids.add(event.pricingPointId)
+                    logger.info(
+                        "Ignoring further events from pricing point",
+                        extra={"pricing_point": event.pricingPointId},
+                    )
+                    logger.exception(
+                        "Could not price event",
+                        extra={
+                            "event": event.id,
+                            "pricing_point": event.pricingPointId,
+                            "exc": str(exc),
+                        },
+                    )
+                    break
         loops -= 1
         # Keep last event in the session, we'll need it when calling
         # `_get_loop_query()` for the next loop.
@@ -375,7 +474,8 @@ def lock_pricing_point(pricing_point_id: int) -> None:
 
     The lock is automatically released at the end of the transaction.
     """
-    return db_utils.acquire_lock(f"pricing-point-{pricing_point_id}")
+    with metrics.measure_lock_wait():
+        db_utils.acquire_lock(f"pricing-point-{pricing_point_id}")
 
 
 def lock_bank_account(bank_account_id: int) -> None:
@@ -387,10 +487,14 @@ def lock_bank_account(bank_account_id: int) -> None:
 
     The lock is automatically released at the end of the transaction.
     """
-    return db_utils.acquire_lock(f"bank-account-{bank_account_id}")
+    with metrics.measure_lock_wait():
+        db_utils.acquire_lock(f"bank-account-{bank_account_id}")
 
 
-def price_event(event: models.FinanceEvent) -> models.Pricing | None:
+def price_event(
+    event: models.FinanceEvent,
+    rule_finder: reimbursement.CustomRuleFinder | None = None,
+) -> models.Pricing | None:
     assert event.pricingPointId  # helps mypy
     with transaction():
         lock_pricing_point(event.pricingPointId)
@@ -459,18 +563,99 @@ def price_event(event: models.FinanceEvent) -> models.Pricing | None:
 
         _delete_dependent_pricings(event, "Deleted pricings priced too early")
 
-        pricing = _price_event(event)
+        pricing = _price_event(event, rule_finder)
         db.session.add(pricing)
         event.status = models.FinanceEventStatus.PRICED
         db.session.commit()
     return pricing
 
 
+def price_events_of_pricing_point(
+    events: list[models.FinanceEvent],
+    rule_finder: reimbursement.CustomRuleFinder | None = None,
+) -> list[models.Pricing]:
+    """Price events of a single pricing point, in the given order
+    (which must be the pricing order), in a single transaction.
+
+    The result is the same as calling `price_event()` on each event,
+    but the pricing point is locked once, events (and their bookings)
+    are fetched with a single query, the revenue of the pricing point
+    is computed once per year and pricings are inserted together.
+    """
+    pricing_point_id = events[0].pricingPointId
+    assert all(event.pricingPointId == pricing_point_id for event in events)
+    event_ids = [event.id for event in events]
+    rule_finder = rule_finder or reimbursement.CustomRuleFinder()
+    pricings = []
+    with transaction():
+        lock_pricing_point(pricing_point_id)
+
+        # Now that we have acquired a lock, fetch events from the
+        # database again so that we can make some final checks before
+        # actually pricing them (see `price_event()`).
+        fetched_events = {
+            event.id: event
+            for event in models.FinanceEvent.query.filter(models.FinanceEvent.id.in_(event_ids))
+            .options(
+                sqla_orm.joinedload(models.FinanceEvent.booking)
+                .joinedload(bookings_models.Booking.stock)
+                .joinedload(offers_models.Stock.offer),
+                sqla_orm.joinedload(models.FinanceEvent.booking)
+                .joinedload(bookings_models.Booking.venue)
+                .joinedload(offerers_models.Venue.pricing_point_links)
+                .joinedload(offerers_models.VenuePricingPointLink.venue),
+                sqla_orm.joinedload(models.FinanceEvent.collectiveBooking)
+                .joinedload(educational_models.CollectiveBooking.collectiveStock)
+                .joinedload(educational_models.CollectiveStock.collectiveOffer),
+                sqla_orm.joinedload(models.FinanceEvent.collectiveBooking)
+                .joinedload(educational_models.CollectiveBooking.venue)
+                .joinedload(offerers_models.Venue.pricing_point_links)
+                .joinedload(offerers_models.VenuePricingPointLink.venue),
+                sqla_orm.joinedload(models.FinanceEvent.bookingFinanceIncident),
+            )
+            .populate_existing()
+        }
+        priced_event_ids = {
+            row.eventId
+            for row in models.Pricing.query.filter(
+                models.Pricing.eventId.in_(event_ids),
+                models.Pricing.status != models.PricingStatus.CANCELLED,
+            ).with_entities(models.Pricing.eventId)
+        }
+
+        # Revenue of the pricing point, by year. Only pricings of
+        # individual bookings are included, see `_get_current_revenue()`.
+        revenues: dict[int, int] = {}
+        for event_id in event_ids:
+            event = fetched_events[event_id]
+            if event.status != models.FinanceEventStatus.READY or event.id in priced_event_ids:
+                continue
+            year = _get_revenue_year(event.valueDate)
+            if year not in revenues:
+                # Dependent pricings of the following events of the same
+                # year are dependent pricings of this event, too.
+                _delete_dependent_pricings(event, "Deleted pricings priced too early")
+                revenues[year] = _get_current_revenue(event)
+            pricing = _price_event(event, rule_finder, current_revenue=revenues[year])
+            if pricing.bookingId:
+                revenues[year] = pricing.revenue
+            pricings.append(pricing)
+            event.status = models.FinanceEventStatus.PRICED
+
+        db.session.add_all(pricings)
+        db.session.commit()
+    return pricings
+
+
+def _get_revenue_year(value_date: datetime.datetime) -> int:
+    return value_date.replace(tzinfo=pytz.utc).astimezone(utils.ACCOUNTING_TIMEZONE).year
+
+
 def _get_revenue_period(value_date: datetime.datetime) -> tuple[datetime.datetime, datetime.datetime]:
     """Return a datetime (year) period for the given value date, i.e. the
     first and last seconds of the year of the ``value_date``.
     """
-    year = value_date.replace(tzinfo=pytz.utc).astimezone(utils.ACCOUNTING_TIMEZONE).year
+    year = _get_revenue_year(value_date)
     first_second = utils.ACCOUNTING_TIMEZONE.localize(
         datetime.datetime.combine(
             datetime.date(year, 1, 1),
@@ -490,6 +675,17 @@ def _get_current_revenue(event: models.FinanceEvent) -> int:
     """Return the current year revenue for the pricing point of an
     event, NOT including the given event.
     """
+    if feature.FeatureToggle.WIP_USE_PRICING_POINT_REVENUE.is_active():
+        revenue = (
+            models.PricingPointRevenue.query.filter_by(
+                pricingPointId=event.pricingPointId,
+                year=_get_revenue_year(event.valueDate),
+            )
+            .with_entities(models.PricingPointRevenue.revenue)
+            .scalar()
+        )
+        return revenue or 0
+
     revenue_period = _get_revenue_period(event.valueDate)
     # Collective bookings must not be included in revenue.
     current_revenue = (
@@ -514,8 +710,95 @@ def _get_current_revenue(event: models.FinanceEvent) -> int:
     return utils.to_eurocents(current_revenue or 0)
 
 
-def _price_event(event: models.FinanceEvent) -> models.Pricing:
-    new_revenue = _get_current_revenue(event)
+def _compute_pricing_point_revenues(
+    year: int,
+    pricing_point_id: int | None = None,
+) -> dict[int, int]:
+    """Compute the revenue of pricing points for the given year from
+    their pricings, as `_get_current_revenue()` does.
+    """
+    query = (
+        models.Pricing.query.join(models.Pricing.booking)
+        .filter(
+            models.Pricing.valueDate.between(*_get_revenue_period(datetime.datetime(year, 7, 1))),
+            models.Pricing.status.notin_(
+                (
+                    models.PricingStatus.CANCELLED,
+                    models.PricingStatus.REJECTED,
+                )
+            ),
+        )
+        .group_by(models.Pricing.pricingPointId)
+        .with_entities(
+            models.Pricing.pricingPointId,
+            sqla.func.sum(bookings_models.Booking.amount * bookings_models.Booking.quantity),
+        )
+    )
+    if pricing_point_id:
+        query = query.filter(models.Pricing.pricingPointId == pricing_point_id)
+    return {point_id: utils.to_eurocents(revenue) for point_id, revenue in query}
+
+
+def check_pricing_point_revenues(year: int | None = None, fix: bool = False) -> dict[int, tuple[int, int]]:
+    """Compare the revenue of pricing points maintained in the
+    `pricing_point_revenue` table with the revenue computed from
+    their pricings, for the given year (or the current one).
+
+    Return inconsistent revenues, as a dictionary of
+    `{pricing_point_id: (stored_revenue, expected_revenue)}`. If
+    `fix` is true, stored revenues are replaced by expected revenues
+    (which is also how the table should be initialized).
+    """
+    year = year or _get_revenue_year(datetime.datetime.utcnow())
+    expected_revenues = _compute_pricing_point_revenues(year)
+    stored_revenues = dict(
+        models.PricingPointRevenue.query.filter_by(year=year).with_entities(
+            models.PricingPointRevenue.pricingPointId,
+            models.PricingPointRevenue.revenue,
+        )
+    )
+    mismatches = {}
+    for pricing_point_id in expected_revenues.keys() | stored_revenues.keys():
+        stored = stored_revenues.get(pricing_point_id, 0)
+        expected = expected_revenues.get(pricing_point_id, 0)
+        if stored != expected:
+            mismatches[pricing_point_id] = (stored, expected)
+            logger.warning(
+                "Found inconsistent pricing point revenue",
+                extra={
+                    "pricing_point": pricing_point_id,
+                    "year": year,
+                    "stored_revenue": stored,
+                    "expected_revenue": expected,
+                },
+            )
+
+    if fix:
+        for pricing_point_id in mismatches:
+            with transaction():
+                lock_pricing_point(pricing_point_id)
+                # Compute again now that we hold the lock.
+                expected = _compute_pricing_point_revenues(year, pricing_point_id).get(pricing_point_id, 0)
+                insert = sqla_psql.insert(models.PricingPointRevenue).values(
+                    pricingPointId=pricing_point_id, year=year, revenue=expected
+                )
+                db.session.execute(
+                    insert.on_conflict_do_update(
+                        index_elements=[models.PricingPointRevenue.pricingPointId, models.PricingPointRevenue.year],
+                        set_={"revenue": insert.excluded.revenue},
+                    )
+                )
+        logger.info("Fixed inconsistent pricing point revenues", extra={"year": year, "count": len(mismatches)})
+
+    return mismatches
+
+
+def _price_event(
+    event: models.FinanceEvent,
+    rule_finder: reimbursement.CustomRuleFinder | None = None,
+    current_revenue: int | None = None,
+) -> models.Pricing:
+    new_revenue = _get_current_revenue(event) if current_revenue is None else current_revenue
     individual_booking = event.bookingFinanceIncident.booking if event.bookingFinanceIncident else event.booking
     collective_booking = (
         event.bookingFinanceIncident.collectiveBooking if event.bookingFinanceIncident else event.collectiveBooking
@@ -542,7 +825,8 @@ def _price_event(event: models.FinanceEvent) -> models.Pricing:
         models.FinanceEventMotive.BOOKING_USED,
         models.FinanceEventMotive.BOOKING_USED_AFTER_CANCELLATION,
     ):
-        rule_finder = reimbursement.CustomRuleFinder()
+        if not rule_finder:
+            rule_finder = reimbursement.CustomRuleFinder()
         rule = reimbursement.get_reimbursement_rule(booking, rule_finder, new_revenue)
         amount = -rule.apply(booking)  # outgoing, thus negative
         offerer_revenue_amount = -utils.to_eurocents(booking.total_amount)
@@ -835,7 +1119,8 @@ def update_finance_event_pricing_date(stock: offers_models.Stock) -> None:
 
 def generate_cashflows_and_payment_files(cutoff: datetime.datetime) -> models.CashflowBatch:
     batch = generate_cashflows(cutoff)
-    generate_payment_files(batch)
+    with metrics.measure_stage("generate_payment_files", {"batch": batch.id}):
+        generate_payment_files(batch)
     return batch
 
 
@@ -859,7 +1144,9 @@ def generate_cashflows(cutoff: datetime.datetime) -> models.CashflowBatch:
     batch = models.CashflowBatch(cutoff=cutoff, label=_get_next_cashflow_batch_label())
     db.session.add(batch)
     db.session.commit()
-    _generate_cashflows(batch)
+    with metrics.measure_stage("generate_cashflows", {"batch": batch.id}):
+        _generate_cashflows(batch)
+        metrics.add_rows(models.Cashflow.query.filter_by(batchId=batch.id).count())
     # if the script fail we want to keep the lock to forbid backoffice to modify the data
     app.redis_client.delete(conf.REDIS_GENERATE_CASHFLOW_LOCK)
     return batch
@@ -932,7 +1219,22 @@ def _generate_cashflows(batch: models.CashflowBatch) -> None:
             },
         )
 
-    bank_account_infos = (
+    # Look for bookings whose amount has been changed after they have
+    # been priced.
+    integrity_error_filters = (
+        models.PricingLine.category == models.PricingLineCategory.OFFERER_REVENUE,
+        models.PricingLine.amount
+        != -100
+        * sqla.case(
+            (
+                bookings_models.Booking.id.is_not(None),
+                bookings_models.Booking.amount * bookings_models.Booking.quantity,
+            ),
+            else_=educational_models.CollectiveStock.price,
+        ),
+    )
+
+    pricings_by_bank_account = (
         models.Pricing.query.filter(*filters)
         .outerjoin(models.Pricing.booking)
         .outerjoin(bookings_models.Booking.stock)
@@ -946,15 +1248,24 @@ def _generate_cashflows(batch: models.CashflowBatch) -> None:
         .filter(offerers_models.VenueBankAccountLink.timespan.contains(batch.cutoff))
         .join(models.BankAccount, models.BankAccount.id == offerers_models.VenueBankAccountLink.bankAccountId)
         .outerjoin(models.CashflowPricing)
-        .with_entities(
-            models.BankAccount.id,
-            sqla_func.array_agg(models.Pricing.venueId.distinct()),
-        )
-        .group_by(
-            models.BankAccount.id,
-        )
+    )
+    bank_account_infos = pricings_by_bank_account.with_entities(
+        models.BankAccount.id,
+        sqla_func.array_agg(models.Pricing.venueId.distinct()),
+    ).group_by(
+        models.BankAccount.id,
     )
 
+    if feature.FeatureToggle.WIP_SET_BASED_CASHFLOW_GENERATION.is_active():
+        # Bank accounts that could not be processed in bulk are
+        # processed one by one below.
+        bank_account_infos = _generate_cashflows_in_bulk(  # type: ignore[assignment]
+            batch_id,
+            bank_account_infos.all(),
+            pricings_by_bank_account,
+            integrity_error_filters,
+        )
+
     for bank_account_id, venue_ids in bank_account_infos:
         log_extra = {
             "batch": batch_id,
@@ -981,22 +1292,10 @@ def _generate_cashflows(batch: models.CashflowBatch) -> None:
                     )
                 )
 
-                # Check integrity by looking for bookings whose amount
-                # has been changed after they have been priced.
+                # Check integrity of pricings.
                 diff = (
                     pricings.join(models.Pricing.lines)
-                    .filter(
-                        models.PricingLine.category == models.PricingLineCategory.OFFERER_REVENUE,
-                        models.PricingLine.amount
-                        != -100
-                        * sqla.case(
-                            (
-                                bookings_models.Booking.id.is_not(None),
-                                bookings_models.Booking.amount * bookings_models.Booking.quantity,
-                            ),
-                            else_=educational_models.CollectiveStock.price,
-                        ),
-                    )
+                    .filter(*integrity_error_filters)
                     .with_entities(models.Pricing.id)
                 )
                 diff = {_pricing_id for _pricing_id, in diff.all()}
@@ -1130,6 +1429,166 @@ def _generate_cashflows(batch: models.CashflowBatch) -> None:
             logger.exception("Could not generate cashflow for bank account %d", bank_account_id, extra=log_extra)
 
 
+# Temporary table that holds the pricings of the bank accounts of the
+# chunk being processed by `_generate_cashflows_in_bulk()`.
+_cashflow_staging = sqla.table(
+    "cashflow_staging",
+    sqla.column("pricingId"),
+    sqla.column("bankAccountId"),
+    sqla.column("amount"),
+)
+
+
+def _generate_cashflows_in_bulk(
+    batch_id: int,
+    bank_account_infos: list[tuple[int, list[int]]],
+    pricings_by_bank_account: BaseQuery,
+    integrity_error_filters: tuple,
+) -> list[tuple[int, list[int]]]:
+    """Generate cashflows of bank accounts by chunks, with a few
+    set-based statements per chunk instead of a few statements per
+    bank account. Each chunk is committed, so that the generation can
+    be resumed on the same batch if it stops before its end.
+
+    Return the bank accounts that must be processed one by one by the
+    caller: those for which pricings add up to a positive total (which
+    requires the handling of finance incidents and debit notes) and
+    those of chunks that could not be processed.
+    """
+    remaining = []
+    venue_ids_by_bank_account = dict(bank_account_infos)
+    bank_account_ids = sorted(venue_ids_by_bank_account)
+    for start_index in range(0, len(bank_account_ids), CASHFLOW_GENERATION_CHUNK_SIZE):
+        chunk = bank_account_ids[start_index : start_index + CASHFLOW_GENERATION_CHUNK_SIZE]
+        log_extra = {
+            "batch": batch_id,
+            "first_bank_account": chunk[0],
+            "last_bank_account": chunk[-1],
+        }
+        start = time.perf_counter()
+        logger.info("Generating cashflows of chunk of bank accounts", extra=log_extra)
+        try:
+            with transaction():
+                db.session.execute(
+                    sqla.text(
+                        """
+                        CREATE TEMPORARY TABLE IF NOT EXISTS cashflow_staging (
+                          "pricingId" BIGINT PRIMARY KEY,
+                          "bankAccountId" BIGINT NOT NULL,
+                          amount INTEGER NOT NULL
+                        ) ON COMMIT DELETE ROWS
+                    """
+                    )
+                )
+                # Rows are not deleted if the commit only releases a
+                # savepoint (as in tests).
+                db.session.execute(sqla.delete(_cashflow_staging))
+                # Lock pricings, so that none of them can be modified
+                # or deleted between now and their link to a cashflow.
+                staged_pricings = (
+                    pricings_by_bank_account.filter(models.BankAccount.id.in_(chunk))
+                    .with_entities(models.Pricing.id, models.BankAccount.id, models.Pricing.amount)
+                    .with_for_update(of=models.Pricing)
+                )
+                db.session.execute(
+                    sqla.insert(_cashflow_staging).from_select(
+                        ["pricingId", "bankAccountId", "amount"],
+                        staged_pricings.statement,
+                    )
+                )
+
+                diff = (
+                    db.session.query(_cashflow_staging.c.bankAccountId, models.Pricing.id)
+                    .select_from(_cashflow_staging)
+                    .join(models.Pricing, models.Pricing.id == _cashflow_staging.c.pricingId)
+                    .join(models.Pricing.lines)
+                    .outerjoin(models.Pricing.booking)
+                    .outerjoin(models.Pricing.collectiveBooking)
+                    .outerjoin(educational_models.CollectiveBooking.collectiveStock)
+                    .filter(*integrity_error_filters)
+                )
+                diff_by_bank_account: dict[int, set[int]] = defaultdict(set)
+                for bank_account_id, pricing_id in diff:
+                    diff_by_bank_account[bank_account_id].add(pricing_id)
+                for bank_account_id, pricing_ids in diff_by_bank_account.items():
+                    logger.error(
+                        "Found integrity error on booking prices vs. pricing lines",
+                        extra={
+                            "pricing_lines": pricing_ids,
+                            "bank_account": bank_account_id,
+                        },
+                    )
+
+                positive_total_bank_account_ids = [
+                    bank_account_id
+                    for bank_account_id, in db.session.query(_cashflow_staging.c.bankAccountId)
+                    .group_by(_cashflow_staging.c.bankAccountId)
+                    .having(sqla.func.sum(_cashflow_staging.c.amount) > 0)
+                ]
+                excluded_bank_account_ids = list(diff_by_bank_account) + positive_total_bank_account_ids
+                if excluded_bank_account_ids:
+                    db.session.execute(
+                        sqla.delete(_cashflow_staging).where(
+                            _cashflow_staging.c.bankAccountId.in_(excluded_bank_account_ids)
+                        )
+                    )
+
+                # Cashflows and their links are built from the same
+                # staged pricings, so that the amount of each cashflow
+                # is the sum of its pricings.
+                result = db.session.execute(
+                    sqla.text(
+                        """
+                        WITH new_cashflow AS (
+                          INSERT INTO cashflow (status, "batchId", "bankAccountId", amount)
+                          SELECT :pending, :batch_id, "bankAccountId", sum(amount)
+                          FROM cashflow_staging
+                          GROUP BY "bankAccountId"
+                          RETURNING id, "bankAccountId"
+                        ),
+                        new_cashflow_pricing AS (
+                          INSERT INTO cashflow_pricing ("cashflowId", "pricingId")
+                          SELECT new_cashflow.id, cashflow_staging."pricingId"
+                          FROM cashflow_staging
+                          JOIN new_cashflow ON new_cashflow."bankAccountId" = cashflow_staging."bankAccountId"
+                          RETURNING "pricingId"
+                        ),
+                        updated AS (
+                          UPDATE pricing
+                          SET status = :processed
+                          FROM new_cashflow_pricing
+                          WHERE pricing.id = new_cashflow_pricing."pricingId"
+                          RETURNING pricing.id AS pricing_id
+                        )
+                        INSERT INTO pricing_log
+                        ("pricingId", "statusBefore", "statusAfter", reason)
+                        SELECT updated.pricing_id, :validated, :processed, :log_reason from updated
+                    """
+                    ),
+                    {
+                        "pending": models.CashflowStatus.PENDING.value,
+                        "batch_id": batch_id,
+                        "validated": models.PricingStatus.VALIDATED.value,
+                        "processed": models.PricingStatus.PROCESSED.value,
+                        "log_reason": models.PricingLogReason.GENERATE_CASHFLOW.value,
+                    },
+                )
+                n_pricings = result.rowcount
+        except Exception:  # pylint: disable=broad-except
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not generate cashflows of chunk of bank accounts", extra=log_extra)
+            remaining.extend(chunk)
+            continue
+        remaining.extend(positive_total_bank_account_ids)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Generated cashflows of chunk of bank accounts",
+            extra=log_extra | {"elapsed": elapsed, "pricings": n_pricings},
+        )
+    return [(bank_account_id, venue_ids_by_bank_account[bank_account_id]) for bank_account_id in remaining]
+
+
 def generate_payment_files(batch: models.CashflowBatch) -> None:
     """Generate all payment files that are related to the requested
     CashflowBatch and mark all related Cashflow as ``UNDER_REVIEW``.
@@ -1160,7 +1619,7 @@ def generate_payment_files(batch: models.CashflowBatch) -> None:
     _upload_files_to_google_drive(drive_folder_name, file_paths.values())
 
     logger.info("Updating cashflow status")
-    db.session.execute(
+    result = db.session.execute(
         sqla.text(
             """
         WITH updated AS (
@@ -1181,6 +1640,7 @@ def generate_payment_files(batch: models.CashflowBatch) -> None:
         },
     )
     db.session.commit()
+    metrics.add_rows(result.rowcount)
     logger.info("Updated cashflow status")
 
 
@@ -1237,26 +1697,35 @@ def _write_csv(
     row_formatter: typing.Callable[[typing.Iterable], typing.Iterable] = lambda row: row,
     compress: bool = False,
 ) -> pathlib.Path:
+    """Write a CSV file (within a ZIP archive if ``compress`` is set)
+    and return its path.
+
+    Rows are formatted, written and compressed as they are iterated,
+    so that memory usage does not depend on the number of rows.
+    """
     local_now = pytz.utc.localize(datetime.datetime.utcnow()).astimezone(utils.ACCOUNTING_TIMEZONE)
     filename = filename_base + local_now.strftime("_%Y%m%d_%H%M%S") + ".csv"
     # Store file in a dedicated directory within "/tmp". It's easier
     # to clean files in tests that way.
     path = pathlib.Path(tempfile.mkdtemp()) / filename
-    with open(path, "w+", encoding="utf-8") as fp:
+    with contextlib.ExitStack() as stack:
+        if compress:
+            path = pathlib.Path(str(path) + ".zip")
+            zfile = stack.enter_context(
+                zipfile.ZipFile(
+                    path,
+                    "w",
+                    compression=zipfile.ZIP_DEFLATED,
+                    compresslevel=settings.FINANCE_CSV_COMPRESSION_LEVEL,
+                )
+            )
+            fp = stack.enter_context(io.TextIOWrapper(zfile.open(filename, "w"), encoding="utf-8"))
+        else:
+            fp = stack.enter_context(open(path, "w+", encoding="utf-8"))
         writer = csv.writer(fp, quoting=csv.QUOTE_NONNUMERIC)
         writer.writerow(header)
         if rows is not None:
             writer.writerows(row_formatter(row) for row in rows)
-    if compress:
-        compressed_path = pathlib.Path(str(path) + ".zip")
-        with zipfile.ZipFile(
-            compressed_path,
-            "w",
-            compression=zipfile.ZIP_DEFLATED,
-            compresslevel=9,
-        ) as zfile:
-            zfile.write(path, arcname=path.name)
-        path = compressed_path
     return path
 
 
@@ -1306,7 +1775,9 @@ def _generate_bank_accounts_file(cutoff: datetime.datetime) -> pathlib.Path:
         _clean_for_accounting(row.iban),
         _clean_for_accounting(row.bic),
     )
-    return _write_csv("bank_accounts", header, rows=query, row_formatter=row_formatter)
+    return _write_csv(
+        "bank_accounts", header, rows=query.yield_per(CSV_EXPORT_BATCH_SIZE), row_formatter=row_formatter
+    )
 
 
 def _clean_for_accounting(value: str) -> str:
@@ -1423,7 +1894,7 @@ def _generate_payments_file(batch: models.CashflowBatch) -> pathlib.Path:
             sqla.column("deposit_type"),
             sqla_func.sum(sqla.column("pricing_amount")).label("pricing_amount"),
         )
-        .all()
+        .yield_per(CSV_EXPORT_BATCH_SIZE)
     )
 
     collective_query = get_collective_data(
@@ -1454,7 +1925,7 @@ def _generate_payments_file(batch: models.CashflowBatch) -> pathlib.Path:
             sqla.column("ministry"),
             sqla_func.sum(sqla.column("pricing_amount")).label("pricing_amount"),
         )
-        .all()
+        .yield_per(CSV_EXPORT_BATCH_SIZE)
     )
 
     return _write_csv(
@@ -1572,6 +2043,9 @@ def generate_debit_notes(batch: models.CashflowBatch) -> None:
                     "exc": str(exc),
                 },
             )
+    if feature.FeatureToggle.WIP_USE_STORED_REIMBURSEMENT_DETAILS.is_active():
+        with log_elapsed(logger, "Stored reimbursement details of debit notes"):
+            store_reimbursement_details(batch)
 
 
 def _get_cashflows_by_bank_accounts(batch: models.CashflowBatch, only_debit_notes: bool = False) -> list:
@@ -1592,35 +2066,242 @@ def _get_cashflows_by_bank_accounts(batch: models.CashflowBatch, only_debit_note
     return rows
 
 
-def generate_invoices(batch: models.CashflowBatch) -> None:
-    """Generate (and store) all invoices."""
+def generate_invoices(batch: models.CashflowBatch, workers: int | None = None) -> None:
+    """Generate (and store) all invoices.
+
+    ``workers`` (by default: INVOICE_RENDERING_WORKERS) is the number
+    of processes that render PDF invoices. See
+    `_generate_invoices_with_renderer_pool()` if it is greater than 1.
+    """
     rows = _get_cashflows_by_bank_accounts(batch)
 
-    for row in rows:
-        try:
-            with transaction():
-                extra = {"bank_account_id": row.bank_account_id}
-                with log_elapsed(logger, "Generated and sent invoice", extra):
-                    generate_and_store_invoice(
+    workers = workers or settings.INVOICE_RENDERING_WORKERS
+    with metrics.measure_stage("generate_invoices", {"batch": batch.id, "workers": workers}):
+        if workers > 1:
+            _generate_invoices_with_renderer_pool(rows, workers)
+        else:
+            for row in rows:
+                try:
+                    with transaction():
+                        extra = {"bank_account_id": row.bank_account_id}
+                        with log_elapsed(logger, "Generated and sent invoice", extra):
+                            generate_and_store_invoice(
+                                bank_account_id=row.bank_account_id,
+                                cashflow_ids=row.cashflow_ids,
+                            )
+                except Exception as exc:  # pylint: disable=broad-except
+                    if settings.IS_RUNNING_TESTS:
+                        raise
+                    logger.exception(
+                        "Could not generate invoice",
+                        extra={
+                            "bank_account_id": row.bank_account_id,
+                            "cashflow_ids": row.cashflow_ids,
+                            "exc": str(exc),
+                        },
+                    )
+        with log_elapsed(logger, "Generated CSV invoices file"):
+            path = generate_invoice_file(batch)
+        drive_folder_name = _get_drive_folder_name(batch)
+        with log_elapsed(logger, "Uploaded CSV invoices file to Google Drive"):
+            _upload_files_to_google_drive(drive_folder_name, [path])
+        if feature.FeatureToggle.WIP_USE_STORED_REIMBURSEMENT_DETAILS.is_active():
+            with log_elapsed(logger, "Stored reimbursement details of invoices"):
+                store_reimbursement_details(batch)
+
+
+def _generate_invoices_with_renderer_pool(rows: list, workers: int) -> None:
+    """Generate invoices, and render their PDF in a pool of processes.
+
+    Each invoice is created and committed first, then its PDF is
+    rendered while the next invoices are created. Once rendered, the
+    PDF is stored and the invoice is sent. (Rendering cannot be done
+    within the transaction that creates the invoice: the reference
+    scheme of invoices stays locked until the end of the transaction,
+    which would serialize renderings.)
+
+    If the PDF of an invoice could not be stored, the error is logged
+    with the invoice id, and the PDF must be stored again with the
+    `store_missing_invoice_pdfs` command (see
+    `store_missing_invoice_pdfs()`).
+    """
+    pool = None
+    pending: deque[tuple[models.Invoice, models.CashflowBatch, str, concurrent.futures.Future]] = deque()
+    render_times = []
+    try:
+        for row in rows:
+            try:
+                with transaction():
+                    generated = _generate_invoice_and_html(
                         bank_account_id=row.bank_account_id,
                         cashflow_ids=row.cashflow_ids,
                     )
-        except Exception as exc:  # pylint: disable=broad-except
+            except Exception as exc:  # pylint: disable=broad-except
+                if settings.IS_RUNNING_TESTS:
+                    raise
+                logger.exception(
+                    "Could not generate invoice",
+                    extra={
+                        "bank_account_id": row.bank_account_id,
+                        "cashflow_ids": row.cashflow_ids,
+                        "exc": str(exc),
+                    },
+                )
+                continue
+            if not generated:
+                continue
+            invoice, batch, invoice_html = generated
+            if pool is None:
+                # Renderers are warmed up with the first invoice.
+                pool = pdf_utils.PdfRendererPool(max_workers=workers, warmup_html=invoice_html)
+            pending.append((invoice, batch, invoice_html, pool.submit(invoice_html)))
+            # Limit the number of rendered PDF invoices held in memory.
+            while len(pending) > 2 * workers:
+                render_times.append(_store_and_send_rendered_invoice(*pending.popleft()))
+        while pending:
+            render_times.append(_store_and_send_rendered_invoice(*pending.popleft()))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    measured_render_times = [render_time for render_time in render_times if render_time is not None]
+    if measured_render_times:
+        logger.info(
+            "Rendered PDF invoices",
+            extra={
+                "count": len(measured_render_times),
+                "total_render_time": sum(measured_render_times),
+                "max_render_time": max(measured_render_times),
+            },
+        )
+
+
+def _store_and_send_rendered_invoice(
+    invoice: models.Invoice,
+    batch: models.CashflowBatch,
+    invoice_html: str,
+    future: "concurrent.futures.Future[pdf_utils.RenderedPdf]",
+) -> float | None:
+    """Store the PDF of an invoice that has been submitted to a
+    renderer pool, send the invoice and return its render time.
+    """
+    log_extra = {"invoice": invoice.id, "bank_account": invoice.bankAccountId}
+    render_time = None
+    try:
+        try:
+            rendered = future.result()
+        except Exception:  # pylint: disable=broad-except
+            # For example, a renderer process has crashed.
+            logger.warning("Could not render PDF invoice in renderer pool", extra=log_extra, exc_info=True)
+            _store_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_html=invoice_html)
+        else:
+            render_time = rendered.elapsed
+            logger.info("Rendered PDF invoice", extra=log_extra | {"render_time": render_time})
+            _upload_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_pdf=rendered.content)
+        with log_elapsed(logger, "Sent invoice", log_extra):
+            transactional_mails.send_invoice_available_to_pro_email(invoice, batch)
+    except Exception:  # pylint: disable=broad-except
+        if settings.IS_RUNNING_TESTS:
+            raise
+        logger.exception("Could not store or send PDF invoice", extra=log_extra)
+    return render_time
+
+
+def store_missing_invoice_pdfs(batch: models.CashflowBatch) -> list[int]:
+    """Store the PDF of invoices of the batch that are missing from
+    the object storage (e.g. because storing them failed in
+    `_generate_invoices_with_renderer_pool()`), and send these invoices.
+
+    Return the ids of invoices whose PDF has been stored. This function
+    can be called multiple times.
+    """
+    invoices = (
+        models.Invoice.query.filter(models.Invoice.cashflows.any(models.Cashflow.batchId == batch.id))
+        .order_by(models.Invoice.id)
+        .all()
+    )
+    stored_invoice_ids = []
+    for invoice in invoices:
+        try:
+            get_public_object(folder="invoices", object_id=invoice.storage_object_id)
+            continue
+        except FileNotFound:
+            pass
+        # Same criterion as in `_get_cashflows_by_bank_accounts()`.
+        is_debit_note = any(cashflow.amount > 0 for cashflow in invoice.cashflows)
+        if is_debit_note:
+            invoice_html = _generate_debit_note_html(invoice, batch)
+        else:
+            invoice_html = _generate_invoice_html(invoice, batch)
+        _store_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_html=invoice_html)
+        transactional_mails.send_invoice_available_to_pro_email(invoice, batch)
+        logger.info("Stored missing PDF invoice", extra={"invoice": invoice.id, "batch": batch.id})
+        stored_invoice_ids.append(invoice.id)
+    return stored_invoice_ids
+
+
+def store_reimbursement_details(batch: models.CashflowBatch) -> None:
+    """Store the rows of the reimbursement CSV file of each invoice of
+    the batch, so that the pro portal does not have to compute them
+    again each time an invoice is downloaded (see
+    `find_reimbursement_details_by_invoices()`).
+
+    Invoices whose details have already been stored are skipped, so
+    this function can be called multiple times.
+    """
+    # Avoid an import loop: the serializer depends on this module.
+    from pcapi.routes.serialization import reimbursement_csv_serialize
+
+    invoices = (
+        db.session.query(models.Invoice.id, models.Invoice.reference)
+        .join(models.Invoice.cashflows)
+        .filter(
+            models.Cashflow.batchId == batch.id,
+            ~sqla.exists().where(models.InvoiceReimbursementDetails.invoiceId == models.Invoice.id),
+        )
+        .distinct()
+        .order_by(models.Invoice.id)
+        .all()
+    )
+    for start_index in range(0, len(invoices), REIMBURSEMENT_DETAILS_CHUNK_SIZE):
+        chunk = invoices[start_index : start_index + REIMBURSEMENT_DETAILS_CHUNK_SIZE]
+        invoice_ids = [invoice.id for invoice in chunk]
+        try:
+            with transaction():
+                rows_by_reference: defaultdict[str, list[list]] = defaultdict(list)
+                for payment in repository.find_offerer_payments(
+                    invoices_references=[invoice.reference for invoice in chunk]
+                ):
+                    details = reimbursement_csv_serialize.ReimbursementDetails(payment)
+                    rows_by_reference[payment.invoice_reference].append(details.as_stored_row())
+                db.session.execute(
+                    sqla_psql.insert(models.InvoiceReimbursementDetails)
+                    .values(
+                        [
+                            {
+                                "invoiceId": invoice.id,
+                                "cashflowBatchId": batch.id,
+                                # Complementary invoices have no rows, see
+                                # `find_offerer_payments()`.
+                                "rows": rows_by_reference[invoice.reference],
+                            }
+                            for invoice in chunk
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                )
+        except Exception:  # pylint: disable=broad-except
             if settings.IS_RUNNING_TESTS:
                 raise
             logger.exception(
-                "Could not generate invoice",
-                extra={
-                    "bank_account_id": row.bank_account_id,
-                    "cashflow_ids": row.cashflow_ids,
-                    "exc": str(exc),
-                },
+                "Could not store reimbursement details of invoices",
+                extra={"batch": batch.id, "invoices": invoice_ids},
             )
-    with log_elapsed(logger, "Generated CSV invoices file"):
-        path = generate_invoice_file(batch)
-    drive_folder_name = _get_drive_folder_name(batch)
-    with log_elapsed(logger, "Uploaded CSV invoices file to Google Drive"):
-        _upload_files_to_google_drive(drive_folder_name, [path])
+            continue
+        logger.info(
+            "Stored reimbursement details of invoices",
+            extra={"batch": batch.id, "invoices": invoice_ids},
+        )
 
 
 def async_generate_invoices(batch: models.CashflowBatch) -> None:
@@ -1743,7 +2424,7 @@ def generate_invoice_file(batch: models.CashflowBatch) -> pathlib.Path:
         .order_by(
             sqla.column("invoice_reference"), sqla.column("deposit_type"), sqla.column("pricing_line_category").desc()
         )
-        .all()
+        .yield_per(CSV_EXPORT_BATCH_SIZE)
     )
 
     collective_query = get_collective_data(
@@ -1780,7 +2461,7 @@ def generate_invoice_file(batch: models.CashflowBatch) -> pathlib.Path:
         .order_by(
             sqla.column("invoice_reference"), sqla.column("ministry"), sqla.column("pricing_line_category").desc()
         )
-        .all()
+        .yield_per(CSV_EXPORT_BATCH_SIZE)
     )
 
     return _write_csv(
@@ -1818,13 +2499,30 @@ def _invoice_row_formatter(sql_row: typing.Any) -> tuple:
 
 
 def generate_and_store_invoice(bank_account_id: int, cashflow_ids: list[int], is_debit_note: bool = False) -> None:
+    log_extra = {"bank_account": bank_account_id}
+    generated = _generate_invoice_and_html(
+        bank_account_id=bank_account_id, cashflow_ids=cashflow_ids, is_debit_note=is_debit_note
+    )
+    if not generated:
+        return
+    invoice, batch, invoice_html = generated
+    with log_elapsed(logger, "Generated and stored PDF invoice", log_extra):
+        _store_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_html=invoice_html)
+    with log_elapsed(logger, "Sent invoice", log_extra):
+        transactional_mails.send_invoice_available_to_pro_email(invoice, batch)
+
+
+def _generate_invoice_and_html(
+    bank_account_id: int, cashflow_ids: list[int], is_debit_note: bool = False
+) -> tuple[models.Invoice, models.CashflowBatch, str] | None:
     log_extra = {"bank_account": bank_account_id}
     with log_elapsed(logger, "Generated invoice model instance", log_extra):
         invoice = _generate_invoice(
             bank_account_id=bank_account_id, cashflow_ids=cashflow_ids, is_debit_note=is_debit_note
         )
         if not invoice:
-            return
+            return None
+    metrics.add_rows(1)
 
     # The cashflows all come from the same cashflow batch,
     # so batch_id should be the same for every cashflow
@@ -1839,10 +2537,7 @@ def generate_and_store_invoice(bank_account_id: int, cashflow_ids: list[int], is
             invoice_html = _generate_debit_note_html(invoice, batch)
         else:
             invoice_html = _generate_invoice_html(invoice, batch)
-    with log_elapsed(logger, "Generated and stored PDF invoice", log_extra):
-        _store_invoice_pdf(invoice_storage_id=invoice.storage_object_id, invoice_html=invoice_html)
-    with log_elapsed(logger, "Sent invoice", log_extra):
-        transactional_mails.send_invoice_available_to_pro_email(invoice, batch)
+    return invoice, batch, invoice_html
 
 
 def _generate_invoice(
@@ -2311,6 +3006,10 @@ def _generate_debit_note_html(invoice: models.Invoice, batch: models.CashflowBat
 def _store_invoice_pdf(invoice_storage_id: str, invoice_html: str) -> None:
     with log_elapsed(logger, "Generated PDF invoice"):
         invoice_pdf = pdf_utils.generate_pdf_from_html(html_content=invoice_html)
+    _upload_invoice_pdf(invoice_storage_id=invoice_storage_id, invoice_pdf=invoice_pdf)
+
+
+def _upload_invoice_pdf(invoice_storage_id: str, invoice_pdf: bytes) -> None:
     with log_elapsed(logger, "Stored PDF invoice in object storage"):
         store_public_object(
             folder="invoices", object_id=invoice_storage_id, blob=invoice_pdf, content_type="application/pdf"
@@ -2488,6 +3187,7 @@ def _create_reimbursement_rule(
     validation.validate_reimbursement_rule(rule)
     db.session.add(rule)
     db.session.commit()
+    on_commit(reimbursement.invalidate_custom_rule_finders)
     return rule
 
 
@@ -2519,6 +3219,7 @@ def edit_reimbursement_rule(
         raise
     db.session.add(rule)
     db.session.flush()
+    on_commit(reimbursement.invalidate_custom_rule_finders)
     return rule
 
 
@@ -2676,66 +3377,186 @@ def _has_been_recredited(user: users_models.User) -> bool:
     return sorted_recredits[-1].recreditType == conf.RECREDIT_TYPE_AGE_MAPPING[user.age]
 
 
-def recredit_underage_users() -> None:
-    import pcapi.core.users.api as users_api
+def _get_latest_birth_date_for_age(age: int, now: datetime.datetime) -> datetime.date:
+    """Return the latest birth date of users who are at least ``age``
+    years old at ``now``, as computed by `User.age`.
+    """
+    one_day = datetime.timedelta(days=1)
+    birth_date = (now - relativedelta(years=age)).date()
+    # Adjust around February 29th.
+    while relativedelta(now, birth_date + one_day).years >= age:
+        birth_date += one_day
+    while relativedelta(now, birth_date).years < age:
+        birth_date -= one_day
+    return birth_date
+
+
+def _get_underage_users_to_recredit_ids() -> list[int]:
+    """Return ids of underage beneficiaries whose current deposit may
+    have to be recredited. Users whose current deposit has already been
+    recredited for their age are excluded. Other conditions are checked
+    by `_can_be_recredited()`.
+    """
+    now = datetime.datetime.utcnow()
+    sixteen_years_ago = now - relativedelta(years=16)
+    eighteen_years_ago = now - relativedelta(years=18)
+    latest_birth_date_for_17 = _get_latest_birth_date_for_age(17, now)
+
+    # The current deposit is the one that expires last (see `User.deposit`).
+    current_deposit_id = (
+        models.Deposit.query.filter(models.Deposit.userId == users_models.User.id)
+        .order_by(models.Deposit.expirationDate.desc())
+        .limit(1)
+        .with_entities(models.Deposit.id)
+        .scalar_subquery()
+    )
+    latest_recredit_type = (
+        models.Recredit.query.filter(models.Recredit.depositId == current_deposit_id)
+        .order_by(models.Recredit.dateCreated.desc())
+        .limit(1)
+        .with_entities(models.Recredit.recreditType)
+        .scalar_subquery()
+    )
+    query = (
+        users_models.User.query.filter(users_models.User.has_underage_beneficiary_role)
+        .filter(users_models.User.validatedBirthDate > eighteen_years_ago)
+        .filter(users_models.User.validatedBirthDate <= sixteen_years_ago)
+        .filter(current_deposit_id.is_not(None))
+        .filter(
+            sqla.or_(
+                sqla.and_(
+                    users_models.User.validatedBirthDate <= latest_birth_date_for_17,
+                    latest_recredit_type.is_distinct_from(conf.RECREDIT_TYPE_AGE_MAPPING[17]),
+                ),
+                sqla.and_(
+                    users_models.User.validatedBirthDate > latest_birth_date_for_17,
+                    latest_recredit_type.is_distinct_from(conf.RECREDIT_TYPE_AGE_MAPPING[16]),
+                ),
+            )
+        )
+        .with_entities(users_models.User.id)
+        .order_by(users_models.User.id)
+    )
+    return [user_id for user_id, in query]
 
-    sixteen_years_ago = datetime.datetime.utcnow() - relativedelta(years=16)
-    eighteen_years_ago = datetime.datetime.utcnow() - relativedelta(years=18)
 
-    user_ids = [
-        result
-        for result, in (
-            users_models.User.query.filter(users_models.User.has_underage_beneficiary_role)
-            .filter(users_models.User.validatedBirthDate > eighteen_years_ago)
-            .filter(users_models.User.validatedBirthDate <= sixteen_years_ago)
-            .with_entities(users_models.User.id)
-            .all()
-        )
-    ]
+def recredit_underage_users(dry_run: bool = False) -> dict[models.RecreditType, int]:
+    """Recredit deposits of underage beneficiaries who have celebrated
+    their birthday, and return the number of recredits by type.
+
+    Candidates are selected with a single query. Then, by chunks,
+    eligibility is checked on users that are loaded with their
+    deposits, recredits and fraud checks, and recredits, deposit
+    amounts and users are inserted or updated with bulk statements.
+
+    In ``dry_run`` mode, nothing is written and no one is notified.
+    """
+    import pcapi.core.users.api as users_api
+
+    user_ids = _get_underage_users_to_recredit_ids()
+    logger.info("Found %s underage users that may be recredited", len(user_ids), extra={"dry_run": dry_run})
 
     start_index = 0
     total_users_recredited = 0
+    recredit_counts: dict[models.RecreditType, int] = defaultdict(int)
     failed_users = []
 
     while start_index < len(user_ids):
+        chunk_user_ids = user_ids[start_index : start_index + RECREDIT_UNDERAGE_USERS_BATCH_SIZE]
+        start_index += RECREDIT_UNDERAGE_USERS_BATCH_SIZE
         users = (
-            users_models.User.query.filter(
-                users_models.User.id.in_(user_ids[start_index : start_index + RECREDIT_UNDERAGE_USERS_BATCH_SIZE])
-            )
+            users_models.User.query.filter(users_models.User.id.in_(chunk_user_ids))
             .options(sqla_orm.joinedload(users_models.User.deposits).joinedload(models.Deposit.recredits))
+            .options(sqla_orm.selectinload(users_models.User.beneficiaryFraudChecks))
             .all()
         )
 
-        users_to_recredit = [user for user in users if user.deposit and _can_be_recredited(user)]
-        users_and_recredit_amounts = []
-        with transaction():
-            for user in users_to_recredit:
-                try:
-                    recredit = _recredit_user(user, user.deposit)
-                    if recredit:  # recredit will be None is user's age is also None
-                        users_and_recredit_amounts.append((user, recredit.amount))
-                        user.recreditAmountToShow = recredit.amount if recredit.amount > 0 else None
-
-                        db.session.add(user)
-                        db.session.add(recredit)
-                        total_users_recredited += 1
-                except Exception as e:  # pylint: disable=broad-except
-                    failed_users.append(user.id)
-                    logger.exception("Could not recredit user %s: %s", user.id, e)
+        recredits = []
+        for user in users:
+            try:
+                if not user.deposit or not user.age or not _can_be_recredited(user):
                     continue
+            except Exception as e:  # pylint: disable=broad-except
+                failed_users.append(user.id)
+                logger.exception("Could not recredit user %s: %s", user.id, e)
+                continue
+            recredit_type = conf.RECREDIT_TYPE_AGE_MAPPING[user.age]
+            recredits.append((user, recredit_type, conf.RECREDIT_TYPE_AMOUNT_MAPPING[recredit_type]))
+
+        if dry_run:
+            for _user, recredit_type, _amount in recredits:
+                recredit_counts[recredit_type] += 1
+            logger.info(
+                "Would recredit %s underage users deposits (%s/%s users checked)",
+                len(recredits),
+                min(start_index, len(user_ids)),
+                len(user_ids),
+            )
+            continue
 
-        logger.info("Recredited %s underage users deposits", len(users_to_recredit))
+        if recredits:
+            try:
+                with transaction():
+                    _bulk_recredit(recredits)
+            except Exception as e:  # pylint: disable=broad-except
+                failed_users.extend(user.id for user, _recredit_type, _amount in recredits)
+                logger.exception("Could not recredit users: %s", e)
+                continue
+        for _user, recredit_type, _amount in recredits:
+            recredit_counts[recredit_type] += 1
+        total_users_recredited += len(recredits)
+        logger.info(
+            "Recredited %s underage users deposits (%s/%s users checked)",
+            len(recredits),
+            min(start_index, len(user_ids)),
+            len(user_ids),
+        )
 
-        for user, recredit_amount in users_and_recredit_amounts:
+        for user, _recredit_type, recredit_amount in recredits:
             external_attributes_api.update_external_user(user)
             domains_credit = users_api.get_domains_credit(user)
             transactional_mails.send_recredit_email_to_underage_beneficiary(user, recredit_amount, domains_credit)
             push_notifications.track_account_recredited(user.id, user.deposit, len(user.deposits))
 
-        start_index += RECREDIT_UNDERAGE_USERS_BATCH_SIZE
-    logger.info("Recredited %s users successfully", total_users_recredited)
+    if dry_run:
+        logger.info(
+            "Would recredit %s users",
+            sum(recredit_counts.values()),
+            extra={"recredits": {recredit_type.value: count for recredit_type, count in recredit_counts.items()}},
+        )
+    else:
+        logger.info("Recredited %s users successfully", total_users_recredited)
     if failed_users:
         logger.error("Failed to recredit %s users: %s", len(failed_users), failed_users)
+    return dict(recredit_counts)
+
+
+def _bulk_recredit(recredits: list[tuple[users_models.User, models.RecreditType, decimal.Decimal]]) -> None:
+    """Insert recredits and update deposits and users, with one
+    statement each (whatever the number of recredits).
+    """
+    db.session.execute(
+        sqla.insert(models.Recredit),
+        [
+            {"depositId": user.deposit.id, "amount": amount, "recreditType": recredit_type}
+            for user, recredit_type, amount in recredits
+        ],
+    )
+    db.session.execute(
+        sqla.update(models.Deposit.__table__)
+        .where(models.Deposit.id == sqla.bindparam("deposit_id"))
+        .values(amount=models.Deposit.amount + sqla.bindparam("recredit_amount")),
+        [{"deposit_id": user.deposit.id, "recredit_amount": amount} for user, _recredit_type, amount in recredits],
+    )
+    db.session.execute(
+        sqla.update(users_models.User.__table__)
+        .where(users_models.User.id == sqla.bindparam("user_id"))
+        .values(recreditAmountToShow=sqla.bindparam("recredit_amount_to_show")),
+        [
+            {"user_id": user.id, "recredit_amount_to_show": amount if amount > 0 else None}
+            for user, _recredit_type, amount in recredits
+        ],
+    )
 
 
 def update_bank_account_venues_links(
@@ -0,0 +1,114 @@
+"""Benchmark of the finance pipeline.
+
+Seed the database with offerers and used bookings, then run the whole
+pipeline on them (pricing, cashflows, payment files and invoices), as
+it runs on each payment day, and return the metrics of each stage.
+
+IMPORTANT: This must only be used on a local database. The pipeline
+processes ALL pending finance events and pricings, not only those of
+the seeded bookings.
+"""
+
+import contextlib
+import datetime
+import logging
+import typing
+
+import pcapi.core.bookings.factories as bookings_factories
+from pcapi.core.logging import log_elapsed
+import pcapi.core.offerers.factories as offerers_factories
+import pcapi.core.offers.factories as offers_factories
+from pcapi.models import db
+from pcapi.models import feature
+
+from . import api
+from . import factories
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Feature flags whose effect can be measured with `compare()`.
+COMPARABLE_FEATURES = (
+    feature.FeatureToggle.WIP_BATCHED_PRICING,
+    feature.FeatureToggle.WIP_SET_BASED_CASHFLOW_GENERATION,
+)
+
+
+def seed(offerers: int, bookings_per_offerer: int, custom_rules: int = 0) -> None:
+    """Create ``offerers`` offerers, each with a venue (that is its own
+    pricing point), a bank account and ``bookings_per_offerer`` used
+    bookings that are ready to be priced.
+
+    ``custom_rules`` custom reimbursement rules are spread over these
+    offerers. They all expired before bookings were used, so that they
+    are looked up when pricing each booking, but never apply.
+    """
+    # Bookings must have been used before the threshold of `price_events()`.
+    date_used = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    offerer_list = []
+    for _ in range(offerers):
+        venue = offerers_factories.VenueFactory(pricing_point="self")
+        offerer_list.append(venue.managingOfferer)
+        offerers_factories.VenueBankAccountLinkFactory(venue=venue)
+        stock = offers_factories.ThingStockFactory(offer__venue=venue, price=10, quantity=None)
+        for _ in range(bookings_per_offerer):
+            booking = bookings_factories.UsedBookingFactory(stock=stock, dateUsed=date_used)
+            factories.UsedBookingFinanceEventFactory(booking=booking)
+
+    for i in range(custom_rules if offerer_list else 0):
+        end = date_used - datetime.timedelta(days=i + 1)
+        factories.CustomReimbursementRuleFactory(
+            offerer=offerer_list[i % len(offerer_list)],
+            timespan=[end - datetime.timedelta(days=1), end],
+        )
+
+
+def run(
+    offerers: int,
+    bookings_per_offerer: int,
+    price_workers: int | None = None,
+    invoice_workers: int | None = None,
+    custom_rules: int = 0,
+) -> list[metrics.StageMetrics]:
+    extra = {"offerers": offerers, "bookings_per_offerer": bookings_per_offerer, "custom_rules": custom_rules}
+    with log_elapsed(logger, "Seeded finance pipeline benchmark", extra):
+        seed(offerers, bookings_per_offerer, custom_rules=custom_rules)
+
+    with metrics.record_stages() as stages:
+        api.price_events(workers=price_workers)
+        batch = api.generate_cashflows_and_payment_files(cutoff=datetime.datetime.utcnow())
+        api.generate_invoices(batch, workers=invoice_workers)
+    return stages
+
+
+def compare(
+    flag: feature.FeatureToggle,
+    offerers: int,
+    bookings_per_offerer: int,
+    **kwargs: typing.Any,
+) -> dict[bool, list[metrics.StageMetrics]]:
+    """Run the benchmark with ``flag`` disabled, then enabled, on newly
+    seeded bookings each time, and return the metrics of both runs.
+    """
+    results = {}
+    for is_active in (False, True):
+        with _override_feature(flag, is_active):
+            results[is_active] = run(offerers, bookings_per_offerer, **kwargs)
+    return results
+
+
+@contextlib.contextmanager
+def _override_feature(flag: feature.FeatureToggle, is_active: bool) -> typing.Iterator[None]:
+    was_active = flag.is_active()
+    _set_feature(flag, is_active)
+    try:
+        yield
+    finally:
+        _set_feature(flag, was_active)
+
+
+def _set_feature(flag: feature.FeatureToggle, is_active: bool) -> None:
+    feature.Feature.query.filter_by(name=flag.name).update({"isActive": is_active})
+    db.session.commit()
+    feature.invalidate_features_cache()
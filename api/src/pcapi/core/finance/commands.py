@@ -6,7 +6,9 @@ import click
 import sqlalchemy.orm as sqla_orm
 
 from pcapi import settings
+from pcapi.core.finance import benchmark as finance_benchmark
 from pcapi.core.finance import ds
+from pcapi.core.finance import metrics as finance_metrics
 import pcapi.core.finance.api as finance_api
 import pcapi.core.finance.exceptions as finance_exceptions
 import pcapi.core.finance.models as finance_models
@@ -24,11 +26,17 @@ logger = logging.getLogger(__name__)
 
 
 @blueprint.cli.command("price_finance_events")
+@click.option(
+    "--workers",
+    help="Number of concurrent workers (default: PRICE_EVENTS_WORKERS)",
+    type=int,
+    default=None,
+)
 @cron_decorators.log_cron_with_transaction
 @cron_decorators.cron_require_feature(FeatureToggle.PRICE_FINANCE_EVENTS)
-def price_finance_events() -> None:
+def price_finance_events(workers: int | None) -> None:
     """Price finance events that have recently been created."""
-    finance_api.price_events()
+    finance_api.price_events(workers=workers)
 
 
 @blueprint.cli.command("generate_cashflows_and_payment_files")
@@ -49,7 +57,13 @@ def generate_cashflows_and_payment_files(override_feature_flag: bool, cutoff: da
 
 @blueprint.cli.command("generate_invoices")
 @click.option("--batch-id", type=int, required=True)
-def generate_invoices(batch_id: int) -> None:
+@click.option(
+    "--workers",
+    help="Number of processes that render PDF invoices (default: INVOICE_RENDERING_WORKERS)",
+    type=int,
+    default=None,
+)
+def generate_invoices(batch_id: int, workers: int | None) -> None:
     """Generate (and store) all invoices of a CashflowBatch.
 
     This command can be run multiple times.
@@ -60,7 +74,7 @@ def generate_invoices(batch_id: int) -> None:
         return
 
     try:
-        finance_api.generate_invoices(batch)
+        finance_api.generate_invoices(batch, workers=workers)
     except finance_exceptions.NoInvoiceToGenerate:
         logger.info("No invoice to generate")
     finally:
@@ -82,6 +96,23 @@ def generate_invoices(batch_id: int) -> None:
         )
 
 
+@blueprint.cli.command("store_missing_invoice_pdfs")
+@click.option("--batch-id", type=int, required=True)
+def store_missing_invoice_pdfs(batch_id: int) -> None:
+    """Store (and send) the PDF of invoices of a CashflowBatch that are
+    missing from the object storage.
+
+    This command can be run multiple times.
+    """
+    batch = finance_models.CashflowBatch.query.get(batch_id)
+    if not batch:
+        print(f"Could not store PDF invoices for this batch, as it doesn't exist :{batch_id}")
+        return
+
+    invoice_ids = finance_api.store_missing_invoice_pdfs(batch)
+    print(f"Stored {len(invoice_ids)} missing PDF invoice(s): {invoice_ids}")
+
+
 @blueprint.cli.command("add_custom_offer_reimbursement_rule")
 @click.option("--offer-id", required=True)
 @click.option("--offer-original-amount", required=True)
@@ -158,10 +189,75 @@ def add_custom_offer_reimbursement_rule(
     print(f"Created new rule: {rule.id}")
 
 
+@blueprint.cli.command("check_pricing_point_revenues")
+@click.option("--year", help="Accounting year to check (defaults to the current year)", type=int, required=False)
+@click.option("--fix", help="Replace inconsistent revenues by the revenue computed from pricings", is_flag=True)
+def check_pricing_point_revenues(year: int | None, fix: bool) -> None:
+    """Compare the revenue maintained for each pricing point with the
+    revenue computed from its pricings.
+
+    This must be run with `--fix` to initialize revenues of past years
+    before enabling the WIP_USE_PRICING_POINT_REVENUE feature flag.
+    """
+    mismatches = finance_api.check_pricing_point_revenues(year, fix=fix)
+    print(f"Found {len(mismatches)} inconsistent pricing point revenue(s)")
+
+
 @blueprint.cli.command("recredit_underage_users")
+@click.option("--dry-run", help="Only report the number of recredits", is_flag=True, default=False)
 @cron_decorators.log_cron_with_transaction
-def recredit_underage_users() -> None:
-    finance_api.recredit_underage_users()
+def recredit_underage_users(dry_run: bool) -> None:
+    recredit_counts = finance_api.recredit_underage_users(dry_run=dry_run)
+    if dry_run:
+        for recredit_type, count in recredit_counts.items():
+            print(f"Would recredit {count} deposit(s) with {recredit_type.value}")
+
+
+@blueprint.cli.command("benchmark_finance_pipeline")
+@click.option("--offerers", help="Number of offerers to create", type=int, default=10)
+@click.option("--bookings-per-offerer", help="Number of used bookings to create per offerer", type=int, default=10)
+@click.option("--price-workers", help="Number of pricing workers (default: PRICE_EVENTS_WORKERS)", type=int)
+@click.option("--invoice-workers", help="Number of invoice renderers (default: INVOICE_RENDERING_WORKERS)", type=int)
+@click.option("--custom-rules", help="Number of (expired) custom reimbursement rules to create", type=int, default=0)
+@click.option(
+    "--compare-feature",
+    help="Run the benchmark twice, with this feature flag disabled then enabled",
+    type=click.Choice([flag.name for flag in finance_benchmark.COMPARABLE_FEATURES]),
+    default=None,
+)
+def benchmark_finance_pipeline(
+    offerers: int,
+    bookings_per_offerer: int,
+    price_workers: int | None,
+    invoice_workers: int | None,
+    custom_rules: int,
+    compare_feature: str | None,
+) -> None:
+    """Seed the database with used bookings, run the whole finance
+    pipeline on them and print the metrics of each stage.
+
+    This must only be used on a local database, see `finance.benchmark`.
+    """
+    if not settings.CAN_RUN_SANDBOX:
+        print("The finance pipeline benchmark is disabled on this environment")
+        return
+    kwargs = {"price_workers": price_workers, "invoice_workers": invoice_workers, "custom_rules": custom_rules}
+    if not compare_feature:
+        _print_benchmark_stages(finance_benchmark.run(offerers, bookings_per_offerer, **kwargs))
+        return
+    results = finance_benchmark.compare(FeatureToggle[compare_feature], offerers, bookings_per_offerer, **kwargs)
+    for is_active, stages in results.items():
+        print(f"{compare_feature} {'enabled' if is_active else 'disabled'}:")
+        _print_benchmark_stages(stages)
+
+
+def _print_benchmark_stages(stages: list[finance_metrics.StageMetrics]) -> None:
+    for stage in stages:
+        rows_per_second = f"{stage.rows_per_second:.1f}" if stage.rows_per_second is not None else "-"
+        print(
+            f"{stage.stage}: {stage.elapsed:.2f}s, {stage.rows} rows ({rows_per_second} rows/s), "
+            f"{stage.queries} queries, {stage.lock_waits} lock waits ({stage.lock_wait_time:.2f}s)"
+        )
 
 
 @blueprint.cli.command("import_ds_bank_information_applications")
@@ -14,6 +14,9 @@ REDIS_GENERATE_INVOICES_COUNTER_TIMEOUT = 60 * 60 * 12  # 12h
 REDIS_GENERATE_INVOICES_LENGTH = "pcapi:finance:generate_invoices:length"
 REDIS_GENERATE_INVOICES_LENGTH_TIMEOUT = 60 * 60 * 12  # 12h
 
+# incremented whenever a custom reimbursement rule is created or edited
+REDIS_CUSTOM_REIMBURSEMENT_RULES_VERSION = "pcapi:finance:custom_reimbursement_rules:version"
+
 # Age in days before generating a cashflow and a debit note when total pricings is positive
 DEBIT_NOTE_AGE_THRESHOLD_FOR_CASHFLOW = 90
 
@@ -0,0 +1,171 @@
+"""Metrics of the stages of the finance pipeline (pricing, cashflows,
+payment files and invoices).
+
+Each stage runs within `measure_stage()`, which logs a single
+structured line when the stage ends: elapsed time, number of processed
+rows (and rows per second), number of SQL queries, and time spent
+waiting for pricing point and bank account locks.
+
+Metrics are attached to the current context: threads that work for a
+stage must run in a copy of the context of the stage (see
+`contextvars.copy_context()`).
+"""
+
+import collections.abc
+import contextlib
+import contextvars
+import dataclasses
+import logging
+import threading
+import time
+import typing
+
+import sqlalchemy as sqla
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class StageMetrics:
+    stage: str
+    elapsed: float = 0
+    rows: int = 0
+    queries: int = 0
+    lock_waits: int = 0
+    lock_wait_time: float = 0
+    _lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def rows_per_second(self) -> float | None:
+        if not self.elapsed:
+            return None
+        return self.rows / self.elapsed
+
+    def add_rows(self, count: int) -> None:
+        with self._lock:
+            self.rows += count
+
+    def add_query(self) -> None:
+        with self._lock:
+            self.queries += 1
+
+    def add_lock_wait(self, wait_time: float) -> None:
+        with self._lock:
+            self.lock_waits += 1
+            self.lock_wait_time += wait_time
+
+    def as_log_extra(self) -> dict:
+        return {
+            "stage": self.stage,
+            "elapsed": self.elapsed,
+            "rows": self.rows,
+            "rows_per_second": self.rows_per_second,
+            "queries": self.queries,
+            "lock_waits": self.lock_waits,
+            "lock_wait_time": self.lock_wait_time,
+        }
+
+
+_current_stage: contextvars.ContextVar[StageMetrics | None] = contextvars.ContextVar(
+    "finance_current_stage", default=None
+)
+_recorded_stages: contextvars.ContextVar[list[StageMetrics] | None] = contextvars.ContextVar(
+    "finance_recorded_stages", default=None
+)
+
+
+@contextlib.contextmanager
+def measure_stage(stage: str, extra: dict | None = None) -> collections.abc.Generator[StageMetrics, None, None]:
+    """A context manager that measures a stage of the finance pipeline
+    and logs its metrics when it ends (even if it fails).
+
+    A stage that runs within another stage has its own metrics: its
+    queries and lock waits are not counted in the outer stage.
+    """
+    metrics = StageMetrics(stage=stage)
+    token = _current_stage.set(metrics)
+    _listen_to_queries()
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.elapsed = time.perf_counter() - start
+        _stop_listening_to_queries()
+        _current_stage.reset(token)
+        recorded = _recorded_stages.get()
+        if recorded is not None:
+            recorded.append(metrics)
+        logger.info("Measured finance pipeline stage", extra=(extra or {}) | metrics.as_log_extra())
+
+
+@contextlib.contextmanager
+def record_stages() -> collections.abc.Generator[list[StageMetrics], None, None]:
+    """A context manager that collects the metrics of all stages that
+    end within the block, in order.
+    """
+    stages: list[StageMetrics] = []
+    token = _recorded_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _recorded_stages.reset(token)
+
+
+def add_rows(count: int) -> None:
+    """Add ``count`` processed rows to the current stage, if any."""
+    metrics = _current_stage.get()
+    if metrics:
+        metrics.add_rows(count)
+
+
+@contextlib.contextmanager
+def measure_lock_wait() -> collections.abc.Generator[None, None, None]:
+    """A context manager that adds the execution time of the block to
+    the lock wait time of the current stage, if any.
+    """
+    metrics = _current_stage.get()
+    if not metrics:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_lock_wait(time.perf_counter() - start)
+
+
+def _count_query(statement: str, **kwargs: typing.Any) -> None:
+    metrics = _current_stage.get()
+    if not metrics:
+        return
+    # Like `assert_num_queries()`, do not count savepoints.
+    if statement.startswith("SAVEPOINT") or statement.startswith("RELEASE SAVEPOINT"):
+        return
+    metrics.add_query()
+
+
+# Queries are only listened to while a stage is measured, so that
+# other queries do not pay for `_count_query()`. Stages may be nested
+# or run concurrently: the listener is registered by the first one and
+# removed by the last one.
+_listener_lock = threading.Lock()
+_listening_stages = 0
+
+
+def _listen_to_queries() -> None:
+    global _listening_stages  # pylint: disable=global-statement
+
+    with _listener_lock:
+        if not _listening_stages:
+            sqla.event.listen(sqla.engine.Engine, "after_cursor_execute", _count_query, named=True)
+        _listening_stages += 1
+
+
+def _stop_listening_to_queries() -> None:
+    global _listening_stages  # pylint: disable=global-statement
+
+    with _listener_lock:
+        _listening_stages -= 1
+        if not _listening_stages:
+            sqla.event.remove(sqla.engine.Engine, "after_cursor_execute", _count_query)
@@ -485,6 +485,117 @@ class PricingLog(PcObject, Base, Model):
     reason: PricingLogReason = sqla.Column(db_utils.MagicEnum(PricingLogReason), nullable=False)
 
 
+class PricingPointRevenue(Base, Model):
+    """Revenue of a pricing point for an accounting year, in euro cents.
+
+    It is the sum of the amount of individual bookings that have a
+    pricing which is neither cancelled nor rejected (the same sum as
+    the one computed from scratch by `api._get_current_revenue()`).
+
+    This table is maintained by triggers on the pricing and booking
+    tables (see `update_pricing_point_revenue`).
+    """
+
+    __tablename__ = "pricing_point_revenue"
+
+    pricingPointId: int = sqla.Column(
+        sqla.BigInteger, sqla.ForeignKey("venue.id", ondelete="CASCADE"), primary_key=True
+    )
+    year: int = sqla.Column(sqla.Integer, primary_key=True)
+    revenue: int = sqla.Column(sqla.BigInteger, nullable=False, server_default="0")
+
+
+def _get_revenue_year_sql(value_date: str) -> str:
+    # Must match `api._get_revenue_year()`.
+    timezone = utils.ACCOUNTING_TIMEZONE.zone
+    return f"EXTRACT(YEAR FROM timezone('{timezone}', timezone('UTC', {value_date})))::integer"
+
+
+_UNCOUNTED_PRICING_STATUSES_SQL = f"""('{PricingStatus.CANCELLED.value}', '{PricingStatus.REJECTED.value}')"""
+
+PricingPointRevenue.trig_ddl = f"""
+    CREATE OR REPLACE FUNCTION update_pricing_point_revenue()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        old_is_counted boolean := false;
+        new_is_counted boolean := false;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            old_is_counted := OLD."bookingId" IS NOT NULL AND OLD.status NOT IN {_UNCOUNTED_PRICING_STATUSES_SQL};
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            new_is_counted := NEW."bookingId" IS NOT NULL AND NEW.status NOT IN {_UNCOUNTED_PRICING_STATUSES_SQL};
+        END IF;
+
+        IF TG_OP = 'UPDATE' AND old_is_counted = new_is_counted AND (
+            NOT old_is_counted OR (
+                OLD."bookingId" = NEW."bookingId"
+                AND OLD."pricingPointId" = NEW."pricingPointId"
+                AND {_get_revenue_year_sql('OLD."valueDate"')} = {_get_revenue_year_sql('NEW."valueDate"')}
+            )
+        ) THEN
+            -- e.g. a pricing that is processed, then invoiced
+            RETURN NULL;
+        END IF;
+
+        IF old_is_counted THEN
+            INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+            SELECT
+                OLD."pricingPointId",
+                {_get_revenue_year_sql('OLD."valueDate"')},
+                -(booking.amount * booking.quantity * 100)::bigint
+            FROM booking WHERE booking.id = OLD."bookingId"
+            ON CONFLICT ("pricingPointId", year)
+            DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+        END IF;
+        IF new_is_counted THEN
+            INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+            SELECT
+                NEW."pricingPointId",
+                {_get_revenue_year_sql('NEW."valueDate"')},
+                (booking.amount * booking.quantity * 100)::bigint
+            FROM booking WHERE booking.id = NEW."bookingId"
+            ON CONFLICT ("pricingPointId", year)
+            DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS pricing_update_pricing_point_revenue ON pricing;
+    CREATE TRIGGER pricing_update_pricing_point_revenue
+    AFTER INSERT OR DELETE OR UPDATE OF status, "bookingId", "pricingPointId", "valueDate" ON pricing
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_pricing_point_revenue();
+
+    CREATE OR REPLACE FUNCTION update_pricing_point_revenue_on_booking_amount()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO pricing_point_revenue ("pricingPointId", year, revenue)
+        SELECT
+            pricing."pricingPointId",
+            {_get_revenue_year_sql('pricing."valueDate"')},
+            ((NEW.amount * NEW.quantity - OLD.amount * OLD.quantity) * 100)::bigint
+        FROM pricing
+        WHERE pricing."bookingId" = NEW.id AND pricing.status NOT IN {_UNCOUNTED_PRICING_STATUSES_SQL}
+        ON CONFLICT ("pricingPointId", year)
+        DO UPDATE SET revenue = pricing_point_revenue.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS booking_update_pricing_point_revenue ON booking;
+    CREATE TRIGGER booking_update_pricing_point_revenue
+    AFTER UPDATE OF amount, quantity ON booking
+    FOR EACH ROW
+    WHEN (OLD.amount * OLD.quantity IS DISTINCT FROM NEW.amount * NEW.quantity)
+    EXECUTE PROCEDURE update_pricing_point_revenue_on_booking_amount()
+    """
+
+# The triggers are set on the pricing and booking tables, which must exist.
+sqla.event.listen(Pricing.__table__, "after_create", sqla.DDL(PricingPointRevenue.trig_ddl))
+
+
 # TODO(fseguin|dbaty, 2022-01-11): maybe merge with core.categories.subcategories.ReimbursementRuleChoices ?
 class RuleGroup(enum.Enum):
     STANDARD = dict(
@@ -853,6 +964,26 @@ class InvoiceCashflow(Base, Model):
     )
 
 
+class InvoiceReimbursementDetails(Base, Model):
+    """The rows of the reimbursement CSV file of an invoice, as they were
+    when the invoice was generated.
+
+    An invoice belongs to a single offerer (through its bank account)
+    and to a single cashflow batch. Rows are stored as formatted by
+    `ReimbursementDetails.as_stored_row()`, so that the pro portal can
+    export them without aggregating pricings, cashflows and invoices
+    again (see `api.store_reimbursement_details()`).
+    """
+
+    __tablename__ = "invoice_reimbursement_details"
+
+    invoiceId: int = sqla.Column(sqla.BigInteger, sqla.ForeignKey("invoice.id", ondelete="CASCADE"), primary_key=True)
+    cashflowBatchId: int = sqla.Column(
+        sqla.BigInteger, sqla.ForeignKey("cashflow_batch.id"), index=True, nullable=False
+    )
+    rows: list[list] = sqla.Column(sqla_psql.JSONB, nullable=False)
+
+
 # "Payment", "PaymentStatus" and "PaymentMessage" are deprecated. They
 # were used in the "old" reimbursement system. No new data is created
 # with these models since 2022-01-01. These models have been replaced
@@ -82,6 +82,21 @@ def get_invoices_by_references(references: list[str]) -> list[models.Invoice]:
     return models.Invoice.query.filter(models.Invoice.reference.in_(references)).order_by(models.Invoice.date).all()
 
 
+def get_stored_reimbursement_details(invoices_references: list[str]) -> list[tuple[str, list[list]]]:
+    """Return the reference and the stored reimbursement details of
+    requested invoices, if they have been stored.
+    """
+    return (
+        models.InvoiceReimbursementDetails.query.join(
+            models.Invoice, models.Invoice.id == models.InvoiceReimbursementDetails.invoiceId
+        )
+        .filter(models.Invoice.reference.in_(invoices_references))
+        .order_by(models.Invoice.date, models.Invoice.id)
+        .with_entities(models.Invoice.reference, models.InvoiceReimbursementDetails.rows)
+        .all()
+    )
+
+
 def find_offerer_payments(
     offerer_id: int | None = None,
     reimbursement_period: tuple[datetime.date, datetime.date] | None = None,
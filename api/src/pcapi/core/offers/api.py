@@ -4,6 +4,7 @@ import enum
 import logging
 import typing
 
+from flask import current_app
 from flask_sqlalchemy import BaseQuery
 from psycopg2.errorcodes import CHECK_VIOLATION
 from psycopg2.errorcodes import UNIQUE_VIOLATION
@@ -36,6 +37,7 @@ import pcapi.core.external_bookings.api as external_bookings_api
 from pcapi.core.external_bookings.boost.exceptions import BoostAPIException
 from pcapi.core.external_bookings.cds.exceptions import CineDigitalServiceAPIException
 from pcapi.core.external_bookings.cgr.exceptions import CGRAPIException
+import pcapi.core.external_bookings.exceptions as external_bookings_exceptions
 from pcapi.core.finance import api as finance_api
 from pcapi.core.finance import models as finance_models
 import pcapi.core.finance.conf as finance_conf
@@ -62,6 +64,7 @@ import pcapi.utils.cinema_providers as cinema_providers_utils
 from pcapi.utils.custom_logic import OPERATIONS
 from pcapi.utils.date import local_datetime_to_default_timezone
 from pcapi.workers import push_notification_job
+from pcapi.workers import refresh_cinema_stock_quantity_job
 
 from . import exceptions
 from . import models
@@ -76,6 +79,7 @@ AnyOffer = educational_api_offer.AnyCollectiveOffer | models.Offer
 
 OFFERS_RECAP_LIMIT = 501
 STOCK_LIMIT_TO_DELETE = 50
+CINEMA_STOCK_REFRESH_KEY_PREFIX = "pcapi:offers:cinema_stock_refresh:"
 
 
 OFFER_LIKE_MODELS = {
@@ -1278,6 +1282,12 @@ def update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer:
 
     try:
         shows_remaining_places = get_shows_remaining_places_from_provider(venue_provider.provider.localClass, offer)
+    except external_bookings_exceptions.ExternalBookingUnavailableError:
+        logger.info(
+            "Skipped getting shows remaining places from unavailable provider",
+            extra={"offer": offer.id, "provider": venue_provider.provider.localClass},
+        )
+        return
     except (EMSAPIException, BoostAPIException, CineDigitalServiceAPIException, CGRAPIException) as e:
         # If we can't retrieve the stocks from the provider, we stop here to avoid breaking the code following this function
         # This is not ideal, I believe this function should be called on its own, or asynchronously
@@ -1351,6 +1361,27 @@ def update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer:
         )
 
 
+def refresh_cinema_stock_quantity(offer: models.Offer) -> None:
+    """Update the quantity of the stocks of a cinema offer to match the
+    remaining places of its shows.
+
+    Behind WIP_ASYNC_CINEMA_STOCK_REFRESH, stocks are updated (and the
+    offer is reindexed if needed) by a background job, so that the
+    current stocks are returned at once, without waiting for the cinema
+    provider. The job is enqueued at most once per
+    CINEMA_STOCK_REFRESH_INTERVAL for each offer, which also bounds
+    how often the provider is called.
+    """
+    if not FeatureToggle.WIP_ASYNC_CINEMA_STOCK_REFRESH.is_active():
+        update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer)
+        return
+
+    key = f"{CINEMA_STOCK_REFRESH_KEY_PREFIX}{offer.id}"
+    if not current_app.redis_client.set(key, "1", nx=True, ex=settings.CINEMA_STOCK_REFRESH_INTERVAL):
+        return  # already refreshed (or being refreshed) recently
+    refresh_cinema_stock_quantity_job.refresh_cinema_stock_quantity_job.delay(offer.id)
+
+
 def whitelist_product(idAtProviders: str) -> models.Product | None:
     titelive_product = get_new_product_from_ean13(idAtProviders)
 
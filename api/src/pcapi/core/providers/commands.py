@@ -1,12 +1,21 @@
+from datetime import datetime
 import logging
+import statistics
+from time import perf_counter
 from time import time
+import typing
 
 import click
 import sqlalchemy as sa
 
+import pcapi.core.offers.models as offers_models
 from pcapi.core.providers import allocine_movie_list
 import pcapi.core.providers.repository as providers_repository
 from pcapi.local_providers import provider_manager
+from pcapi.local_providers.local_provider import LocalProvider
+from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.models import Model
+from pcapi.models import db
 from pcapi.utils.blueprint import Blueprint
 
 from . import models
@@ -118,3 +127,72 @@ def update_providables_by_provider_id(provider_id: int, limit: int | None) -> No
 def update_gtl(file: str) -> None:
     generate_titelive_gtl_from_file(file)
     # TODO we can later automatically reindex only the offers for which the gtl changed
+
+
+class _SyntheticFeed(LocalProvider):
+    """A fake provider that yields batches of stocks (like showtimes of
+    a movie in a cinema), without any venue nor provider in database.
+    """
+
+    name = "Synthetic feed"
+    can_create = False
+
+    def __init__(self, items: int, batch_size: int) -> None:  # pylint: disable=super-init-not-called
+        self.batches = iter(range(0, items, batch_size))
+        self.items = items
+        self.batch_size = batch_size
+
+    def __next__(self) -> list[ProvidableInfo]:
+        start = next(self.batches)
+        return [
+            ProvidableInfo(
+                type=offers_models.Stock,
+                id_at_providers=f"benchmark-{i}",
+                new_id_at_provider=f"benchmark-{i}",
+                date_modified_at_provider=datetime.utcnow(),
+            )
+            for i in range(start, min(start + self.batch_size, self.items))
+        ]
+
+    def fill_object_attributes(self, obj: Model) -> None:
+        pass
+
+
+@blueprint.cli.command("benchmark_local_provider_lookup")
+@click.option("--items", help="Number of items of the synthetic feed", type=int, default=100_000)
+@click.option("--batch-size", help="Number of items yielded at once by the feed", type=int, default=50)
+def benchmark_local_provider_lookup(items: int, batch_size: int) -> None:
+    """Compare the cost of looking up existing objects while
+    synchronizing a synthetic feed: one query per item versus one query
+    per batch of items.
+
+    Nothing is written: the transaction is rolled back.
+    """
+
+    def lookup_per_item(feed: LocalProvider, providable_infos: list[ProvidableInfo]) -> None:
+        for providable_info in providable_infos:
+            feed.get_existing_pc_obj(providable_info, {}, {})
+
+    def lookup_per_batch(feed: LocalProvider, providable_infos: list[ProvidableInfo]) -> None:
+        prefetched_objects = feed.prefetch_existing_objects(providable_infos, {}, {})
+        for providable_info in providable_infos:
+            feed.get_existing_pc_obj(providable_info, {}, {}, prefetched_objects)
+
+    strategies: tuple[tuple[str, typing.Callable], ...] = (
+        ("per item", lookup_per_item),
+        ("per batch", lookup_per_batch),
+    )
+    for name, lookup in strategies:
+        feed = _SyntheticFeed(items, batch_size)
+        latencies = []
+        start = perf_counter()
+        for providable_infos in feed:
+            batch_start = perf_counter()
+            lookup(feed, providable_infos)
+            latencies.append(perf_counter() - batch_start)
+        elapsed = perf_counter() - start
+        db.session.rollback()
+        print(
+            f"{name}: {elapsed:.2f} s for {items} items, "
+            f"median latency per batch {statistics.median(latencies) * 1000:.2f} ms"
+        )
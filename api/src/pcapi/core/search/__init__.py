@@ -1,8 +1,11 @@
 from collections import abc
+import concurrent.futures
 import datetime
 import enum
 import logging
+import time
 
+import flask
 from flask_sqlalchemy import BaseQuery
 import sqlalchemy as sa
 
@@ -15,6 +18,7 @@ from pcapi.core.educational import models as educational_models
 from pcapi.core.offerers import models as offerers_models
 from pcapi.core.offers import models as offers_models
 import pcapi.core.offers.repository as offers_repository
+from pcapi.core.search import offer_indexation
 from pcapi.core.search.backends import base
 from pcapi.models import db
 from pcapi.models.feature import FeatureToggle
@@ -206,7 +210,11 @@ def async_index_offers_of_venue_ids(
         )
 
 
-def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue: bool = False) -> None:
+def index_offers_in_queue(
+    stop_only_when_empty: bool = False,
+    from_error_queue: bool = False,
+    workers: int | None = None,
+) -> None:
     """Pop offers from indexation queue and reindex them.
 
     If ``from_error_queue`` is True, pop offers from the error queue
@@ -223,8 +231,61 @@ def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue:
     If ``stop_only_when_empty`` is True (i.e. if called manually to
     process the whole queue), we pop from the queue and stop only when
     the queue is empty.
+
+    ``workers`` (by default: ALGOLIA_OFFERS_INDEXATION_WORKERS) is
+    the number of concurrent consumers of the queue. Each consumer
+    runs in its own thread, with its own application context and
+    database session, and pops its own batches. Since popping is
+    atomic, consumers never process the same offers. While a consumer
+    waits for the indexation service, others can fetch their next
+    batch from the database.
+    """
+    workers = workers or settings.ALGOLIA_OFFERS_INDEXATION_WORKERS
+    start = time.perf_counter()
+    if workers <= 1:
+        indexed_count = _index_offers_in_queue(stop_only_when_empty, from_error_queue)
+    else:
+        app = flask.current_app._get_current_object()  # type: ignore[attr-defined]
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="offer-indexation",
+        ) as executor:
+            futures = [
+                executor.submit(_index_offers_in_queue_in_app_context, app, stop_only_when_empty, from_error_queue)
+                for _ in range(workers)
+            ]
+            indexed_count = sum(future.result() for future in concurrent.futures.as_completed(futures))
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Finished indexing offers from queue",
+        extra={
+            "count": indexed_count,
+            "workers": workers,
+            "elapsed": elapsed,
+            "offers_per_second": round(indexed_count / elapsed, 2) if elapsed else None,
+            "from_error_queue": from_error_queue,
+        },
+    )
+
+
+def _index_offers_in_queue_in_app_context(
+    app: flask.Flask,
+    stop_only_when_empty: bool,
+    from_error_queue: bool,
+) -> int:
+    with app.app_context():
+        try:
+            return _index_offers_in_queue(stop_only_when_empty, from_error_queue)
+        finally:
+            db.session.remove()
+
+
+def _index_offers_in_queue(stop_only_when_empty: bool, from_error_queue: bool) -> int:
+    """Consume the offer indexation queue and return the number of
+    offers that have been processed.
     """
     backend = _get_backend()
+    indexed_count = 0
     while True:
         with backend.pop_offer_ids_from_queue(
             count=settings.REDIS_OFFER_IDS_CHUNK_SIZE,
@@ -237,6 +298,7 @@ def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue:
                 "Fetched offer ids from indexation queue",
                 extra={"count": len(offer_ids), "offer_ids": offer_ids},
             )
+            batch_start = time.perf_counter()
             try:
                 reindex_offer_ids(offer_ids, from_error_queue=from_error_queue)
             except Exception as exc:  # pylint: disable=broad-except
@@ -247,14 +309,26 @@ def index_offers_in_queue(stop_only_when_empty: bool = False, from_error_queue:
                     extra={"exc": str(exc), "offers": offer_ids},
                 )
             else:
+                indexed_count += len(offer_ids)
+                batch_elapsed = time.perf_counter() - batch_start
                 logger.info(
                     "Reindexed offers from queue",
-                    extra={"count": len(offer_ids), "from_error_queue": from_error_queue},
+                    extra={
+                        "count": len(offer_ids),
+                        "from_error_queue": from_error_queue,
+                        "elapsed": batch_elapsed,
+                        "offers_per_second": round(len(offer_ids) / batch_elapsed, 2) if batch_elapsed else None,
+                    },
                 )
 
         left_to_process = backend.count_offers_to_index_from_queue(from_error_queue=from_error_queue)
+        logger.info(
+            "Offers left in indexation queue",
+            extra={"left_to_process": left_to_process, "from_error_queue": from_error_queue},
+        )
         if not stop_only_when_empty and left_to_process < settings.REDIS_OFFER_IDS_CHUNK_SIZE:
             break
+    return indexed_count
 
 
 def index_all_collective_offers_and_templates() -> None:
@@ -457,6 +531,8 @@ DEFAULT_DAYS_FOR_LAST_BOOKINGS = 30
 def get_offers_booking_count_by_id(
     offer_ids: abc.Collection[int], days: int = DEFAULT_DAYS_FOR_LAST_BOOKINGS
 ) -> dict[int, int]:
+    if FeatureToggle.WIP_USE_OFFER_BOOKING_COUNT.is_active():
+        return _get_offers_booking_count_by_id_from_daily_counts(offer_ids, days)
     offer_booked_since_x_days = (
         offers_models.Offer.query.join(offers_models.Offer.stocks)
         .outerjoin(offers_models.Offer.product)
@@ -473,6 +549,27 @@ def get_offers_booking_count_by_id(
     return dict(offer_booked_since_x_days)
 
 
+def _get_offers_booking_count_by_id_from_daily_counts(offer_ids: abc.Collection[int], days: int) -> dict[int, int]:
+    """Same as `get_offers_booking_count_by_id()`, from the daily
+    booking counts of offers. The period is rounded to the day: the
+    day on which the period starts is excluded.
+    """
+    first_day = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    rows = (
+        bookings_models.OfferBookingCount.query.join(
+            offers_models.Offer, offers_models.Offer.id == bookings_models.OfferBookingCount.offerId
+        )
+        .filter(
+            bookings_models.OfferBookingCount.offerId.in_(offer_ids),
+            bookings_models.OfferBookingCount.day >= first_day,
+            offers_models.Offer.isActive.is_(True),
+        )
+        .group_by(bookings_models.OfferBookingCount.offerId)
+        .with_entities(bookings_models.OfferBookingCount.offerId, sa.func.sum(bookings_models.OfferBookingCount.count))
+    )
+    return {offer_id: count for offer_id, count in rows if count}
+
+
 def get_last_x_days_booking_count_by_offer(offers: abc.Iterable[offers_models.Offer]) -> dict[int, int]:
     offers_with_product = []
     offers_without_product = []
@@ -494,6 +591,24 @@ def get_last_x_days_booking_count_by_offer(offers: abc.Iterable[offers_models.Of
     return default_dict
 
 
+def get_last_x_days_booking_count_by_offer_data(
+    offers: abc.Iterable[offer_indexation.OfferIndexationData],
+) -> dict[int, int]:
+    """Same as `get_last_x_days_booking_count_by_offer()`, for the
+    lightweight indexation read path.
+    """
+    if not FeatureToggle.ALGOLIA_BOOKINGS_NUMBER_COMPUTATION.is_active():
+        return {}
+
+    offers_without_product = [offer.id for offer in offers if offer.product_id is None]
+    default_dict = get_offers_booking_count_by_id(offers_without_product)
+    for offer in offers:
+        if offer.product_id is not None:
+            default_dict[offer.id] = offer.product_last_30_days_booking or 0
+
+    return default_dict
+
+
 def reindex_offer_ids(offer_ids: abc.Collection[int], from_error_queue: bool = False) -> None:
     """Given a list of `Offer.id`, reindex or unindex each offer
     (i.e. request the external indexation service an update or a
@@ -505,10 +620,15 @@ def reindex_offer_ids(offer_ids: abc.Collection[int], from_error_queue: bool = F
     """
     backend = _get_backend()
 
-    to_add = []
+    to_add: list = []
     to_delete_ids = []
 
-    offers = get_base_query_for_offer_indexation().filter(offers_models.Offer.id.in_(offer_ids))
+    use_light_query = FeatureToggle.WIP_LIGHT_OFFER_INDEXATION_QUERY.is_active()
+    offers: abc.Iterable[offers_models.Offer | offer_indexation.OfferIndexationData]
+    if use_light_query:
+        offers = offer_indexation.get_offers_data_for_indexation(offer_ids)
+    else:
+        offers = get_base_query_for_offer_indexation().filter(offers_models.Offer.id.in_(offer_ids))
 
     for offer in offers:
         if offer and offer.is_eligible_for_search:
@@ -525,9 +645,15 @@ def reindex_offer_ids(offer_ids: abc.Collection[int], from_error_queue: bool = F
             )
 
     # Handle new or updated available offers
-    last_x_days_bookings_count_by_offer = get_last_x_days_booking_count_by_offer(to_add)
+    if use_light_query:
+        last_x_days_bookings_count_by_offer = get_last_x_days_booking_count_by_offer_data(to_add)
+    else:
+        last_x_days_bookings_count_by_offer = get_last_x_days_booking_count_by_offer(to_add)
     try:
-        backend.index_offers(to_add, last_x_days_bookings_count_by_offer)
+        if use_light_query:
+            backend.index_offers_data(to_add, last_x_days_bookings_count_by_offer)
+        else:
+            backend.index_offers(to_add, last_x_days_bookings_count_by_offer)
     except Exception as exc:  # pylint: disable=broad-except
         if not settings.CATCH_INDEXATION_EXCEPTIONS:
             raise
@@ -678,6 +804,21 @@ def get_last_30_days_bookings_for_eans() -> dict[str, int]:
 
 
 def get_last_x_days_bookings_for_movies(days: int = 30) -> dict[int, int]:
+    if FeatureToggle.WIP_USE_OFFER_BOOKING_COUNT.is_active():
+        first_day = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+        result = db.session.execute(
+            sa.select(offers_models.Product.id, sa.func.sum(bookings_models.OfferBookingCount.count))
+            .select_from(bookings_models.OfferBookingCount)
+            .join(offers_models.Offer, offers_models.Offer.id == bookings_models.OfferBookingCount.offerId)
+            .join(offers_models.Offer.product)
+            .filter(
+                offers_models.Product.subcategoryId == subcategories_v2.SEANCE_CINE.id,
+                bookings_models.OfferBookingCount.day >= first_day,
+            )
+            .group_by(offers_models.Product.id)
+        )
+        return {row[0]: row[1] for row in result if row[1]}
+
     result = db.session.execute(
         sa.select(offers_models.Product.id, sa.func.count())
         .select_from(bookings_models.Booking)
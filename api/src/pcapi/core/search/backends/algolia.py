@@ -3,18 +3,21 @@ import contextlib
 import datetime
 import decimal
 import enum
+import hashlib
+import json
 import logging
 import re
 import typing
 import urllib.parse
+import uuid
 
 import algoliasearch.http.requester
 import algoliasearch.search_client
 from flask import current_app
 import redis
-import sqlalchemy as sa
 
 from pcapi import settings
+from pcapi.core.categories import subcategories_v2
 from pcapi.core.educational.academies import get_academy_from_department
 import pcapi.core.educational.api.offer as educational_api_offer
 import pcapi.core.educational.models as educational_models
@@ -22,6 +25,7 @@ import pcapi.core.offerers.api as offerers_api
 import pcapi.core.offerers.models as offerers_models
 import pcapi.core.offers.models as offers_models
 from pcapi.core.providers import titelive_gtl
+from pcapi.core.search import offer_indexation
 from pcapi.core.search.backends import base
 from pcapi.domain.music_types import MUSIC_TYPES_LABEL_BY_CODE
 from pcapi.domain.show_types import SHOW_TYPES_LABEL_BY_CODE
@@ -57,6 +61,24 @@ QUEUES = (
     REDIS_COLLECTIVE_OFFER_TEMPLATE_IDS_IN_ERROR_TO_INDEX,
 )
 REDIS_HASHMAP_INDEXED_OFFERS_NAME = "indexed_offers"
+# Digests of indexed offers are stored in a new hashmap each week (see
+# `_get_indexed_offer_digests_key()`): all offers are thus fully saved
+# again at least once a week, even if their digest was stale.
+REDIS_HASHMAP_INDEXED_OFFER_DIGESTS_NAME = "indexed_offer_digests"
+INDEXED_OFFER_DIGESTS_TTL = datetime.timedelta(weeks=2)
+OBJECT_DIGEST_SIZE = 6  # bytes, i.e. 12 hexadecimal characters
+
+# Atomically pop up to `ARGV[1]` ids from the `KEYS[1]` set and add
+# them to the `KEYS[2]` processing set, in a single round-trip. Ids
+# are added by slices because Lua's `unpack` is limited by the size of
+# the C stack (a few thousand items).
+MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT = """
+local ids = redis.call("SPOP", KEYS[1], ARGV[1])
+for start = 1, #ids, 1000 do
+    redis.call("SADD", KEYS[2], unpack(ids, start, math.min(start + 999, #ids)))
+end
+return ids
+"""
 
 
 DEFAULT_LONGITUDE = 2.409289
@@ -149,6 +171,7 @@ class AlgoliaBackend(base.SearchBackend):
         )
         self.algolia_venues_client = client.init_index(settings.ALGOLIA_VENUES_INDEX_NAME)
         self.redis_client = current_app.redis_client
+        self.move_ids_to_processing_queue = self.redis_client.register_script(MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT)
 
     def _can_enqueue_offer_ids(self, offer_ids: abc.Collection[int]) -> bool:
         if settings.ALGOLIA_OFFERS_INDEX_MAX_SIZE < 0:
@@ -288,33 +311,38 @@ class AlgoliaBackend(base.SearchBackend):
         # there. A separate cron job looks for these (specially-named)
         # queues and adds back their items to the originating queue
         # (see `clean_processing_queues`).
+        #
+        # Popping and moving is done server-side by a Lua script, in a
+        # single round-trip whatever the size of the batch. Since
+        # scripts are executed atomically, two concurrent cron jobs
+        # cannot claim the same ids.
+        #
+        # The name of the processing queue must be unique, since
+        # concurrent jobs may pop ids at the same time. It ends with
+        # the timestamp, which is used by `clean_processing_queues`.
         timestamp = datetime.datetime.utcnow().timestamp()
-        processing_queue = f"{queue}:processing:{timestamp}"
+        processing_queue = f"{queue}:processing:{uuid.uuid4().hex}:{timestamp}"
         try:
-            ids = self.redis_client.srandmember(queue, count)
-            with self.redis_client.pipeline(transaction=True) as pipeline:
-                for id_ in ids:
-                    pipeline.smove(queue, processing_queue, id_)
-                pipeline.execute()
-                batch = {int(id_) for id_ in ids}  # str -> int
-                logger.info(
-                    "Moved batch of object ids to index to processing queue",
-                    extra={
-                        "originating_queue": queue,
-                        "processing_queue": processing_queue,
-                        "requested_count": count,
-                        "effective_count": len(batch),
-                    },
-                )
-                yield batch
-                self.redis_client.delete(processing_queue)
-                logger.info(
-                    "Deleted processing queue",
-                    extra={
-                        "originating_queue": queue,
-                        "processing_queue": processing_queue,
-                    },
-                )
+            ids = self.move_ids_to_processing_queue(keys=[queue, processing_queue], args=[count])
+            batch = {int(id_) for id_ in ids}  # str -> int
+            logger.info(
+                "Moved batch of object ids to index to processing queue",
+                extra={
+                    "originating_queue": queue,
+                    "processing_queue": processing_queue,
+                    "requested_count": count,
+                    "effective_count": len(batch),
+                },
+            )
+            yield batch
+            self.redis_client.delete(processing_queue)
+            logger.info(
+                "Deleted processing queue",
+                extra={
+                    "originating_queue": queue,
+                    "processing_queue": processing_queue,
+                },
+            )
         except redis.exceptions.RedisError:
             logger.exception(
                 "Could not pop object ids to index from queue",
@@ -356,7 +384,62 @@ class AlgoliaBackend(base.SearchBackend):
         if not offers:
             return
         objects = [self.serialize_offer(offer, last_30_days_bookings.get(offer.id) or 0) for offer in offers]
-        self.algolia_offers_client.save_objects(objects)
+        self._save_offer_objects(objects)
+
+    def index_offers_data(
+        self,
+        offers: abc.Collection[offer_indexation.OfferIndexationData],
+        last_30_days_bookings: dict[int, int],
+    ) -> None:
+        if not offers:
+            return
+        objects = [self.serialize_offer_data(offer, last_30_days_bookings.get(offer.id) or 0) for offer in offers]
+        self._save_offer_objects(objects)
+
+    def _save_offer_objects(self, objects: list[dict]) -> None:
+        # For each indexed offer, we store a digest of the last pushed
+        # document. Unchanged documents are not sent again, and
+        # documents of which only some attributes have changed are
+        # partially updated.
+        digests_key = _get_indexed_offer_digests_key()
+        previous_digests = self._get_indexed_offer_digests(digests_key, [obj["objectID"] for obj in objects])
+        to_save = []
+        to_update = []
+        digests = {}
+        for obj in objects:
+            digest = get_object_digest(obj)
+            previous_digest = previous_digests.get(obj["objectID"])
+            if digest == previous_digest:
+                continue
+            digests[obj["objectID"]] = digest
+            changed_attributes = get_changed_attributes(obj, digest, previous_digest) if previous_digest else None
+            if changed_attributes is None:
+                to_save.append(obj)
+            else:
+                to_update.append({key: obj[key] for key in ["objectID"] + changed_attributes})
+
+        if to_update:
+            # The document may be missing from Algolia even though we
+            # have its digest (e.g. if a deletion has been lost). It
+            # must not be created from the changed attributes only: it
+            # is fully saved instead.
+            existing_ids = self._get_existing_offer_ids([body["objectID"] for body in to_update])
+            objects_by_id = {obj["objectID"]: obj for obj in objects}
+            to_save += [objects_by_id[body["objectID"]] for body in to_update if body["objectID"] not in existing_ids]
+            to_update = [body for body in to_update if body["objectID"] in existing_ids]
+        if to_save:
+            self.algolia_offers_client.save_objects(to_save)
+        if to_update:
+            self.algolia_offers_client.partial_update_objects(to_update, {"createIfNotExists": False})
+        logger.info(
+            "Sent offers to indexation service",
+            extra={
+                "count": len(objects),
+                "saved_count": len(to_save),
+                "partially_updated_count": len(to_update),
+                "skipped_count": len(objects) - len(digests),
+            },
+        )
 
         try:
             # We used to store a summary of each offer, which is why
@@ -364,17 +447,44 @@ class AlgoliaBackend(base.SearchBackend):
             # the value anymore, we can store the lightest object
             # possible to make Redis use less memory. In the future,
             # we may even remove the hashmap if it's not proven useful
-            # (see log in reindex_offer_ids)
-            offer_ids = [offer.id for offer in offers]
+            # (see log in reindex_offer_ids). For the same reason,
+            # digests are compact strings, stored in another hashmap
+            # that expires.
+            offer_ids = [obj["objectID"] for obj in objects]
             pipeline = self.redis_client.pipeline(transaction=True)
             for offer_id in offer_ids:
                 pipeline.hset(REDIS_HASHMAP_INDEXED_OFFERS_NAME, str(offer_id), "")
+            if digests:
+                pipeline.hset(digests_key, mapping={str(offer_id): digest for offer_id, digest in digests.items()})
+                pipeline.expire(digests_key, INDEXED_OFFER_DIGESTS_TTL)
             pipeline.execute()
         except Exception:  # pylint: disable=broad-except
             logger.exception("Could not add to list of indexed offers", extra={"offers": offer_ids})
         finally:
             pipeline.reset()
 
+    def _get_existing_offer_ids(self, offer_ids: list[int]) -> set[int]:
+        response = self.algolia_offers_client.get_objects(offer_ids, {"attributesToRetrieve": ["objectID"]})
+        return {int(obj["objectID"]) for obj in response["results"] if obj}
+
+    def _get_indexed_offer_digests(self, digests_key: str, offer_ids: list[int]) -> dict[int, str]:
+        """Return the digest of the last pushed document of each given
+        offer. Offers that have not been indexed since digests were
+        renewed are missing from the returned dictionary.
+        """
+        try:
+            values = self.redis_client.hmget(digests_key, [str(id_) for id_ in offer_ids])
+        except redis.exceptions.RedisError:
+            if settings.IS_RUNNING_TESTS:
+                raise
+            logger.exception("Could not get digests of indexed offers", extra={"offers": offer_ids})
+            return {}
+        digests = {}
+        for offer_id, value in zip(offer_ids, values):
+            if value:
+                digests[offer_id] = value
+        return digests
+
     def index_collective_offer_templates(
         self,
         collective_offer_templates: abc.Collection[educational_models.CollectiveOfferTemplate],
@@ -398,10 +508,10 @@ class AlgoliaBackend(base.SearchBackend):
             return
         self.algolia_offers_client.delete_objects(offer_ids)
         try:
-            self.redis_client.hdel(
-                REDIS_HASHMAP_INDEXED_OFFERS_NAME,
-                *(str(offer_id) for offer_id in offer_ids),
-            )
+            pipeline = self.redis_client.pipeline(transaction=False)
+            pipeline.hdel(REDIS_HASHMAP_INDEXED_OFFERS_NAME, *(str(offer_id) for offer_id in offer_ids))
+            pipeline.hdel(_get_indexed_offer_digests_key(), *(str(offer_id) for offer_id in offer_ids))
+            pipeline.execute()
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
@@ -410,7 +520,7 @@ class AlgoliaBackend(base.SearchBackend):
     def unindex_all_offers(self) -> None:
         self.algolia_offers_client.clear_objects()
         try:
-            self.redis_client.delete(REDIS_HASHMAP_INDEXED_OFFERS_NAME)
+            self.redis_client.delete(REDIS_HASHMAP_INDEXED_OFFERS_NAME, _get_indexed_offer_digests_key())
         except redis.exceptions.RedisError:
             if settings.IS_RUNNING_TESTS:
                 raise
@@ -441,19 +551,27 @@ class AlgoliaBackend(base.SearchBackend):
 
     @classmethod
     def serialize_offer(cls, offer: offers_models.Offer, last_30_days_bookings: int) -> dict:
-        venue = offer.venue
-        offerer = venue.managingOfferer
-        prices = {stock.price for stock in offer.bookableStocks}
+        return cls.serialize_offer_data(offer_indexation.OfferIndexationData.from_offer(offer), last_30_days_bookings)
+
+    @classmethod
+    def serialize_offer_data(cls, offer: offer_indexation.OfferIndexationData, last_30_days_bookings: int) -> dict:
+        subcategory = subcategories_v2.ALL_SUBCATEGORIES_DICT[offer.subcategory_id]
+        prices = {price for price, _ in offer.bookable_stocks}
         dates = set()
         times = set()
-        if offer.isEvent:
-            dates = {stock.beginningDatetime.timestamp() for stock in offer.bookableStocks}  # type: ignore[union-attr]
+        if subcategory.is_event:
+            dates = {beginning.timestamp() for _, beginning in offer.bookable_stocks}  # type: ignore[union-attr]
             times = {
-                date_utils.get_time_in_seconds_from_datetime(stock.beginningDatetime) for stock in offer.bookableStocks  # type: ignore[arg-type]
+                date_utils.get_time_in_seconds_from_datetime(beginning) for _, beginning in offer.bookable_stocks  # type: ignore[arg-type]
             }
-        date_created = offer.dateCreated.timestamp()
-        tags = [criterion.name for criterion in offer.criteria]
-        extra_data = offer.extraData or {}
+        is_forbidden_to_underage = all(
+            (price > 0 and not subcategory.is_bookable_by_underage_when_not_free)
+            or (price == 0 and not subcategory.is_bookable_by_underage_when_free)
+            for price in prices
+        )
+        date_created = offer.date_created.timestamp()
+        tags = offer.criteria
+        extra_data = offer.extra_data
         artist = " ".join(str(extra_data.get(key, "")) for key in ("author", "performer", "speaker", "stageDirector"))
 
         # Field used by Algolia (not the frontend) to deduplicate results
@@ -479,24 +597,9 @@ class AlgoliaBackend(base.SearchBackend):
             except (ValueError, KeyError, TypeError):
                 logger.warning("bad show type encountered", extra={"offer": offer.id, "show_type": show_type})
 
-        macro_section = None
-        section = (extra_data.get("rayon") or "").strip().lower()
-        if section:
-            try:
-                macro_section = (
-                    offers_models.BookMacroSection.query.filter(
-                        sa.func.lower(offers_models.BookMacroSection.section) == section
-                    )
-                    .with_entities(offers_models.BookMacroSection.macroSection)
-                    .scalar()
-                ).strip()
-            except AttributeError:
-                macro_section = None
-
         #  The "gtl" code has been set in July 2023 on products only. Offers that were created before do not have "gtl" in their extraData.
         #  This is why we must look at offer.product.extraData and not offer.extraData
-        product_extra_data = offer.product.extraData if offer.product and offer.product.extraData else {}
-        gtl_id = product_extra_data.get("gtl_id")
+        gtl_id = offer.product_extra_data.get("gtl_id")
         gtl = titelive_gtl.get_gtl(gtl_id) if gtl_id else None
 
         gtl_code_1 = gtl_code_2 = gtl_code_3 = gtl_code_4 = None
@@ -514,7 +617,7 @@ class AlgoliaBackend(base.SearchBackend):
             "offer": {
                 "allocineId": extra_data.get("allocineId"),
                 "artist": artist.strip() or None,
-                "bookMacroSection": macro_section,
+                "bookMacroSection": offer.book_macro_section,
                 "dateCreated": date_created,
                 "dates": sorted(dates),
                 "description": remove_stopwords(offer.description or ""),
@@ -527,50 +630,50 @@ class AlgoliaBackend(base.SearchBackend):
                 "gtlCodeLevel2": gtl_code_2,
                 "gtlCodeLevel3": gtl_code_3,
                 "gtlCodeLevel4": gtl_code_4,
-                "isDigital": offer.isDigital,
-                "isDuo": offer.isDuo,
+                "isDigital": offer.is_digital,
+                "isDuo": offer.is_duo,
                 "isEducational": False,
-                "isEvent": offer.isEvent,
-                "isForbiddenToUnderage": offer.is_forbidden_to_underage,
-                "isThing": offer.isThing,
+                "isEvent": subcategory.is_event,
+                "isForbiddenToUnderage": is_forbidden_to_underage,
+                "isThing": not subcategory.is_event,
                 "last30DaysBookings": last_30_days_bookings,
                 "last30DaysBookingsRange": get_last_30_days_bookings_range(last_30_days_bookings),
                 "movieGenres": extra_data.get("genres"),
                 "musicType": music_type_label,
                 "name": offer.name,
-                "nativeCategoryId": offer.subcategory.native_category_id,
+                "nativeCategoryId": subcategory.native_category_id,
                 "prices": sorted(prices),
                 # TODO(jeremieb): keep searchGroupNamev2 and remove
                 # remove searchGroupName once the search group name &
                 # home page label migration is over.
-                "rankingWeight": offer.rankingWeight,
-                "searchGroupName": offer.subcategory.search_group_name,
-                "searchGroupNamev2": offer.subcategory.search_group_name,
+                "rankingWeight": offer.ranking_weight,
+                "searchGroupName": subcategory.search_group_name,
+                "searchGroupNamev2": subcategory.search_group_name,
                 "showType": show_type_label,
                 "students": extra_data.get("students") or [],
-                "subcategoryId": offer.subcategory.id,
-                "thumbUrl": url_path(offer.thumbUrl) if offer.thumbUrl else None,
+                "subcategoryId": subcategory.id,
+                "thumbUrl": url_path(offer.thumb_url) if offer.thumb_url else None,
                 "tags": tags,
                 "times": list(times),
                 "visa": extra_data.get("visa"),
             },
             "offerer": {
-                "name": offerer.name,
+                "name": offer.offerer_name,
             },
             "venue": {
-                "address": venue.street,
-                "city": venue.city,
-                "departmentCode": venue.departementCode,
-                "id": venue.id,
-                "isAudioDisabilityCompliant": venue.audioDisabilityCompliant,
-                "isMentalDisabilityCompliant": venue.mentalDisabilityCompliant,
-                "isMotorDisabilityCompliant": venue.motorDisabilityCompliant,
-                "isVisualDisabilityCompliant": venue.visualDisabilityCompliant,
-                "name": venue.name,
-                "postalCode": venue.postalCode,
-                "publicName": venue.publicName,
+                "address": offer.venue_street,
+                "city": offer.venue_city,
+                "departmentCode": offer.venue_department_code,
+                "id": offer.venue_id,
+                "isAudioDisabilityCompliant": offer.venue_audio_disability_compliant,
+                "isMentalDisabilityCompliant": offer.venue_mental_disability_compliant,
+                "isMotorDisabilityCompliant": offer.venue_motor_disability_compliant,
+                "isVisualDisabilityCompliant": offer.venue_visual_disability_compliant,
+                "name": offer.venue_name,
+                "postalCode": offer.venue_postal_code,
+                "publicName": offer.venue_public_name,
             },
-            "_geoloc": position(venue),
+            "_geoloc": format_coordinates(offer.venue_latitude, offer.venue_longitude),
         }
 
         for section in ("offer", "offerer", "venue"):
@@ -704,6 +807,45 @@ class AlgoliaBackend(base.SearchBackend):
                 )
 
 
+def _get_indexed_offer_digests_key() -> str:
+    year, week, _ = datetime.date.today().isocalendar()
+    return f"{REDIS_HASHMAP_INDEXED_OFFER_DIGESTS_NAME}:{year}-{week}"
+
+
+def _get_value_digest(value: typing.Any) -> str:
+    return hashlib.blake2b(
+        json.dumps(value, sort_keys=True, default=str).encode(), digest_size=OBJECT_DIGEST_SIZE
+    ).hexdigest()
+
+
+def get_object_digest(obj: dict) -> str:
+    """Return a compact digest of a document to index: the digest of
+    the names of its top-level attributes, followed by the digest of
+    each of these attributes (sorted by name).
+
+    Attributes are compared at the top level because Algolia partial
+    updates replace nested objects as a whole.
+    """
+    keys = sorted(key for key in obj if key != "objectID")
+    return _get_value_digest(keys) + "".join(_get_value_digest(obj[key]) for key in keys)
+
+
+def get_changed_attributes(obj: dict, digest: str, previous_digest: str) -> list[str] | None:
+    """Return the top-level attributes of ``obj`` whose digest differ
+    in ``previous_digest``, or None if the documents do not have the
+    same attributes.
+    """
+    size = 2 * OBJECT_DIGEST_SIZE
+    if len(digest) != len(previous_digest) or digest[:size] != previous_digest[:size]:
+        return None
+    keys = sorted(key for key in obj if key != "objectID")
+    return [
+        key
+        for index, key in enumerate(keys, start=1)
+        if digest[index * size : (index + 1) * size] != previous_digest[index * size : (index + 1) * size]
+    ]
+
+
 def position(venue: offerers_models.Venue) -> dict[str, float]:
     return format_coordinates(venue.latitude, venue.longitude)
 
@@ -7,6 +7,7 @@ if typing.TYPE_CHECKING:
     import pcapi.core.educational.models as educational_models
     import pcapi.core.offerers.models as offerers_models
     import pcapi.core.offers.models as offers_models
+    from pcapi.core.search import offer_indexation
 
 
 class SearchBackend:
@@ -53,6 +54,13 @@ class SearchBackend:
     ) -> None:
         raise NotImplementedError()
 
+    def index_offers_data(
+        self,
+        offers: "abc.Collection[offer_indexation.OfferIndexationData]",
+        last_30_days_bookings: dict[int, int],
+    ) -> None:
+        raise NotImplementedError()
+
     def index_collective_offer_templates(
         self, collective_offer_templates: "abc.Collection[educational_models.CollectiveOfferTemplate]"
     ) -> None:
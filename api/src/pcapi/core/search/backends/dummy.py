@@ -3,6 +3,7 @@ import typing
 
 from flask import current_app
 
+from .algolia import MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT
 from .algolia import AlgoliaBackend
 
 
@@ -16,6 +17,16 @@ class FakeClient:
             extra={"object_ids": [o["objectID"] for o in objects]},
         )
 
+    def partial_update_objects(self, objects: typing.Iterable[dict], request_options: dict | None = None) -> None:
+        logger.info(
+            "Dummy partial update of objects",
+            extra={"object_ids": [o["objectID"] for o in objects]},
+        )
+
+    def get_objects(self, object_ids: typing.Iterable[int], request_options: dict | None = None) -> dict:
+        # Pretend that all objects exist, so that they are partially updated.
+        return {"results": [{"objectID": object_id} for object_id in object_ids]}
+
     def delete_objects(self, object_ids: typing.Iterable[int]) -> None:
         logger.info("Dummy deletion of objects", extra={"object_ids": object_ids})
 
@@ -41,3 +52,4 @@ class DummyBackend(AlgoliaBackend):
         self.algolia_collective_offers_client = FakeClient()
         self.algolia_collective_offers_templates_client = FakeClient()
         self.redis_client = current_app.redis_client
+        self.move_ids_to_processing_queue = self.redis_client.register_script(MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT)
@@ -4,6 +4,7 @@ from flask import current_app
 
 from pcapi.core.search import testing
 
+from .algolia import MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT
 from .algolia import AlgoliaBackend
 
 
@@ -15,6 +16,17 @@ class FakeClient:
         for obj in objects:
             testing.search_store[self.key][obj["objectID"]] = obj
 
+    def partial_update_objects(self, objects: typing.Iterable[dict], request_options: dict | None = None) -> None:
+        create_if_not_exists = (request_options or {}).get("createIfNotExists", False)
+        for obj in objects:
+            if create_if_not_exists:
+                testing.search_store[self.key].setdefault(obj["objectID"], {})
+            if obj["objectID"] in testing.search_store[self.key]:
+                testing.search_store[self.key][obj["objectID"]].update(obj)
+
+    def get_objects(self, object_ids: typing.Iterable[int], request_options: dict | None = None) -> dict:
+        return {"results": [testing.search_store[self.key].get(object_id) for object_id in object_ids]}
+
     def delete_objects(self, object_ids: typing.Iterable[int]) -> None:
         for object_id in object_ids:
             testing.search_store[self.key].pop(object_id, None)
@@ -37,3 +49,4 @@ class TestingBackend(AlgoliaBackend):
         self.algolia_collective_offers_client = FakeClient("collective-offers")
         self.algolia_collective_offers_templates_client = FakeClient("collective-offers-templates")
         self.redis_client = current_app.redis_client
+        self.move_ids_to_processing_queue = self.redis_client.register_script(MOVE_IDS_TO_PROCESSING_QUEUE_SCRIPT)
@@ -1,7 +1,11 @@
 import logging
+import statistics
+import time
+import tracemalloc
 import typing
 
 import click
+from flask import current_app
 
 from pcapi import settings
 from pcapi.core import search
@@ -9,8 +13,12 @@ from pcapi.core.educational.api.offer import unindex_expired_collective_offers_t
 import pcapi.core.educational.repository as collective_offers_repository
 from pcapi.core.offerers import api as offerers_api
 import pcapi.core.offers.api as offers_api
+import pcapi.core.offers.models as offers_models
 import pcapi.core.offers.repository as offers_repository
+from pcapi.core.search import offer_indexation
 from pcapi.core.search import staging_indexation
+from pcapi.core.search.backends import algolia
+from pcapi.models import db
 from pcapi.scheduled_tasks.decorators import log_cron_with_transaction
 from pcapi.utils.blueprint import Blueprint
 from pcapi.utils.chunks import get_chunks
@@ -21,10 +29,16 @@ logger = logging.getLogger(__name__)
 
 
 @blueprint.cli.command("index_offers_in_algolia_by_offer")
+@click.option(
+    "--workers",
+    help="Number of concurrent consumers (default: ALGOLIA_OFFERS_INDEXATION_WORKERS)",
+    type=int,
+    default=None,
+)
 @log_cron_with_transaction
-def index_offers_in_algolia_by_offer() -> None:
+def index_offers_in_algolia_by_offer(workers: int | None) -> None:
     """Pop offers from indexation queue and reindex them."""
-    search.index_offers_in_queue()
+    search.index_offers_in_queue(workers=workers)
 
 
 @blueprint.cli.command("index_offers_in_algolia_by_venue")
@@ -218,3 +232,97 @@ def clean_indexation_processing_queues() -> None:
 def remove_duplicates_from_venue_indexation_queue() -> None:
     # TODO (lixxday) : remove after cron is removed
     pass
+
+
+@blueprint.cli.command("benchmark_indexation_queue_pop")
+@click.option("--queue-size", help="Number of ids in the scratch queue", type=int, default=100_000)
+@click.option(
+    "--batch-size", help="Number of ids popped per batch", type=int, default=settings.REDIS_OFFER_IDS_CHUNK_SIZE
+)
+@click.option("--batches", help="Number of batches to pop per strategy", type=int, default=10)
+def benchmark_indexation_queue_pop(queue_size: int, batch_size: int, batches: int) -> None:
+    """Compare the cost of popping a batch of ids from an indexation
+    queue: legacy strategy (SRANDMEMBER + one SMOVE per id) versus the
+    server-side Lua script.
+
+    Only scratch queues (prefixed with "benchmark:") are used: real
+    indexation queues are left untouched.
+    """
+    redis_client = current_app.redis_client
+    backend = algolia.AlgoliaBackend()
+    queue = "benchmark:search:algolia:offer-ids:set"
+    processing_queue = f"{queue}:processing"
+
+    def pop_legacy() -> int:
+        ids = redis_client.srandmember(queue, batch_size)
+        with redis_client.pipeline(transaction=True) as pipeline:
+            for id_ in ids:
+                pipeline.smove(queue, processing_queue, id_)
+            pipeline.execute()
+        return 1 + len(ids)
+
+    def pop_script() -> int:
+        backend.move_ids_to_processing_queue(keys=[queue, processing_queue], args=[batch_size])
+        return 1
+
+    for name, pop in (("legacy", pop_legacy), ("script", pop_script)):
+        redis_client.delete(queue, processing_queue)
+        for chunk in get_chunks(range(queue_size), 10_000):
+            redis_client.sadd(queue, *chunk)
+        latencies = []
+        commands = 0
+        for _ in range(batches):
+            start = time.perf_counter()
+            commands += pop()
+            latencies.append(time.perf_counter() - start)
+        redis_client.delete(queue, processing_queue)
+        print(
+            f"{name}: {commands / batches:.0f} commands per batch, "
+            f"median latency {statistics.median(latencies) * 1000:.2f} ms, "
+            f"max latency {max(latencies) * 1000:.2f} ms"
+        )
+
+
+@blueprint.cli.command("benchmark_offer_indexation_query")
+@click.option("--batch-size", help="Number of offers per batch", type=int, default=settings.REDIS_OFFER_IDS_CHUNK_SIZE)
+@click.option("--batches", help="Number of batches", type=int, default=10)
+def benchmark_offer_indexation_query(batch_size: int, batches: int) -> None:
+    """Compare the duration and the peak memory usage of building the
+    documents to index for batches of offers: ORM graphs versus the
+    lightweight read path.
+    """
+    backend = algolia.AlgoliaBackend()
+
+    def run_orm(offer_ids: list[int]) -> None:
+        offers = search.get_base_query_for_offer_indexation().filter(offers_models.Offer.id.in_(offer_ids))
+        for offer in offers:
+            if offer.is_eligible_for_search:
+                backend.serialize_offer(offer, 0)
+
+    def run_light(offer_ids: list[int]) -> None:
+        for offer in offer_indexation.get_offers_data_for_indexation(offer_ids):
+            if offer.is_eligible_for_search:
+                backend.serialize_offer_data(offer, 0)
+
+    for name, run in (("orm", run_orm), ("light", run_light)):
+        durations = []
+        peaks = []
+        for page in range(batches):
+            offer_ids = offers_repository.get_paginated_active_offer_ids(batch_size=batch_size, page=page + 1)
+            if not offer_ids:
+                break
+            db.session.expunge_all()
+            tracemalloc.start()
+            start = time.perf_counter()
+            run(offer_ids)
+            durations.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        if not durations:
+            print("No active offers to benchmark")
+            return
+        print(
+            f"{name}: {len(durations)} batches of {batch_size} offers, "
+            f"median duration {statistics.median(durations) * 1000:.0f} ms, "
+            f"median peak memory {statistics.median(peaks) / 1024 / 1024:.1f} MiB"
+        )
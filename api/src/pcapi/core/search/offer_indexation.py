@@ -0,0 +1,294 @@
+"""A lightweight read path for the indexation of offers.
+
+Instead of loading full ORM graphs (offer, stocks, venue, offerer,
+criteria, mediations and product), we select the columns that are
+needed to build the document to index, with a single row per offer.
+Bookable stocks and criteria are aggregated by the database.
+"""
+
+from collections import abc
+import dataclasses
+import datetime
+import decimal
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from pcapi import settings
+import pcapi.core.criteria.models as criteria_models
+import pcapi.core.offerers.models as offerers_models
+import pcapi.core.offers.models as offers_models
+from pcapi.models import db
+from pcapi.utils.human_ids import humanize
+
+
+@dataclasses.dataclass(frozen=True)
+class OfferIndexationData:
+    id: int
+    name: str
+    description: str | None
+    extra_data: dict
+    date_created: datetime.datetime
+    is_duo: bool
+    is_digital: bool
+    subcategory_id: str
+    ranking_weight: int | None
+    thumb_url: str | None
+    is_eligible_for_search: bool
+    criteria: list[str]
+    # (price, beginning datetime) of each bookable stock
+    bookable_stocks: list[tuple[decimal.Decimal, datetime.datetime | None]]
+    book_macro_section: str | None
+    product_id: int | None
+    product_extra_data: dict
+    product_last_30_days_booking: int | None
+    offerer_name: str
+    venue_id: int
+    venue_name: str
+    venue_public_name: str | None
+    venue_street: str | None
+    venue_city: str | None
+    venue_postal_code: str | None
+    venue_department_code: str | None
+    venue_latitude: decimal.Decimal | None
+    venue_longitude: decimal.Decimal | None
+    venue_audio_disability_compliant: bool | None
+    venue_mental_disability_compliant: bool | None
+    venue_motor_disability_compliant: bool | None
+    venue_visual_disability_compliant: bool | None
+
+    @classmethod
+    def from_offer(cls, offer: offers_models.Offer) -> "OfferIndexationData":
+        venue = offer.venue
+        extra_data = offer.extraData or {}
+        return cls(
+            id=offer.id,
+            name=offer.name,
+            description=offer.description,
+            extra_data=extra_data,
+            date_created=offer.dateCreated,
+            is_duo=offer.isDuo,
+            is_digital=offer.isDigital,
+            subcategory_id=offer.subcategoryId,
+            ranking_weight=offer.rankingWeight,
+            thumb_url=offer.thumbUrl,
+            is_eligible_for_search=offer.is_eligible_for_search,
+            criteria=sorted(criterion.name for criterion in offer.criteria),
+            bookable_stocks=[
+                (stock.price, stock.beginningDatetime)
+                for stock in sorted(offer.bookableStocks, key=lambda stock: stock.id)
+            ],
+            book_macro_section=get_book_macro_sections([extra_data.get("rayon")]).get(_get_section(extra_data)),
+            product_id=offer.product.id if offer.product else None,
+            product_extra_data=(offer.product.extraData if offer.product else None) or {},
+            product_last_30_days_booking=offer.product.last_30_days_booking if offer.product else None,
+            offerer_name=venue.managingOfferer.name,
+            venue_id=venue.id,
+            venue_name=venue.name,
+            venue_public_name=venue.publicName,
+            venue_street=venue.street,
+            venue_city=venue.city,
+            venue_postal_code=venue.postalCode,
+            venue_department_code=venue.departementCode,
+            venue_latitude=venue.latitude,
+            venue_longitude=venue.longitude,
+            venue_audio_disability_compliant=venue.audioDisabilityCompliant,
+            venue_mental_disability_compliant=venue.mentalDisabilityCompliant,
+            venue_motor_disability_compliant=venue.motorDisabilityCompliant,
+            venue_visual_disability_compliant=venue.visualDisabilityCompliant,
+        )
+
+
+def _get_section(extra_data: dict) -> str:
+    return (extra_data.get("rayon") or "").strip().lower()
+
+
+def get_book_macro_sections(sections: abc.Iterable[str | None]) -> dict[str, str]:
+    """Return the macro section of each given book section ("rayon"),
+    indexed by the normalized section.
+    """
+    normalized = {(section or "").strip().lower() for section in sections} - {""}
+    if not normalized:
+        return {}
+    rows = db.session.execute(
+        sa.select(
+            sa.func.lower(offers_models.BookMacroSection.section),
+            offers_models.BookMacroSection.macroSection,
+        ).where(sa.func.lower(offers_models.BookMacroSection.section).in_(normalized))
+    )
+    return {section: macro_section.strip() for section, macro_section in rows}
+
+
+def _build_thumb_url(path_component: str, object_id: int, thumb_count: int) -> str | None:
+    # Same as `HasThumbMixin.thumbUrl`, without an ORM object.
+    if not thumb_count:
+        return None
+    suffix = "" if thumb_count == 1 else f"_{thumb_count - 1}"
+    return f"{settings.OBJECT_STORAGE_URL}/thumbs/{path_component}/{humanize(object_id)}{suffix}"
+
+
+def _get_thumb_url(row: typing.Any) -> str | None:
+    # Same as `Offer.thumbUrl`: the most recent active mediation
+    # first, then the images of the product.
+    if row.active_mediation:
+        mediation_id, mediation_thumb_count = row.active_mediation
+        url = _build_thumb_url(offers_models.Mediation.thumb_path_component, mediation_id, mediation_thumb_count)
+        if url:
+            return url
+    if row.product_id is None:
+        return None
+    if row.product_has_mediations:
+        return row.product_recto_url or row.product_verso_url
+    return _build_thumb_url(offers_models.Product.thumb_path_component, row.product_id, row.product_thumb_count)
+
+
+def _product_mediation_url(image_type: offers_models.TiteliveImageType) -> sa.sql.expression.ScalarSelect:
+    return (
+        sa.select(offers_models.ProductMediation.url)
+        .where(
+            offers_models.ProductMediation.productId == offers_models.Product.id,
+            offers_models.ProductMediation.imageType == image_type,
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def get_offers_data_for_indexation(offer_ids: abc.Collection[int]) -> list[OfferIndexationData]:
+    if not offer_ids:
+        return []
+    Offer = offers_models.Offer
+    Stock = offers_models.Stock
+    Venue = offerers_models.Venue
+    Offerer = offerers_models.Offerer
+
+    # As in `get_base_query_for_offer_indexation()`, only bookable
+    # stocks are of interest. Prices are aggregated as text to avoid
+    # any loss of precision. Stocks and criteria are sorted like in
+    # `OfferIndexationData.from_offer()`, so that the document (and its
+    # digest) does not depend on the read path.
+    bookable_stocks = (
+        sa.select(
+            sa.func.jsonb_agg(
+                postgresql.aggregate_order_by(
+                    sa.func.jsonb_build_array(sa.cast(Stock.price, sa.Text), Stock.beginningDatetime), Stock.id
+                )
+            )
+        )
+        .where(Stock.offerId == Offer.id, Stock._bookable)
+        .scalar_subquery()
+    )
+    criteria = (
+        sa.select(
+            sa.func.array_agg(
+                postgresql.aggregate_order_by(criteria_models.Criterion.name, criteria_models.Criterion.name)
+            )
+        )
+        .join(
+            criteria_models.OfferCriterion,
+            criteria_models.OfferCriterion.criterionId == criteria_models.Criterion.id,
+        )
+        .where(criteria_models.OfferCriterion.offerId == Offer.id)
+        .scalar_subquery()
+    )
+    active_mediation = (
+        sa.select(sa.func.jsonb_build_array(offers_models.Mediation.id, offers_models.Mediation.thumbCount))
+        .where(offers_models.Mediation.offerId == Offer.id, offers_models.Mediation.isActive.is_(True))
+        .order_by(offers_models.Mediation.dateCreated.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    product_has_mediations = sa.exists().where(offers_models.ProductMediation.productId == offers_models.Product.id)
+    has_bookable_stock = sa.exists().where(Stock.offerId == Offer.id, Stock._bookable)
+
+    query = (
+        sa.select(
+            Offer.id.label("id"),
+            Offer.name.label("name"),
+            Offer.description.label("description"),
+            Offer.extraData.label("extra_data"),
+            Offer.dateCreated.label("date_created"),
+            Offer.isDuo.label("is_duo"),
+            Offer.isDigital.label("is_digital"),
+            Offer.subcategoryId.label("subcategory_id"),
+            Offer.rankingWeight.label("ranking_weight"),
+            sa.and_(Offer._released, Offerer.isActive, Offerer.isValidated, has_bookable_stock).label(
+                "is_eligible_for_search"
+            ),
+            bookable_stocks.label("bookable_stocks"),
+            criteria.label("criteria"),
+            active_mediation.label("active_mediation"),
+            offers_models.Product.id.label("product_id"),
+            offers_models.Product.extraData.label("product_extra_data"),
+            offers_models.Product.last_30_days_booking.label("product_last_30_days_booking"),
+            offers_models.Product.thumbCount.label("product_thumb_count"),
+            product_has_mediations.label("product_has_mediations"),
+            _product_mediation_url(offers_models.TiteliveImageType.RECTO).label("product_recto_url"),
+            _product_mediation_url(offers_models.TiteliveImageType.VERSO).label("product_verso_url"),
+            Offerer.name.label("offerer_name"),
+            Venue.id.label("venue_id"),
+            Venue.name.label("venue_name"),
+            Venue.publicName.label("venue_public_name"),
+            Venue.street.label("venue_street"),
+            Venue.city.label("venue_city"),
+            Venue.postalCode.label("venue_postal_code"),
+            Venue.departementCode.label("venue_department_code"),
+            Venue.latitude.label("venue_latitude"),
+            Venue.longitude.label("venue_longitude"),
+            Venue.audioDisabilityCompliant.label("venue_audio_disability_compliant"),
+            Venue.mentalDisabilityCompliant.label("venue_mental_disability_compliant"),
+            Venue.motorDisabilityCompliant.label("venue_motor_disability_compliant"),
+            Venue.visualDisabilityCompliant.label("venue_visual_disability_compliant"),
+        )
+        .select_from(Offer)
+        .join(Venue, Venue.id == Offer.venueId)
+        .join(Offerer, Offerer.id == Venue.managingOffererId)
+        .outerjoin(offers_models.Product, offers_models.Product.id == Offer.productId)
+        .where(Offer.id.in_(offer_ids))
+    )
+    rows = db.session.execute(query).all()
+
+    macro_sections = get_book_macro_sections((row.extra_data or {}).get("rayon") for row in rows)
+    return [
+        OfferIndexationData(
+            id=row.id,
+            name=row.name,
+            description=row.description,
+            extra_data=row.extra_data or {},
+            date_created=row.date_created,
+            is_duo=row.is_duo,
+            is_digital=row.is_digital,
+            subcategory_id=row.subcategory_id,
+            ranking_weight=row.ranking_weight,
+            thumb_url=_get_thumb_url(row),
+            is_eligible_for_search=row.is_eligible_for_search,
+            criteria=row.criteria or [],
+            bookable_stocks=[
+                (
+                    decimal.Decimal(price),
+                    datetime.datetime.fromisoformat(beginning_datetime) if beginning_datetime else None,
+                )
+                for price, beginning_datetime in row.bookable_stocks or []
+            ],
+            book_macro_section=macro_sections.get(_get_section(row.extra_data or {})),
+            product_id=row.product_id,
+            product_extra_data=row.product_extra_data or {},
+            product_last_30_days_booking=row.product_last_30_days_booking,
+            offerer_name=row.offerer_name,
+            venue_id=row.venue_id,
+            venue_name=row.venue_name,
+            venue_public_name=row.venue_public_name,
+            venue_street=row.venue_street,
+            venue_city=row.venue_city,
+            venue_postal_code=row.venue_postal_code,
+            venue_department_code=row.venue_department_code,
+            venue_latitude=row.venue_latitude,
+            venue_longitude=row.venue_longitude,
+            venue_audio_disability_compliant=row.venue_audio_disability_compliant,
+            venue_mental_disability_compliant=row.venue_mental_disability_compliant,
+            venue_motor_disability_compliant=row.venue_motor_disability_compliant,
+            venue_visual_disability_compliant=row.venue_visual_disability_compliant,
+        )
+        for row in rows
+    ]
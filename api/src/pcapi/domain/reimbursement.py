@@ -1,15 +1,25 @@
+import bisect
 import datetime
 from decimal import Decimal
+import logging
+import typing
+
+from flask import current_app
+import redis
 
 from pcapi.core.bookings.models import Booking
 from pcapi.core.categories import subcategories_v2 as subcategories
 from pcapi.core.educational.models import CollectiveBooking
+from pcapi.core.finance import conf as finance_conf
 from pcapi.core.finance import utils as finance_utils
 import pcapi.core.finance.api as finance_api
 import pcapi.core.finance.models as finance_models
 from pcapi.core.offers.models import Offer
 
 
+logger = logging.getLogger(__name__)
+
+
 # A new set rules are in effect as of 1 September 2021 (i.e. 31 August 22:00 UTC)
 SEPTEMBER_2021 = datetime.datetime(2021, 9, 1) - datetime.timedelta(hours=2)
 
@@ -214,31 +224,91 @@ assert [r.description for r in REGULAR_RULES] == [
 ]
 
 
+class _RuleTimeline:
+    """Custom rules of an offer, a venue or an offerer, sorted by the
+    start of their timespan.
+    """
+
+    def __init__(self, rules: list[finance_models.CustomReimbursementRule]) -> None:
+        rules = sorted(rules, key=lambda rule: rule.timespan.lower)
+        # Bounds are copied so that they can be checked without
+        # refreshing rules that have been expired by a commit.
+        self.lowers = [rule.timespan.lower for rule in rules]
+        self.uppers = [rule.timespan.upper for rule in rules]
+        self.rules = rules
+
+    def get_active_rules(self, date: datetime.datetime) -> typing.Iterator[finance_models.CustomReimbursementRule]:
+        for index in range(bisect.bisect_right(self.lowers, date)):
+            upper = self.uppers[index]
+            if upper is None or date < upper:
+                yield self.rules[index]
+
+
 class CustomRuleFinder:
+    """Find the custom rule that applies to a booking, if any.
+
+    All custom rules are loaded when the finder is built. The same
+    finder should be used for many bookings (e.g. a whole batch of
+    events to price), and rebuilt when it is outdated, i.e. when a
+    rule has been created or edited since.
+    """
+
     def __init__(self) -> None:
+        self.version = get_custom_rules_version()
         self.rules = finance_models.CustomReimbursementRule.query.all()
         self.rules_by_offer = self._partition_by_field("offerId")
         self.rules_by_venue = self._partition_by_field("venueId")
         self.rules_by_offerer = self._partition_by_field("offererId")
 
-    def _partition_by_field(self, field: str) -> dict:
-        cache: dict[int, list[finance_models.CustomReimbursementRule]] = {}
+    def _partition_by_field(self, field: str) -> dict[int, _RuleTimeline]:
+        partition: dict[int, list[finance_models.CustomReimbursementRule]] = {}
         for rule in self.rules:
-            cache.setdefault(getattr(rule, field), []).append(rule)
-        return cache
-
-    def get_rule(self, booking: Booking) -> finance_models.CustomReimbursementRule | None:
-        for rule in self.rules_by_offer.get(booking.stock.offerId, ()):
-            if rule.matches(booking, cumulative_revenue=0):  # cumulative revenue is ignored
-                return rule
-        for rule in self.rules_by_venue.get(finance_api.get_pricing_point_link(booking).pricingPointId, ()):
-            if rule.matches(booking, cumulative_revenue=0):  # cumulative revenue is ignored
-                return rule
-        for rule in self.rules_by_offerer.get(booking.offererId, ()):
+            key = getattr(rule, field)
+            if key is not None:
+                partition.setdefault(key, []).append(rule)
+        return {key: _RuleTimeline(rules) for key, rules in partition.items()}
+
+    def _find(
+        self, partition: dict[int, _RuleTimeline], key: int, booking: Booking
+    ) -> finance_models.CustomReimbursementRule | None:
+        timeline = partition.get(key)
+        if not timeline:
+            return None
+        for rule in timeline.get_active_rules(booking.dateUsed):
             if rule.matches(booking, cumulative_revenue=0):  # cumulative revenue is ignored
                 return rule
         return None
 
+    def get_rule(self, booking: Booking) -> finance_models.CustomReimbursementRule | None:
+        return (
+            self._find(self.rules_by_offer, booking.stock.offerId, booking)
+            or self._find(self.rules_by_venue, finance_api.get_pricing_point_link(booking).pricingPointId, booking)
+            or self._find(self.rules_by_offerer, booking.offererId, booking)
+        )
+
+    def is_outdated(self) -> bool:
+        return self.version is None or get_custom_rules_version() != self.version
+
+
+def get_custom_rules_version() -> str | None:
+    try:
+        return current_app.redis_client.get(finance_conf.REDIS_CUSTOM_REIMBURSEMENT_RULES_VERSION) or "0"
+    except redis.exceptions.RedisError:
+        logger.warning("Could not get version of custom reimbursement rules from Redis", exc_info=True)
+        return None
+
+
+def invalidate_custom_rule_finders() -> None:
+    """Make running `CustomRuleFinder` outdated.
+
+    This must be called after a custom rule has been created or edited
+    (and the modification has been committed).
+    """
+    try:
+        current_app.redis_client.incr(finance_conf.REDIS_CUSTOM_REIMBURSEMENT_RULES_VERSION)
+    except redis.exceptions.RedisError:
+        logger.error("Could not invalidate custom reimbursement rules", exc_info=True)
+
 
 def get_reimbursement_rule(
     booking: Booking | CollectiveBooking,
@@ -1,5 +1,6 @@
 from datetime import datetime
 import decimal
+import functools
 import logging
 
 from pcapi.connectors.serialization import allocine_serializers
@@ -14,6 +15,7 @@ from pcapi.domain.allocine import get_movies_showtimes
 from pcapi.local_providers.cinema_providers.constants import ShowtimeFeatures
 from pcapi.local_providers.local_provider import LocalProvider
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbLoader
 from pcapi.models import Model
 from pcapi.repository import db
 from pcapi.repository import transaction
@@ -222,6 +224,11 @@ class AllocineStocks(LocalProvider):
             return get_movie_poster(image_url)
         return bytes()
 
+    def get_object_thumb_loader(self) -> ThumbLoader | None:
+        if self.movie and self.movie.poster:
+            return functools.partial(get_movie_poster, str(self.movie.poster.url))
+        return None
+
     def shall_synchronize_thumbs(self) -> bool:
         return True
 
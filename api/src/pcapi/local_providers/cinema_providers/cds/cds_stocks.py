@@ -1,5 +1,6 @@
 from datetime import datetime
 import decimal
+import functools
 import logging
 from typing import Iterator
 
@@ -17,6 +18,7 @@ from pcapi.core.providers.repository import get_cds_cinema_details
 from pcapi.local_providers.cinema_providers.constants import ShowtimeFeatures
 from pcapi.local_providers.local_provider import LocalProvider
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbLoader
 from pcapi.models import Model
 from pcapi.repository.providable_queries import get_last_update_for_provider
 import pcapi.utils.date as utils_date
@@ -97,24 +99,6 @@ class CDSStocks(LocalProvider):
 
         return providable_information_list
 
-    def get_existing_object(
-        self,
-        model_type: type[offers_models.Product | offers_models.Offer | offers_models.Stock],
-        id_at_providers: str,
-    ) -> offers_models.Product | offers_models.Offer | offers_models.Stock | None:
-        # exception to the ProvidableMixin because Offer no longer extends this class
-        # idAtProviders has been replaced by idAtProvider property
-        if model_type == offers_models.Offer:
-            query = model_type.query.filter_by(idAtProvider=id_at_providers)
-        elif model_type == offers_models.Stock:
-            query = model_type.query.filter(
-                offers_models.Stock.idAtProviders == id_at_providers,  # i.e. "51%123%CDS#2"
-            ).with_for_update()
-        else:
-            query = model_type.query.filter_by(idAtProviders=id_at_providers)
-
-        return query.one_or_none()
-
     def fill_object_attributes(self, pc_object: Model) -> None:
         if isinstance(pc_object, offers_models.Offer):
             self.fill_offer_attributes(pc_object)
@@ -262,6 +246,11 @@ class CDSStocks(LocalProvider):
             return self.client_cds.get_movie_poster(image_url)
         return bytes()
 
+    def get_object_thumb_loader(self) -> ThumbLoader | None:
+        if self.movie_information.posterpath:
+            return functools.partial(self.client_cds.get_movie_poster, self.movie_information.posterpath)
+        return None
+
     def shall_synchronize_thumbs(self) -> bool:
         return True
 
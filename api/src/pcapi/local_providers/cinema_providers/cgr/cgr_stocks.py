@@ -1,5 +1,6 @@
 import datetime
 import decimal
+import functools
 import logging
 from typing import Iterator
 
@@ -16,6 +17,7 @@ import pcapi.core.providers.models as providers_models
 from pcapi.local_providers.cinema_providers.constants import ShowtimeFeatures
 from pcapi.local_providers.local_provider import LocalProvider
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbLoader
 from pcapi.models import Model
 from pcapi.repository.providable_queries import get_last_update_for_provider
 from pcapi.utils import date as utils_date
@@ -245,6 +247,11 @@ class CGRStocks(LocalProvider):
             return get_movie_poster_from_api(image_url)
         return bytes()
 
+    def get_object_thumb_loader(self) -> ThumbLoader | None:
+        if self.film_infos.Affiche:
+            return functools.partial(get_movie_poster_from_api, self.film_infos.Affiche)
+        return None
+
     def shall_synchronize_thumbs(self) -> bool:
         return True
 
@@ -1,9 +1,12 @@
 from abc import abstractmethod
+from collections import defaultdict
+from collections.abc import Collection
 from collections.abc import Iterator
 from datetime import datetime
 import logging
 import typing
 
+from pcapi import settings
 from pcapi.connectors.thumb_storage import create_thumb
 from pcapi.core import search
 import pcapi.core.finance.api as finance_api
@@ -13,9 +16,12 @@ from pcapi.core.providers.repository import get_provider_by_local_class
 from pcapi.local_providers.chunk_manager import get_object_from_current_chunks
 from pcapi.local_providers.chunk_manager import save_chunks
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbLoader
+from pcapi.local_providers.thumb_pipeline import ThumbPipeline
 from pcapi.models import Model
 from pcapi.models import db
 from pcapi.models.api_errors import ApiErrors
+from pcapi.models.feature import FeatureToggle
 from pcapi.models.has_thumb_mixin import HasThumbMixin
 from pcapi.repository import repository
 from pcapi.repository.providable_queries import get_last_update_for_provider
@@ -29,6 +35,10 @@ CHUNK_MAX_SIZE = 1000
 
 
 class LocalProvider(Iterator):
+    # Maximum number of thumbs processed concurrently, see `ThumbPipeline`.
+    # Defaults to the PROVIDER_THUMBS_MAX_WORKERS setting.
+    thumbs_max_workers: int | None = None
+
     def __init__(self, venue_provider: providers_models.VenueProvider | None = None, **options: typing.Any) -> None:
         self.venue_provider = venue_provider
         self.updatedObjects = 0
@@ -82,6 +92,20 @@ class LocalProvider(Iterator):
     def get_object_thumb(self) -> bytes:
         return bytes()
 
+    def get_object_thumb_loader(self) -> ThumbLoader | None:
+        """Return a function that returns the thumb of the current
+        object, to be called later, in another thread.
+
+        By default, the thumb is fetched right away. Providers should
+        override this method when fetching the thumb is slow (e.g. a
+        download), with a function that does not depend on the
+        state of the provider.
+        """
+        thumb = self.get_object_thumb()
+        if not thumb:
+            return None
+        return lambda: thumb
+
     def shall_synchronize_thumbs(self) -> bool:
         return False
 
@@ -110,6 +134,36 @@ class LocalProvider(Iterator):
 
         self.createdThumbs += 1
 
+    def _submit_thumb(self, thumb_pipeline: ThumbPipeline, chunk_key: str, pc_object: HasThumbMixin) -> None:
+        if not self.shall_synchronize_thumbs():
+            return
+        self.checkedThumbs += 1
+
+        load_thumb = self.get_object_thumb_loader()
+        if not load_thumb:
+            return
+
+        thumb_pipeline.submit(chunk_key, pc_object, load_thumb, self.get_keep_poster_ratio())
+
+    def _collect_thumbs(self, thumb_pipeline: ThumbPipeline, chunk_to_insert: dict, chunk_to_update: dict) -> None:
+        for result in thumb_pipeline.drain():
+            if result.error:
+                self.log_provider_event(
+                    providers_models.LocalProviderEventType.SyncError, result.error.__class__.__name__
+                )
+                self.erroredThumbs += 1
+                logger.info("ERROR during handle thumb: %s", result.error, exc_info=result.error)
+                continue
+            if not result.created:
+                continue
+            self.createdThumbs += 1
+            errors = entity_validator.validate(result.pc_object)
+            if errors and len(errors.errors) > 0:
+                self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "ApiErrors")
+                continue
+            if result.key not in chunk_to_insert:
+                chunk_to_update[result.key] = result.pc_object
+
     def _create_object(self, providable_info: ProvidableInfo) -> Model:
         pc_object = providable_info.type()
         pc_object.idAtProviders = providable_info.id_at_providers
@@ -179,27 +233,60 @@ class LocalProvider(Iterator):
         model_type: type[offers_models.Product | offers_models.Offer | offers_models.Stock],
         id_at_providers: str,
     ) -> offers_models.Product | offers_models.Offer | offers_models.Stock | None:
+        return self.get_existing_objects(model_type, [id_at_providers]).get(id_at_providers)
+
+    def get_existing_objects(
+        self,
+        model_type: type[offers_models.Product | offers_models.Offer | offers_models.Stock],
+        id_at_providers: Collection[str],
+    ) -> dict[str, offers_models.Product | offers_models.Offer | offers_models.Stock]:
+        """Return existing objects of the given type, indexed by their
+        identifier at the provider, with a single query.
+        """
         # exception to the ProvidableMixin because Offer no longer extends this class
         # idAtProviders has been replaced by idAtProvider property
-        lookup = {}
         if model_type == offers_models.Offer:
-            lookup["idAtProvider"] = id_at_providers
+            id_column = offers_models.Offer.idAtProvider
         else:
-            lookup["idAtProviders"] = id_at_providers
-        query = model_type.query.filter_by(**lookup)
+            id_column = model_type.idAtProviders
+        query = model_type.query.filter(id_column.in_(id_at_providers))
         if model_type == offers_models.Stock:
             query = query.with_for_update()
 
-        return query.one_or_none()
+        return {getattr(obj, id_column.key): obj for obj in query}
 
     def get_existing_pc_obj(
-        self, providable_info: ProvidableInfo, chunk_to_insert: dict, chunk_to_update: dict
+        self,
+        providable_info: ProvidableInfo,
+        chunk_to_insert: dict,
+        chunk_to_update: dict,
+        prefetched_objects: dict[str, Model] | None = None,
     ) -> offers_models.Product | offers_models.Offer | offers_models.Stock | None:
         object_in_current_chunk = get_object_from_current_chunks(providable_info, chunk_to_insert, chunk_to_update)
-        if object_in_current_chunk is None:
-            return self.get_existing_object(providable_info.type, providable_info.id_at_providers)
-
-        return object_in_current_chunk
+        if object_in_current_chunk is not None:
+            return object_in_current_chunk
+        if prefetched_objects is not None:
+            return prefetched_objects.get(_get_chunk_key(providable_info))  # type: ignore[return-value]
+        return self.get_existing_object(providable_info.type, providable_info.id_at_providers)
+
+    def prefetch_existing_objects(
+        self, providable_infos: list[ProvidableInfo], chunk_to_insert: dict, chunk_to_update: dict
+    ) -> dict[str, Model]:
+        """Look up objects of a batch of providable information with one
+        query per type of object (instead of one query per object).
+
+        Objects are indexed like in chunks.
+        """
+        id_at_providers_by_type = defaultdict(set)
+        for providable_info in providable_infos:
+            if get_object_from_current_chunks(providable_info, chunk_to_insert, chunk_to_update) is None:
+                id_at_providers_by_type[providable_info.type].add(providable_info.id_at_providers)
+
+        prefetched_objects = {}
+        for model_type, id_at_providers in id_at_providers_by_type.items():
+            for id_at_provider, obj in self.get_existing_objects(model_type, id_at_providers).items():
+                prefetched_objects[f"{id_at_provider}|{model_type.__name__}"] = obj
+        return prefetched_objects
 
     def updateObjects(self, limit: int | None = None) -> None:
         # pylint: disable=too-many-nested-blocks
@@ -216,77 +303,106 @@ class LocalProvider(Iterator):
 
         chunk_to_insert: dict[str, Model] = {}
         chunk_to_update: dict[str, Model] = {}
+        batch_lookup = FeatureToggle.WIP_LOCAL_PROVIDERS_BATCH_LOOKUP.is_active()
+        thumb_pipeline = None
+        if FeatureToggle.WIP_CONCURRENT_PROVIDER_THUMBS.is_active():
+            thumb_pipeline = ThumbPipeline(max_workers=self.thumbs_max_workers or settings.PROVIDER_THUMBS_MAX_WORKERS)
+
+        try:
+            for providable_infos in self:
+                objects_limit_reached = limit and self.checkedObjects >= limit
+                if objects_limit_reached:
+                    break
+
+                has_no_providables_info = len(providable_infos) == 0
+                if has_no_providables_info:
+                    self.checkedObjects += 1
+                    continue
+
+                prefetched_objects = None
+                if batch_lookup:
+                    prefetched_objects = self.prefetch_existing_objects(
+                        providable_infos, chunk_to_insert, chunk_to_update
+                    )
 
-        for providable_infos in self:
-            objects_limit_reached = limit and self.checkedObjects >= limit
-            if objects_limit_reached:
-                break
-
-            has_no_providables_info = len(providable_infos) == 0
-            if has_no_providables_info:
-                self.checkedObjects += 1
-                continue
-
-            for providable_info in providable_infos:
-                chunk_key = providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
-                pc_object = self.get_existing_pc_obj(providable_info, chunk_to_insert, chunk_to_update)
-                last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
-
-                if pc_object is None:
-                    if not self.can_create:
-                        continue
-
-                    try:
-                        pc_object = self._create_object(providable_info)
-                        chunk_to_insert[chunk_key] = pc_object
-                    except ApiErrors:
-                        continue
-                else:
-                    object_need_update = (
-                        last_update_for_current_provider is None
-                        or last_update_for_current_provider < providable_info.date_modified_at_provider
+                for providable_info in providable_infos:
+                    chunk_key = _get_chunk_key(providable_info)
+                    pc_object = self.get_existing_pc_obj(
+                        providable_info, chunk_to_insert, chunk_to_update, prefetched_objects
                     )
+                    last_update_for_current_provider = get_last_update_for_provider(self.provider.id, pc_object)
 
-                    if object_need_update:
-                        try:
-                            self._handle_update(pc_object, providable_info)
-                            if chunk_key in chunk_to_insert:
-                                chunk_to_insert[chunk_key] = pc_object
-                            else:
-                                chunk_to_update[chunk_key] = pc_object
-                        except ApiErrors:
+                    if pc_object is None:
+                        if not self.can_create:
                             continue
 
-                if isinstance(pc_object, HasThumbMixin) and (
-                    not last_update_for_current_provider
-                    or last_update_for_current_provider.date() != datetime.today().date()
-                ):
-                    initial_thumb_count = pc_object.thumbCount
-                    try:
-                        self._handle_thumb(pc_object)
-                    except Exception as e:  # pylint: disable=broad-except
-                        self.log_provider_event(providers_models.LocalProviderEventType.SyncError, e.__class__.__name__)
-                        self.erroredThumbs += 1
-                        logger.info("ERROR during handle thumb: %s", e, exc_info=True)
-                    pc_object_has_new_thumbs = pc_object.thumbCount != initial_thumb_count
-                    if pc_object_has_new_thumbs:
-                        errors = entity_validator.validate(pc_object)
-                        if errors and len(errors.errors) > 0:
-                            self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "ApiErrors")
+                        try:
+                            pc_object = self._create_object(providable_info)
+                            chunk_to_insert[chunk_key] = pc_object
+                        except ApiErrors:
                             continue
-
-                        chunk_to_update[chunk_key] = pc_object
-
-                self.checkedObjects += 1
-
-                if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
-                    save_chunks(chunk_to_insert, chunk_to_update)
-                    _reindex_offers(
-                        list(chunk_to_insert.values()) + list(chunk_to_update.values()),
-                        self.venue_provider,
-                    )
-                    chunk_to_insert = {}
-                    chunk_to_update = {}
+                    else:
+                        object_need_update = (
+                            last_update_for_current_provider is None
+                            or last_update_for_current_provider < providable_info.date_modified_at_provider
+                        )
+
+                        if object_need_update:
+                            try:
+                                self._handle_update(pc_object, providable_info)
+                                if chunk_key in chunk_to_insert:
+                                    chunk_to_insert[chunk_key] = pc_object
+                                else:
+                                    chunk_to_update[chunk_key] = pc_object
+                            except ApiErrors:
+                                continue
+
+                    if isinstance(pc_object, HasThumbMixin) and (
+                        not last_update_for_current_provider
+                        or last_update_for_current_provider.date() != datetime.today().date()
+                    ):
+                        initial_thumb_count = pc_object.thumbCount
+                        try:
+                            if thumb_pipeline:
+                                # Thumbs are collected when the chunk is saved.
+                                self._submit_thumb(thumb_pipeline, chunk_key, pc_object)
+                            else:
+                                self._handle_thumb(pc_object)
+                        except Exception as e:  # pylint: disable=broad-except
+                            self.log_provider_event(
+                                providers_models.LocalProviderEventType.SyncError, e.__class__.__name__
+                            )
+                            self.erroredThumbs += 1
+                            logger.info("ERROR during handle thumb: %s", e, exc_info=True)
+                        pc_object_has_new_thumbs = not thumb_pipeline and pc_object.thumbCount != initial_thumb_count
+                        if pc_object_has_new_thumbs:
+                            errors = entity_validator.validate(pc_object)
+                            if errors and len(errors.errors) > 0:
+                                self.log_provider_event(providers_models.LocalProviderEventType.SyncError, "ApiErrors")
+                                continue
+
+                            chunk_to_update[chunk_key] = pc_object
+
+                    self.checkedObjects += 1
+
+                    if len(chunk_to_insert) + len(chunk_to_update) >= CHUNK_MAX_SIZE:
+                        if thumb_pipeline:
+                            self._collect_thumbs(thumb_pipeline, chunk_to_insert, chunk_to_update)
+                        save_chunks(chunk_to_insert, chunk_to_update)
+                        _reindex_offers(
+                            list(chunk_to_insert.values()) + list(chunk_to_update.values()),
+                            self.venue_provider,
+                        )
+                        chunk_to_insert = {}
+                        chunk_to_update = {}
+
+            if thumb_pipeline:
+                self._collect_thumbs(thumb_pipeline, chunk_to_insert, chunk_to_update)
+        finally:
+            # Also on error: stop the workers, and cancel the thumbs
+            # that they have not started to process.
+            if thumb_pipeline:
+                thumb_pipeline.shutdown()
 
         if len(chunk_to_insert) + len(chunk_to_update) > 0:
             save_chunks(chunk_to_insert, chunk_to_update)
@@ -306,6 +422,10 @@ class LocalProvider(Iterator):
         pass
 
 
+def _get_chunk_key(providable_info: ProvidableInfo) -> str:
+    return providable_info.id_at_providers + "|" + str(providable_info.type.__name__)
+
+
 def _upload_thumb(
     pc_object: HasThumbMixin,
     image_as_bytes: bytes,
@@ -0,0 +1,97 @@
+"""Download, convert and upload thumbs of synchronized objects in a pool
+of threads, while the provider goes on with the next objects.
+
+The thumb count of an object is incremented when its thumb is submitted
+(so that its storage id is known), and decremented back if no thumb
+could be uploaded. Pending thumbs MUST be collected (see `drain()`)
+before objects are saved.
+"""
+
+from concurrent import futures
+import logging
+import threading
+import typing
+
+import flask
+
+from pcapi.connectors.thumb_storage import create_thumb
+from pcapi.models.has_thumb_mixin import HasThumbMixin
+
+
+logger = logging.getLogger(__name__)
+
+
+ThumbLoader = typing.Callable[[], bytes]
+
+
+class ThumbResult(typing.NamedTuple):
+    key: str
+    pc_object: HasThumbMixin
+    created: bool
+    error: Exception | None
+
+
+class ThumbPipeline:
+    def __init__(self, max_workers: int, max_pending: int | None = None):
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider-thumbs")
+        # Back-pressure: the provider waits when too many thumbs are
+        # pending, instead of loading all images in memory.
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max_workers)
+        self._pending: list[tuple[str, HasThumbMixin, futures.Future]] = []
+        self._app = flask.current_app._get_current_object()  # type: ignore[attr-defined]
+
+    def submit(self, key: str, pc_object: HasThumbMixin, load_thumb: ThumbLoader, keep_poster_ratio: bool) -> None:
+        if pc_object.thumbCount is None:
+            pc_object.thumbCount = 0
+        pc_object.thumbCount += 1
+        try:
+            object_id = pc_object.get_thumb_storage_id()
+        except ValueError:  # unsaved object
+            pc_object.thumbCount -= 1
+            raise
+
+        self._slots.acquire()  # pylint: disable=consider-using-with
+        try:
+            future = self._executor.submit(self._process, pc_object, load_thumb, object_id, keep_poster_ratio)
+        except Exception:
+            self._slots.release()
+            pc_object.thumbCount -= 1
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append((key, pc_object, future))
+
+    def _process(
+        self, pc_object: HasThumbMixin, load_thumb: ThumbLoader, object_id: str, keep_poster_ratio: bool
+    ) -> bool:
+        with self._app.app_context():
+            image = load_thumb()
+            if not image:
+                return False
+            create_thumb(
+                model_with_thumb=pc_object,  # not modified, since `object_id` is given
+                image_as_bytes=image,
+                storage_id_suffix_str="",
+                keep_ratio=keep_poster_ratio,
+                object_id=object_id,
+            )
+            return True
+
+    def drain(self) -> list[ThumbResult]:
+        """Wait for all pending thumbs and return their results."""
+        results = []
+        for key, pc_object, future in self._pending:
+            try:
+                created = future.result()
+                error = None
+            except Exception as exc:  # pylint: disable=broad-except
+                created = False
+                error = exc
+            if not created:
+                pc_object.thumbCount -= 1
+            results.append(ThumbResult(key=key, pc_object=pc_object, created=created, error=error))
+        self._pending = []
+        return results
+
+    def shutdown(self) -> None:
+        """Wait for the thumbs being processed, and cancel the others."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,8 +1,11 @@
 import enum
 import logging
+import time
+import typing
 
 from alembic import op
 import flask
+import redis
 from sqlalchemy import Column
 from sqlalchemy import String
 from sqlalchemy import Text
@@ -19,10 +22,25 @@ from pcapi.models.pc_object import PcObject
 logger = logging.getLogger(__name__)
 
 
+# Incremented whenever a feature flag is toggled, so that all processes
+# reload their snapshot of feature flags, see `_get_features_snapshot()`.
+FEATURES_VERSION_KEY = "api:features:version"
+
+
 class DisabledFeatureError(Exception):
     pass
 
 
+class _FeaturesSnapshot(typing.NamedTuple):
+    features: dict[str, bool]
+    version: str | None
+    loaded_at: float
+    checked_at: float
+
+
+_features_snapshot: _FeaturesSnapshot | None = None
+
+
 class FeatureToggle(enum.Enum):
     ALGOLIA_BOOKINGS_NUMBER_COMPUTATION = (
         "Active le calcul du nombre des réservations lors de l'indexation des offres sur Algolia"
@@ -117,8 +135,44 @@ class FeatureToggle(enum.Enum):
     ENABLE_PRO_NEW_NAV_MODIFICATION = "Activer la modification du statut de la navigation du portail pro"
     WIP_ENABLE_NEW_HASHING_ALGORITHM = "Activer le nouveau système de hachage des clés publiques d'API"
     WIP_BENEFICIARY_EXTRACT_TOOL = "Activer l'extraction de données personnelles (RGPD)"
+    WIP_CHUNKED_AUTO_MARK_AS_USED = (
+        "Marquer comme utilisées les réservations après l'évènement par lots, avec un commit par lot"
+    )
+    WIP_CINEMA_SHOWTIMES_SNAPSHOT = "Récupérer en un seul appel les places restantes de toutes les séances d'un cinéma"
     WIP_ENABLE_OFFER_MARKDOWN_DESCRIPTION = "Activer la description des offres collectives en markdown."
     WIP_FUTURE_OFFER = "Activer la publication d'offres dans le futur"
+    WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER = (
+        "Couper automatiquement les appels aux API de billetterie des cinémas lentes ou indisponibles"
+    )
+    WIP_ASYNC_CINEMA_STOCK_REFRESH = (
+        "Mettre à jour en tâche de fond les places restantes des séances de cinéma d'une offre consultée"
+    )
+    WIP_BATCHED_PRICING = (
+        "Valoriser en une seule transaction les réservations consécutives d'un même point de valorisation"
+    )
+    WIP_CONCURRENT_PROVIDER_THUMBS = (
+        "Télécharger, convertir et envoyer les images des synchronisations de fournisseurs en parallèle"
+    )
+    WIP_LIGHT_OFFER_INDEXATION_QUERY = "Utiliser une requête allégée (sans ORM) pour l'indexation des offres"
+    WIP_LOCAL_PROVIDERS_BATCH_LOOKUP = (
+        "Rechercher en une seule requête les objets existants de chaque lot d'objets synchronisés par un fournisseur"
+    )
+    WIP_SET_BASED_CASHFLOW_GENERATION = (
+        "Générer les virements de tous les comptes bancaires par lots, en quelques requêtes ensemblistes"
+    )
+    WIP_STREAMED_BOOKING_EXPORTS = (
+        "Générer les exports de réservations du portail pro au fil de l'eau, sans les construire en mémoire"
+    )
+    WIP_USE_OFFER_BOOKING_COUNT = (
+        "Utiliser les compteurs de réservations par offre pour le calcul du nombre de réservations récentes"
+    )
+    WIP_USE_PRICING_POINT_REVENUE = (
+        "Utiliser le chiffre d'affaires annuel maintenu pour chaque point de valorisation lors de la valorisation"
+    )
+    WIP_USE_STORED_REIMBURSEMENT_DETAILS = (
+        "Enregistrer le détail des remboursements de chaque justificatif lors de sa génération, et l'utiliser "
+        "pour les exports CSV du portail pro"
+    )
     USE_END_DATE_FOR_COLLECTIVE_PRICING = "Utiliser la date de fin du stock collectif comme date de valorisation."
     WIP_ENABLE_OFFER_ADDRESS = "Activer l'association des offres à des adresses."
     WIP_SPLIT_OFFER = "Activer le nouveau parcours de création/édition d'offre individuelle"
@@ -126,14 +180,11 @@ class FeatureToggle(enum.Enum):
 
     def is_active(self) -> bool:
         if flask.has_request_context():
+            # Flags do not change during the processing of a request.
             if not hasattr(flask.request, "_cached_features"):
-                setattr(
-                    flask.request,
-                    "_cached_features",
-                    {f.name: f.isActive for f in db.session.query(Feature.name, Feature.isActive)},
-                )
+                setattr(flask.request, "_cached_features", _get_features())
             return flask.request._cached_features[self.name]  # type: ignore[attr-defined]
-        return Feature.query.filter_by(name=self.name).one().isActive
+        return _get_features()[self.name]
 
 
 class Feature(PcObject, Base, Model, DeactivableMixin):
@@ -177,14 +228,27 @@ FEATURES_DISABLED_BY_DEFAULT: tuple[FeatureToggle, ...] = (
     FeatureToggle.LOG_EMS_CINEMAS_AVAILABLE_FOR_SYNC,
     FeatureToggle.SYNCHRONIZE_TITELIVE_API_MUSIC_PRODUCTS,
     FeatureToggle.USE_END_DATE_FOR_COLLECTIVE_PRICING,
+    FeatureToggle.WIP_ASYNC_CINEMA_STOCK_REFRESH,
+    FeatureToggle.WIP_BATCHED_PRICING,
     FeatureToggle.WIP_BENEFICIARY_EXTRACT_TOOL,
+    FeatureToggle.WIP_CHUNKED_AUTO_MARK_AS_USED,
+    FeatureToggle.WIP_CINEMA_SHOWTIMES_SNAPSHOT,
+    FeatureToggle.WIP_CONCURRENT_PROVIDER_THUMBS,
     FeatureToggle.WIP_CONNECT_AS,
     FeatureToggle.WIP_ENABLE_MOCK_UBBLE,
     FeatureToggle.WIP_ENABLE_OFFER_ADDRESS,
     FeatureToggle.WIP_ENABLE_REMINDER_MARKETING_MAIL_METADATA_DISPLAY,
     FeatureToggle.WIP_ENABLE_TITELIVE_API_FOR_BOOKS,
+    FeatureToggle.WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER,
     FeatureToggle.WIP_FUTURE_OFFER,
+    FeatureToggle.WIP_LIGHT_OFFER_INDEXATION_QUERY,
+    FeatureToggle.WIP_LOCAL_PROVIDERS_BATCH_LOOKUP,
+    FeatureToggle.WIP_SET_BASED_CASHFLOW_GENERATION,
     FeatureToggle.WIP_SPLIT_OFFER,
+    FeatureToggle.WIP_STREAMED_BOOKING_EXPORTS,
+    FeatureToggle.WIP_USE_OFFER_BOOKING_COUNT,
+    FeatureToggle.WIP_USE_PRICING_POINT_REVENUE,
+    FeatureToggle.WIP_USE_STORED_REIMBURSEMENT_DETAILS,
     # Please keep alphabetic order
 )
 
@@ -193,6 +257,75 @@ if settings.IS_PROD or settings.IS_STAGING:
     FEATURES_DISABLED_BY_DEFAULT += (FeatureToggle.WIP_ENABLE_NATIONAL_PROGRAM_NEW_RULES_PUBLIC_API,)
 
 
+def _load_features() -> dict[str, bool]:
+    return {f.name: f.isActive for f in db.session.query(Feature.name, Feature.isActive)}
+
+
+def _get_features_version() -> str | None:
+    if not flask.has_app_context():
+        return None
+    try:
+        return flask.current_app.redis_client.get(FEATURES_VERSION_KEY) or "0"
+    except redis.exceptions.RedisError:
+        logger.warning("Could not get version of feature flags from Redis", exc_info=True)
+        return None
+
+
+def _get_features() -> dict[str, bool]:
+    """Return the status of all feature flags, from a snapshot shared
+    by the whole process (web workers, cron commands and jobs alike).
+
+    The snapshot is trusted for FEATURES_CACHE_TTL seconds. Then it is
+    reused only if the version of feature flags in Redis has not changed
+    (see `invalidate_features_cache()`). It is reloaded from the
+    database at least every FEATURES_CACHE_MAX_AGE seconds, in case a
+    flag has been modified without invalidating the cache.
+    """
+    global _features_snapshot  # pylint: disable=global-statement
+
+    if not settings.FEATURES_CACHE_TTL:
+        return _load_features()
+
+    now = time.monotonic()
+    snapshot = _features_snapshot
+    if snapshot is not None:
+        if now - snapshot.checked_at < settings.FEATURES_CACHE_TTL:
+            return snapshot.features
+        version = _get_features_version()
+        if (
+            version is not None
+            and version == snapshot.version
+            and now - snapshot.loaded_at < settings.FEATURES_CACHE_MAX_AGE
+        ):
+            _features_snapshot = snapshot._replace(checked_at=now)
+            return snapshot.features
+    else:
+        version = _get_features_version()
+
+    features = _load_features()
+    _features_snapshot = _FeaturesSnapshot(features=features, version=version, loaded_at=now, checked_at=now)
+    return features
+
+
+def invalidate_features_cache() -> None:
+    """Make all processes reload feature flags from the database.
+
+    This must be called after feature flags have been modified (and
+    the modification has been committed).
+    """
+    global _features_snapshot  # pylint: disable=global-statement
+
+    _features_snapshot = None
+    if flask.has_request_context() and hasattr(flask.request, "_cached_features"):
+        del flask.request._cached_features
+    if flask.has_app_context():
+        try:
+            flask.current_app.redis_client.incr(FEATURES_VERSION_KEY)
+        except redis.exceptions.RedisError:
+            # Other processes will reload flags after FEATURES_CACHE_MAX_AGE seconds.
+            logger.warning("Could not invalidate cache of feature flags", exc_info=True)
+
+
 def add_feature_to_database(feature: Feature) -> None:
     """This function is to be used in the "downgrade" function of a
     migration when removing a new feature flag (so that it's added
@@ -240,6 +373,8 @@ def install_feature_flags() -> None:
         )
 
     db.session.commit()
+    if to_install_flags:
+        invalidate_features_cache()
 
 
 def clean_feature_flags() -> None:
@@ -36,12 +36,14 @@ tables_to_clean: list[flask_sqlalchemy.Model] = [
     finance_models.PaymentMessage,
     finance_models.CashflowPricing,
     finance_models.CashflowLog,
+    finance_models.InvoiceReimbursementDetails,
     finance_models.InvoiceCashflow,
     finance_models.Cashflow,
     finance_models.CashflowBatch,
     finance_models.PricingLine,
     finance_models.PricingLog,
     finance_models.Pricing,
+    finance_models.PricingPointRevenue,
     finance_models.InvoiceLine,
     finance_models.Invoice,
     finance_models.FinanceEvent,
@@ -59,6 +61,7 @@ tables_to_clean: list[flask_sqlalchemy.Model] = [
     educational_models.CollectiveOfferTemplateEducationalRedactor,
     bookings_models.ExternalBooking,
     bookings_models.Booking,
+    bookings_models.OfferBookingCount,
     educational_models.CollectiveStock,
     offers_models.Stock,
     users_models.Favorite,
@@ -16,6 +16,7 @@ from pcapi.models import db
 from pcapi.models import feature as feature_models
 from pcapi.notifications.internal.transactional import change_feature_flip as change_feature_flip_internal_message
 from pcapi.repository import atomic
+from pcapi.repository import on_commit
 
 from . import forms
 from .. import blueprint
@@ -129,6 +130,7 @@ def toggle_feature_flag(feature_flag_id: int, set_to_active: bool) -> utils.Back
     feature_flag.isActive = set_to_active
     db.session.add(feature_flag)
     db.session.flush()
+    on_commit(feature_models.invalidate_features_cache)
     change_feature_flip_internal_message.send(feature=feature_flag, current_user=current_user)
 
     flash(
@@ -56,7 +56,7 @@ def get_offer(offer_id: str) -> serializers.OfferResponse:
     )
 
     if offer.isActive and providers_repository.is_cinema_external_ticket_applicable(offer):
-        api.update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer)
+        api.refresh_cinema_stock_quantity(offer)
 
     return serializers.OfferResponse.from_orm(offer)
 
@@ -68,7 +68,7 @@ def get_offer_v2(offer_id: int) -> serializers.OfferResponseV2:
     offer = query.first_or_404()
 
     if offer.isActive and providers_repository.is_cinema_external_ticket_applicable(offer):
-        api.update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer)
+        api.refresh_cinema_stock_quantity(offer)
 
     return serializers.OfferResponseV2.from_orm(offer)
 
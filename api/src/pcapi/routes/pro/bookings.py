@@ -2,6 +2,7 @@ from datetime import date
 import math
 from typing import cast
 
+import flask
 from flask_login import current_user
 from flask_login import login_required
 
@@ -12,6 +13,7 @@ from pcapi.core.offers.models import Offer
 from pcapi.core.offers.models import Stock
 from pcapi.core.users import repository as users_repository
 from pcapi.models import api_errors
+from pcapi.models.feature import FeatureToggle
 from pcapi.routes.serialization.bookings_recap_serialize import BookingsExportQueryModel
 from pcapi.routes.serialization.bookings_recap_serialize import BookingsExportStatusFilter
 from pcapi.routes.serialization.bookings_recap_serialize import EventDateScheduleAndPriceCategoriesCountModel
@@ -81,13 +83,22 @@ def get_user_has_bookings() -> UserHasBookingResponse:
     },
     api=blueprint.pro_private_schema,
 )
-def export_bookings_for_offer_as_csv(offer_id: int, query: BookingsExportQueryModel) -> bytes:
+def export_bookings_for_offer_as_csv(offer_id: int, query: BookingsExportQueryModel) -> bytes | flask.Response:
     user = current_user._get_current_object()
     offer = Offer.query.get(int(offer_id))
 
     if not users_repository.has_access(user, offer.venue.managingOffererId):
         raise api_errors.ForbiddenError({"global": "You are not allowed to access this offer"})
 
+    if FeatureToggle.WIP_STREAMED_BOOKING_EXPORTS.is_active():
+        chunks = booking_repository.export_bookings_by_offer_id_in_chunks(
+            offer_id,
+            event_beginning_date=query.event_date,
+            export_type=BookingExportType.CSV,
+            validated_only=query.status == BookingsExportStatusFilter.VALIDATED,
+        )
+        return flask.Response(flask.stream_with_context(chunks))
+
     if query.status == BookingsExportStatusFilter.VALIDATED:
         return cast(
             str,
@@ -113,13 +124,22 @@ def export_bookings_for_offer_as_csv(offer_id: int, query: BookingsExportQueryMo
     },
     api=blueprint.pro_private_schema,
 )
-def export_bookings_for_offer_as_excel(offer_id: int, query: BookingsExportQueryModel) -> bytes:
+def export_bookings_for_offer_as_excel(offer_id: int, query: BookingsExportQueryModel) -> bytes | flask.Response:
     user = current_user._get_current_object()
     offer = Offer.query.get(int(offer_id))
 
     if not users_repository.has_access(user, offer.venue.managingOffererId):
         raise api_errors.ForbiddenError({"global": "You are not allowed to access this offer"})
 
+    if FeatureToggle.WIP_STREAMED_BOOKING_EXPORTS.is_active():
+        chunks = booking_repository.export_bookings_by_offer_id_in_chunks(
+            offer_id,
+            event_beginning_date=query.event_date,
+            export_type=BookingExportType.EXCEL,
+            validated_only=query.status == BookingsExportStatusFilter.VALIDATED,
+        )
+        return flask.Response(flask.stream_with_context(chunks))
+
     if query.status == BookingsExportStatusFilter.VALIDATED:
         return cast(
             bytes,
@@ -145,7 +165,7 @@ def export_bookings_for_offer_as_excel(offer_id: int, query: BookingsExportQuery
     },
     api=blueprint.pro_private_schema,
 )
-def get_bookings_csv(query: ListBookingsQueryModel) -> bytes:
+def get_bookings_csv(query: ListBookingsQueryModel) -> bytes | flask.Response:
     return _create_booking_export_file(query, BookingExportType.CSV)
 
 
@@ -159,7 +179,7 @@ def get_bookings_csv(query: ListBookingsQueryModel) -> bytes:
     },
     api=blueprint.pro_private_schema,
 )
-def get_bookings_excel(query: ListBookingsQueryModel) -> bytes:
+def get_bookings_excel(query: ListBookingsQueryModel) -> bytes | flask.Response:
     return _create_booking_export_file(query, BookingExportType.EXCEL)
 
 
@@ -214,7 +234,9 @@ def get_offer_price_categories_and_schedules_by_dates(offer_id: int) -> EventDat
     )
 
 
-def _create_booking_export_file(query: ListBookingsQueryModel, export_type: BookingExportType) -> bytes:
+def _create_booking_export_file(
+    query: ListBookingsQueryModel, export_type: BookingExportType
+) -> bytes | flask.Response:
     venue_id = query.venue_id
     event_date = query.event_date
     booking_period = None
@@ -225,6 +247,17 @@ def _create_booking_export_file(query: ListBookingsQueryModel, export_type: Book
         )
     booking_status = query.booking_status_filter
 
+    if FeatureToggle.WIP_STREAMED_BOOKING_EXPORTS.is_active():
+        chunks = booking_repository.get_export_in_chunks(
+            user=current_user._get_current_object(),
+            booking_period=booking_period,
+            status_filter=booking_status,
+            event_date=event_date,
+            venue_id=venue_id,
+            export_type=export_type,
+        )
+        return flask.Response(flask.stream_with_context(chunks))
+
     export_data = booking_repository.get_export(
         user=current_user._get_current_object(),  # for tests to succeed, because current_user is actually a LocalProxy
         booking_period=booking_period,
@@ -27,7 +27,7 @@ from pcapi.validation.routes.users_authentifications import api_key_required
     ),
 )
 @api_key_required
-@cached_view(prefix="pro_public_api_v2")
+@cached_view(prefix="pro_public_api_v2", local_ttl=60, single_flight=True)
 def list_educational_domains() -> domains_serialization.CollectiveOffersListDomainsResponseModel:
     """
     Get the eductional domains
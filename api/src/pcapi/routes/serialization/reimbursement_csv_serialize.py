@@ -16,6 +16,7 @@ import pcapi.core.finance.repository as finance_repository
 import pcapi.core.finance.utils as finance_utils
 from pcapi.core.offers.serialize import serialize_offer_type_educational_or_individual
 from pcapi.models.api_errors import ApiErrors
+from pcapi.models.feature import FeatureToggle
 from pcapi.utils.date import MONTHS_IN_FRENCH
 from pcapi.utils.date import utc_datetime_to_department_timezone
 from pcapi.utils.string import u_nbsp
@@ -218,8 +219,29 @@ class ReimbursementDetails:
 
         return rows
 
+    def as_stored_row(self) -> list:
+        """Return the CSV row in a form that can be stored as JSON (see
+        `finance_models.InvoiceReimbursementDetails`).
+        """
+        # Dates are stored as written by the CSV writer.
+        return [str(value) if isinstance(value, datetime.date) else value for value in self.as_csv_row()]
 
-def generate_reimbursement_details_csv(reimbursement_details: Iterable[ReimbursementDetails]) -> str:
+
+class StoredReimbursementDetails:
+    """Reimbursement details that have been stored when the invoice was
+    generated (see `ReimbursementDetails.as_stored_row()`).
+    """
+
+    def __init__(self, row: list):
+        self.row = row
+
+    def as_csv_row(self) -> list:
+        return self.row
+
+
+def generate_reimbursement_details_csv(
+    reimbursement_details: Iterable[ReimbursementDetails | StoredReimbursementDetails],
+) -> str:
     output = StringIO()
     csv_lines = [reimbursement_detail.as_csv_row() for reimbursement_detail in reimbursement_details]
     writer = csv.writer(output, dialect=csv.excel, delimiter=";", quoting=csv.QUOTE_NONNUMERIC)
@@ -241,9 +263,20 @@ def find_offerer_reimbursement_details(
 
 def find_reimbursement_details_by_invoices(
     invoices_references: list[str],
-) -> list[ReimbursementDetails]:
+) -> list[ReimbursementDetails | StoredReimbursementDetails]:
+    reimbursement_details: list[ReimbursementDetails | StoredReimbursementDetails] = []
+    if FeatureToggle.WIP_USE_STORED_REIMBURSEMENT_DETAILS.is_active():
+        stored_references = set()
+        for reference, rows in finance_repository.get_stored_reimbursement_details(invoices_references):
+            stored_references.add(reference)
+            reimbursement_details.extend(StoredReimbursementDetails(row) for row in rows)
+        # Details of older invoices have not been stored.
+        invoices_references = [reference for reference in invoices_references if reference not in stored_references]
+        if not invoices_references:
+            return reimbursement_details
+
     offerers_payments = finance_repository.find_offerer_payments(invoices_references=invoices_references)
-    reimbursement_details = [ReimbursementDetails(offerer_payment) for offerer_payment in offerers_payments]
+    reimbursement_details.extend(ReimbursementDetails(offerer_payment) for offerer_payment in offerers_payments)
 
     return reimbursement_details
 
@@ -102,6 +102,16 @@ REDIS_COLLECTIVE_OFFER_TEMPLATE_IDS_CHUNK_SIZE = int(
 )
 REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_FOR_OFFERS_CHUNK_SIZE", 1000))
 REDIS_VENUE_IDS_CHUNK_SIZE = int(os.environ.get("REDIS_VENUE_IDS_CHUNK_SIZE", 1000))
+# Maximum number of entries of the in-process cache in front of Redis,
+# see `pcapi.utils.cache.get_from_cache()`.
+LOCAL_CACHE_MAX_SIZE = int(os.environ.get("LOCAL_CACHE_MAX_SIZE", 256))
+
+
+# FEATURE FLAGS
+# Feature flags are kept in memory by each process, see
+# `pcapi.models.feature._get_features()`.
+FEATURES_CACHE_TTL = int(os.environ.get("FEATURES_CACHE_TTL", 5))
+FEATURES_CACHE_MAX_AGE = int(os.environ.get("FEATURES_CACHE_MAX_AGE", 60))
 
 
 # SENTRY
@@ -164,6 +174,7 @@ ALGOLIA_DELETING_COLLECTIVE_OFFERS_CHUNK_SIZE = int(
 ALGOLIA_OFFERS_INDEX_MAX_SIZE = int(os.environ.get("ALGOLIA_OFFERS_INDEX_MAX_SIZE", -1))
 
 ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE = int(os.environ.get("ALGOLIA_OFFERS_BY_VENUE_CHUNK_SIZE", 10000))
+ALGOLIA_OFFERS_INDEXATION_WORKERS = int(os.environ.get("ALGOLIA_OFFERS_INDEXATION_WORKERS", 1))
 ALGOLIA_LAST_30_DAYS_BOOKINGS_RANGE_THRESHOLDS = utils.env_get_list(
     "ALGOLIA_LAST_30_DAYS_BOOKINGS_RANGE_THRESHOLDS", type_=int
 )
@@ -288,6 +299,26 @@ EMS_GOOGLE_DRIVE_FOLDER = secrets_utils.get("EMS_GOOGLE_DRIVE_FOLDER")
 CDS_SUPPORT_EMAIL_ADDRESS = os.environ.get("CDS_SUPPORT_EMAIL_ADDRESS", "")
 CGR_SUPPORT_EMAIL_ADDRESS = os.environ.get("CGR_SUPPORT_EMAIL_ADDRESS", "")
 EMS_SUPPORT_EMAIL_ADDRESS = os.environ.get("EMS_SUPPORT_EMAIL_ADDRESS", "")
+# Number of threads that process thumbs during the synchronization of
+# a provider, see `pcapi.local_providers.thumb_pipeline`.
+PROVIDER_THUMBS_MAX_WORKERS = int(os.environ.get("PROVIDER_THUMBS_MAX_WORKERS", 4))
+# Minimum interval (in seconds) between two refreshes of the remaining
+# places of the shows of a cinema offer, when they are refreshed in the
+# background, see `pcapi.core.offers.api.refresh_cinema_stock_quantity()`.
+CINEMA_STOCK_REFRESH_INTERVAL = int(os.environ.get("CINEMA_STOCK_REFRESH_INTERVAL", 60))
+# Circuit breaker of external cinema booking clients, see
+# `pcapi.core.external_bookings.circuit_breaker`. Durations are in seconds.
+EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(
+    os.environ.get("EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5)
+)
+EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_WINDOW = int(
+    os.environ.get("EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_WINDOW", 60)
+)
+EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_OPEN_DURATION = int(
+    os.environ.get("EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_OPEN_DURATION", 30)
+)
+EXTERNAL_BOOKINGS_MIN_TIMEOUT = float(os.environ.get("EXTERNAL_BOOKINGS_MIN_TIMEOUT", 2))
+EXTERNAL_BOOKINGS_MAX_TIMEOUT = float(os.environ.get("EXTERNAL_BOOKINGS_MAX_TIMEOUT", 10))
 
 # DEMARCHES SIMPLIFIEES
 DMS_VENUE_PROCEDURE_ID_V4 = os.environ.get("DEMARCHES_SIMPLIFIEES_RIB_VENUE_PROCEDURE_ID_V4", 0)
@@ -488,6 +519,14 @@ FINANCE_GOOGLE_DRIVE_ROOT_FOLDER_ID = secrets_utils.get("FINANCE_GOOGLE_DRIVE_RO
 FINANCE_OVERRIDE_PRICING_ORDERING_ON_PRICING_POINTS = utils.env_get_list(
     "FINANCE_OVERRIDE_PRICING_ORDERING_ON_PRICING_POINTS", type_=int
 )
+# Number of concurrent workers of `price_events()`, each one pricing
+# the events of its own pricing points.
+PRICE_EVENTS_WORKERS = int(os.environ.get("PRICE_EVENTS_WORKERS", 1))
+# Number of processes of `generate_invoices()` that render PDF invoices.
+INVOICE_RENDERING_WORKERS = int(os.environ.get("INVOICE_RENDERING_WORKERS", 1))
+# Compression level (from 0 to 9) of zipped finance CSV files: lower
+# levels are faster, higher levels produce smaller files.
+FINANCE_CSV_COMPRESSION_LEVEL = int(os.environ.get("FINANCE_CSV_COMPRESSION_LEVEL", 9))
 
 # BACKOFFICE
 BACKOFFICE_ADD_ALL_PERMISSIONS_TO_SPECIFIC_ROLES = bool(
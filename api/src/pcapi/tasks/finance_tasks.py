@@ -6,6 +6,7 @@ from pcapi import settings
 from pcapi.core.finance import api as finance_api
 from pcapi.core.finance import conf as finance_conf
 from pcapi.core.finance import models as finance_models
+from pcapi.models.feature import FeatureToggle
 from pcapi.repository import transaction
 from pcapi.routes.serialization import BaseModel
 from pcapi.tasks.cloud_task import list_tasks
@@ -42,7 +43,8 @@ def generate_and_store_invoice_task(payload: GenerateInvoicePayload) -> None:
             )
             logger.info("Generated and sent debit note", extra={"bank_account_id": payload.bank_account_id})
             # When it's the last invoice, generate and upload the invoices file
-            if current_app.redis_client.decr(finance_conf.REDIS_INVOICES_LEFT_TO_GENERATE) == 0:
+            is_last_invoice = current_app.redis_client.decr(finance_conf.REDIS_INVOICES_LEFT_TO_GENERATE) == 0
+            if is_last_invoice:
                 try:
                     batch = finance_models.CashflowBatch.query.get(payload.batch_id)
                     path = finance_api.generate_invoice_file(batch)
@@ -61,6 +63,13 @@ def generate_and_store_invoice_task(payload: GenerateInvoicePayload) -> None:
                 current_app.redis_client.delete(finance_conf.REDIS_INVOICES_LEFT_TO_GENERATE)
                 current_app.redis_client.delete(finance_conf.REDIS_GENERATE_INVOICES_LENGTH)
 
+        # Details are stored in their own transactions, hence after the
+        # last invoice has been committed.
+        if is_last_invoice and FeatureToggle.WIP_USE_STORED_REIMBURSEMENT_DETAILS.is_active():
+            batch = finance_models.CashflowBatch.query.get(payload.batch_id)
+            finance_api.store_reimbursement_details(batch)
+            logger.info("Stored reimbursement details of invoices", extra={"batch_id": payload.batch_id})
+
     except Exception as exc:  # pylint: disable=broad-except
         logger.exception(
             "Could not generate invoice",
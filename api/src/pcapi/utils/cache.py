@@ -1,14 +1,54 @@
+from collections import OrderedDict
 from functools import partial
 from functools import wraps
 from hashlib import sha256
 import json
+import logging
+import math
+import os
+import random
+import secrets
+import threading
+import time
 from typing import Any
 from typing import Callable
 from typing import Iterable
 from typing import cast
 
 from flask import current_app
+import prometheus_client
 import pydantic.v1 as pydantic_v1
+import redis
+
+from pcapi import settings
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "api:cache:invalidation"
+# With `single_flight`, data is kept in Redis this long after it has
+# expired, to be served while it is being recomputed.
+STALE_DATA_GRACE_PERIOD = 5 * 60
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+# Waiting time between checks, when another caller is computing data
+# that is not in the cache yet.
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+# The higher, the earlier data is recomputed before it expires.
+EARLY_REFRESH_BETA = 1.0
+# Release the lock only if it is still held by the caller: it may have
+# expired while the data was computed, and been taken by another one.
+RELEASE_SINGLE_FLIGHT_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+cache_lookups = prometheus_client.Counter(
+    "pcapi_cache_lookups",
+    "Number of lookups in the cache, by key prefix and by result",
+    ["prefix", "result"],  # result: local_hit, redis_hit or miss
+)
 
 
 class _CacheProxy:
@@ -25,6 +65,176 @@ class _CacheProxy:
         return self._json
 
 
+class _LocalCache:
+    """A bounded LRU cache of the current process, whose entries expire
+    after a TTL.
+
+    Entries are `_CacheProxy` objects, so that JSON data is parsed at
+    most once per process.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, _CacheProxy]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> _CacheProxy | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, proxy = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return proxy
+
+    def set(self, key: str, proxy: _CacheProxy, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, proxy)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = _LocalCache(settings.LOCAL_CACHE_MAX_SIZE)
+_invalidation_listener_lock = threading.Lock()
+_invalidation_listener_pid: int | None = None
+
+
+def _on_invalidation(message: dict) -> None:
+    _local_cache.delete(message["data"])
+
+
+def _on_invalidation_listener_error(exc: BaseException, pubsub: Any, thread: Any) -> None:
+    global _invalidation_listener_pid  # pylint: disable=global-statement
+
+    logger.warning("Lost subscription to cache invalidations", extra={"exc": str(exc)})
+    thread.stop()
+    pubsub.close()
+    # Invalidations may have been missed: start over on the next call.
+    _local_cache.clear()
+    _invalidation_listener_pid = None
+
+
+def _ensure_invalidation_listener(redis_client: redis.Redis) -> None:
+    """Subscribe the current process to the invalidations of the
+    local cache that are broadcast by other processes.
+
+    This is done lazily (and again after a fork), because Gunicorn
+    workers are forked after the application has been loaded.
+    """
+    global _invalidation_listener_pid  # pylint: disable=global-statement
+
+    pid = os.getpid()
+    if _invalidation_listener_pid == pid:
+        return
+    with _invalidation_listener_lock:
+        if _invalidation_listener_pid == pid:
+            return
+        # Entries inherited from the parent process may be stale.
+        _local_cache.clear()
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation})
+        pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=_on_invalidation_listener_error)
+        _invalidation_listener_pid = pid
+
+
+def clear_local_cache() -> None:
+    _local_cache.clear()
+
+
+def _get_key_prefix(key_template: str) -> str:
+    # Used as a label of metrics: it must not depend on `key_args`.
+    return key_template.split("%", 1)[0].rstrip(":")
+
+
+def _retrieve(retriever: Callable[..., pydantic_v1.BaseModel | str]) -> tuple[str, float]:
+    start = time.perf_counter()
+    data = retriever()
+    if isinstance(data, pydantic_v1.BaseModel):
+        data = data.json(exclude_none=False, by_alias=True)
+    return data, time.perf_counter() - start
+
+
+def _should_refresh_early(expires_at: float, compute_duration: float) -> bool:
+    # Probabilistic early expiration ("XFetch"): the closer to the
+    # expiration and the longer to compute, the more likely a caller
+    # refreshes the data before it expires, so that only a few callers
+    # (usually one) get to do it.
+    return time.time() - compute_duration * EARLY_REFRESH_BETA * math.log(1 - random.random()) >= expires_at
+
+
+def _store_with_metadata(
+    redis_client: redis.Redis, key: str, data: str, expire: int | None, compute_duration: float
+) -> None:
+    if expire is None:
+        redis_client.set(key, data.encode("utf-8"))
+        redis_client.delete(f"{key}:metadata")
+        return
+    # The data outlives its expiration, so that it can be served while
+    # it is recomputed. Its actual expiration is stored aside.
+    metadata = json.dumps({"expires_at": time.time() + expire, "compute_duration": compute_duration})
+    pipeline = redis_client.pipeline()
+    pipeline.set(key, data.encode("utf-8"), ex=expire + STALE_DATA_GRACE_PERIOD)
+    pipeline.set(f"{key}:metadata", metadata, ex=expire + STALE_DATA_GRACE_PERIOD)
+    pipeline.execute()
+
+
+def _get_with_single_flight(
+    redis_client: redis.Redis,
+    key: str,
+    retriever: Callable[..., pydantic_v1.BaseModel | str],
+    expire: int | None,
+) -> tuple[str, str]:
+    """Return the data and the result of the lookup ("redis_hit",
+    "stale_hit" or "miss").
+
+    Only the caller that holds a lock computes the data, while others
+    get the stale data if there is any, or wait for the data otherwise.
+    """
+    lock_key = f"{key}:lock"
+    lock_token = secrets.token_hex(16)
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TIMEOUT
+    while True:
+        data, raw_metadata = redis_client.mget(key, f"{key}:metadata")
+        expired = False
+        if data is not None:
+            if not raw_metadata:  # stored without expiration, or without `single_flight`
+                return data, "redis_hit"
+            metadata = json.loads(raw_metadata)
+            if not _should_refresh_early(metadata["expires_at"], metadata["compute_duration"]):
+                return data, "redis_hit"
+            expired = time.time() >= metadata["expires_at"]
+        is_locked = bool(redis_client.set(lock_key, lock_token, nx=True, ex=SINGLE_FLIGHT_LOCK_TIMEOUT))
+        if is_locked:
+            break
+        if data is not None:
+            return data, "stale_hit" if expired else "redis_hit"
+        if time.monotonic() > deadline:
+            # The holder of the lock may have crashed: don't wait forever.
+            break
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+    try:
+        data, compute_duration = _retrieve(retriever)
+        _store_with_metadata(redis_client, key, data, expire, compute_duration)
+    finally:
+        if is_locked:
+            release_lock = redis_client.register_script(RELEASE_SINGLE_FLIGHT_LOCK_SCRIPT)
+            release_lock(keys=[lock_key], args=[lock_token])
+    return data, "miss"
+
+
 def get_from_cache(
     retriever: Callable[..., pydantic_v1.BaseModel | str],
     key_template: str,
@@ -32,6 +242,8 @@ def get_from_cache(
     expire: int | None = 60 * 60 * 24,  # 24h
     return_type: type = str,
     force_update: bool = False,
+    local_ttl: int | None = None,
+    single_flight: bool = False,
 ) -> pydantic_v1.BaseModel | str:
     """
     Retrieve data from cache if available else use the retriever callable to retrieve data and store it in cache.
@@ -46,28 +258,58 @@ def get_from_cache(
     :param return_type: Type awaited for return value. This is meant to fool mypy and spectree_serialize and keep
         compatibility. It can be either `BaseModel` or `str`.
     :param force_update: If True force the update of the field cache.
+    :param local_ttl: If set, data is also kept in memory by the current process for this number of seconds, in
+        front of Redis. Only use it for small and hot data that rarely changes: other processes are notified when
+        the data is updated with `force_update`, but they may still serve stale data until they get the notification.
+    :param single_flight: If True, only one caller at a time computes the data. Others get the previous (stale) data
+        meanwhile, or wait for the new data if there was none. Data may also be recomputed shortly before it expires.
+        Use it for data that is expensive to compute and requested concurrently.
     """
     redis_client = current_app.redis_client
     if key_args:
         key = key_template % key_args
     else:
         key = key_template
+    prefix = _get_key_prefix(key_template)
+
+    proxy = None
+    if local_ttl:
+        _ensure_invalidation_listener(redis_client)
+        if not force_update:
+            proxy = _local_cache.get(key)
 
-    data = redis_client.get(key)
-    miss = data is None
+    if proxy is not None:
+        cache_lookups.labels(prefix=prefix, result="local_hit").inc()
+    elif force_update:
+        cache_lookups.labels(prefix=prefix, result="miss").inc()
+        data, compute_duration = _retrieve(retriever)
+        if single_flight:
+            _store_with_metadata(redis_client, key, data, expire, compute_duration)
+        else:
+            redis_client.set(key, data.encode("utf-8"), ex=expire)
+        redis_client.publish(INVALIDATION_CHANNEL, key)
+    elif single_flight:
+        data, result = _get_with_single_flight(redis_client, key, retriever, expire)
+        cache_lookups.labels(prefix=prefix, result=result).inc()
+    else:
+        data = redis_client.get(key)
+        miss = data is None
+        cache_lookups.labels(prefix=prefix, result="miss" if miss else "redis_hit").inc()
 
-    if miss or force_update:
-        data = retriever()
-        if isinstance(data, pydantic_v1.BaseModel):
-            data = data.json(exclude_none=False, by_alias=True)
-        redis_client.set(key, data.encode("utf-8"), ex=expire)
+        if miss:
+            data, _ = _retrieve(retriever)
+            redis_client.set(key, data.encode("utf-8"), ex=expire)
 
-    assert isinstance(data, str)  # help mypy
+    if proxy is None:
+        assert isinstance(data, str)  # help mypy
+        proxy = _CacheProxy(data=data)
+        if local_ttl:
+            _local_cache.set(key, proxy, local_ttl)
 
     if return_type is str:
-        return data
+        return proxy.json()
 
-    return cast(pydantic_v1.BaseModel, _CacheProxy(data=data))
+    return cast(pydantic_v1.BaseModel, proxy)
 
 
 def cached_view(
@@ -76,6 +318,8 @@ def cached_view(
     expire: int | None = 60 * 60 * 24,  # 24h
     cache_only_if_no_arguments: bool = True,
     ignore_args: bool = False,
+    local_ttl: int | None = None,
+    single_flight: bool = False,
 ) -> Callable:
     """
     Decorator to cache a view. This decorator MUST be set after spectree_serialize
@@ -89,6 +333,10 @@ def cached_view(
         case will be a passthrough. Default to True
     :param: ignore_args: If True, the decorator will not look the args to generate the key, and it will always
         consider the args as the default ones. This argument is dangerous, you should not use it.
+    :param local_ttl: If set, the result is also kept in memory by the current process for this number of seconds.
+        See `get_from_cache`.
+    :param single_flight: If True, only one request at a time computes the view when the cache expires, see
+        `get_from_cache`.
     """
 
     def decorator(function: Callable[[Any], pydantic_v1.BaseModel]) -> Callable:
@@ -110,6 +358,8 @@ def cached_view(
                 expire=expire,
                 return_type=pydantic_v1.BaseModel,
                 force_update=False,
+                local_ttl=local_ttl,
+                single_flight=single_flight,
             )
             return cast(pydantic_v1.BaseModel, result)
 
@@ -1,10 +1,15 @@
+from concurrent import futures
 from dataclasses import dataclass
 from datetime import datetime
 import json
+import multiprocessing
+import os
 import pathlib
 import shutil
 import tempfile
 import threading
+import time
+import typing
 import urllib.parse
 
 import weasyprint
@@ -23,15 +28,24 @@ class PdfMetadata:
 
 
 class CachingUrlFetcher:
-    """A URL fetcher for weasyprint that caches files."""
+    """A URL fetcher for weasyprint that caches files.
 
-    def __init__(self) -> None:
+    If ``cache_dir`` is given, files are cached in this (existing)
+    directory, which may be shared by multiple processes, and which is
+    not deleted by the fetcher.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path | None = None) -> None:
+        self.shared_cache_dir = cache_dir
         self.create_cache()
 
     def __del__(self) -> None:
         self.delete_cache()
 
     def create_cache(self) -> None:
+        if self.shared_cache_dir:
+            self.tmp_dir = self.shared_cache_dir
+            return
         self.tmp_dir_parent = pathlib.Path(tempfile.mkdtemp())
         self.tmp_dir = self.tmp_dir_parent / "weasyprint_cache"
         self.tmp_dir.mkdir()
@@ -44,6 +58,8 @@ class CachingUrlFetcher:
         self.shutil_rmtree = shutil.rmtree
 
     def delete_cache(self) -> None:
+        if self.shared_cache_dir:
+            return
         try:
             self.shutil_rmtree(self.tmp_dir_parent)
         except Exception:  # pylint: disable=broad-except
@@ -65,13 +81,21 @@ class CachingUrlFetcher:
             # File objects cannot be serialized, we serialize their
             # content instead.
             result["string"] = result.pop("file_obj").read()  # type: ignore[attr-defined]
-        with content_path.open("bx") as fp:
-            fp.write(result["string"])  # despite the name, it's bytes
         metadata = {key: value for key, value in result.items() if key != "string"}
-        with metadata_path.open("tx", encoding="utf-8") as fp:
-            fp.write(json.dumps(metadata))
+        # Files are written under a temporary name and then renamed,
+        # so that another process that shares the cache never reads a
+        # partially written file. The content is written last since
+        # its presence tells that the URL has been cached.
+        self._write_atomically(metadata_path, json.dumps(metadata).encode("utf-8"))
+        self._write_atomically(content_path, result["string"])  # despite the name, it's bytes
         return result
 
+    def _write_atomically(self, path: pathlib.Path, content: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, prefix=".tmp")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(content)
+        os.replace(tmp_path, path)
+
 
 def _get_url_fetcher() -> CachingUrlFetcher:
     if not hasattr(url_fetcher_container, "fetcher"):
@@ -90,3 +114,56 @@ def generate_pdf_from_html(html_content: str, metadata: PdfMetadata | None = Non
     document.metadata.title = metadata.title
     document.metadata.description = metadata.description
     return document.write_pdf()
+
+
+class RenderedPdf(typing.NamedTuple):
+    content: bytes
+    elapsed: float  # rendering time, in seconds
+
+
+def _init_renderer_process(cache_dir: pathlib.Path, warmup_html: str | None) -> None:
+    url_fetcher_container.fetcher = CachingUrlFetcher(cache_dir)
+    if warmup_html:
+        # Load fonts and fill the cache of the URL fetcher (stylesheets,
+        # fonts, images) before the first document is submitted.
+        generate_pdf_from_html(warmup_html)
+
+
+def _render_pdf(html_content: str, metadata: PdfMetadata | None) -> RenderedPdf:
+    start = time.perf_counter()
+    content = generate_pdf_from_html(html_content, metadata)
+    return RenderedPdf(content=content, elapsed=time.perf_counter() - start)
+
+
+class PdfRendererPool:
+    """Render PDF documents in a pool of long-lived processes.
+
+    Each process renders many documents and keeps its fonts loaded.
+    All processes share the cache of the URL fetcher. If given,
+    ``warmup_html`` is rendered by each process when it starts.
+
+    Processes are spawned (not forked), so that they do not inherit
+    database connections or locks of the calling process.
+    """
+
+    def __init__(self, max_workers: int, warmup_html: str | None = None):
+        self._cache_dir = pathlib.Path(tempfile.mkdtemp(prefix="weasyprint_cache"))
+        self._executor = futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_renderer_process,
+            initargs=(self._cache_dir, warmup_html),
+        )
+
+    def __enter__(self) -> "PdfRendererPool":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.shutdown()
+
+    def submit(self, html_content: str, metadata: PdfMetadata | None = None) -> "futures.Future[RenderedPdf]":
+        return self._executor.submit(_render_pdf, html_content, metadata)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
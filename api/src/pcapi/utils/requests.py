@@ -12,6 +12,10 @@ Usage:
     response = requests.get("https://example.com")
 """
 
+import collections.abc
+import contextlib
+import contextvars
+import dataclasses
 import logging
 import re
 from typing import Any
@@ -40,6 +44,34 @@ logger = logging.getLogger(__name__)
 REQUEST_TIMEOUT_IN_SECOND = 10
 
 
+@dataclasses.dataclass
+class _TrackedCalls:
+    default_timeout: float | None
+    durations: list[float] = dataclasses.field(default_factory=list)
+
+
+_tracked_calls: contextvars.ContextVar[_TrackedCalls | None] = contextvars.ContextVar(
+    "requests_tracked_calls", default=None
+)
+
+
+@contextlib.contextmanager
+def track_calls(default_timeout: float | None = None) -> collections.abc.Generator[list[float], None, None]:
+    """A context manager that collects the duration (in seconds) of
+    each request that gets a response within the block.
+
+    If ``default_timeout`` is given, it is used instead of
+    `REQUEST_TIMEOUT_IN_SECOND` for requests that do not set their own
+    timeout.
+    """
+    tracked = _TrackedCalls(default_timeout=default_timeout)
+    token = _tracked_calls.set(tracked)
+    try:
+        yield tracked.durations
+    finally:
+        _tracked_calls.reset(token)
+
+
 class ExternalAPIException(Exception):
     is_retryable: bool
 
@@ -62,8 +94,9 @@ def _wrapper(
     request: requests.PreparedRequest,
     **kwargs: Any,
 ) -> requests.Response:
+    tracked = _tracked_calls.get()
     if not kwargs.get("timeout"):
-        kwargs["timeout"] = REQUEST_TIMEOUT_IN_SECOND
+        kwargs["timeout"] = (tracked and tracked.default_timeout) or REQUEST_TIMEOUT_IN_SECOND
     try:
         response = request_send_func(request, **kwargs)
     except Exception as exc:
@@ -77,12 +110,15 @@ def _wrapper(
         )
         raise exc
 
+    duration = response.elapsed.total_seconds()
+    if tracked:
+        tracked.durations.append(duration)
     logger.info(
         "External service called",
         extra={
             "url": _redact_url(response.url),
             "statusCode": response.status_code,
-            "duration": response.elapsed.total_seconds(),
+            "duration": duration,
         },
     )
     return response
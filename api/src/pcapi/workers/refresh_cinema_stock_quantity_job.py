@@ -0,0 +1,19 @@
+import logging
+
+import pcapi.core.offers.api as offers_api
+from pcapi.core.offers import models as offers_models
+import pcapi.core.providers.repository as providers_repository
+from pcapi.workers import worker
+from pcapi.workers.decorators import job
+
+
+logger = logging.getLogger(__name__)
+
+
+@job(worker.default_queue)
+def refresh_cinema_stock_quantity_job(offer_id: int) -> None:
+    offer = offers_models.Offer.query.get(offer_id)
+    # The offer may have changed since the job has been enqueued.
+    if not offer or not offer.isActive or not providers_repository.is_cinema_external_ticket_applicable(offer):
+        return
+    offers_api.update_stock_quantity_to_match_cinema_venue_provider_remaining_places(offer)
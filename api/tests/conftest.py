@@ -35,6 +35,7 @@ from pcapi.notifications.push import testing as push_notifications_testing
 from pcapi.notifications.sms import testing as sms_notifications_testing
 from pcapi.repository.clean_database import clean_all_database
 from pcapi.routes.backoffice import install_routes
+from pcapi.utils import cache as cache_utils
 from pcapi.utils import requests
 from pcapi.utils.module_loading import import_string
 
@@ -153,6 +154,7 @@ def clear_redis(app):
         yield
     finally:
         app.redis_client.flushdb()
+        cache_utils.clear_local_cache()
 
 
 @pytest.fixture()
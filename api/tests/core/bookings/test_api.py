@@ -1961,6 +1961,78 @@ class AutoMarkAsUsedAfterEventTest:
         with pytest.raises(ValueError):
             api.auto_mark_as_used_after_event()
 
+    @override_features(WIP_CHUNKED_AUTO_MARK_AS_USED=True)
+    @patch("pcapi.core.bookings.constants.AUTO_USE_AFTER_EVENT_CHUNK_SIZE", 2)
+    def test_by_chunks_individual_bookings(self):
+        event_date = datetime.utcnow() - timedelta(days=3)
+        bookings = bookings_factories.BookingFactory.create_batch(
+            3, stock__beginningDatetime=event_date, stock__offer__venue__pricing_point="self"
+        )
+        booking_without_pricing_point = bookings_factories.BookingFactory(stock__beginningDatetime=event_date)
+        recent_booking = bookings_factories.BookingFactory(stock__beginningDatetime=datetime.utcnow())
+        cancelled_booking = bookings_factories.CancelledBookingFactory(stock__beginningDatetime=event_date)
+
+        api.auto_mark_as_used_after_event()
+
+        for booking in bookings:
+            assert booking.status is BookingStatus.USED
+            assert booking.validationAuthorType == models.BookingValidationAuthorType.AUTO
+            event = finance_models.FinanceEvent.query.filter_by(booking=booking).one()
+            assert event.motive == finance_models.FinanceEventMotive.BOOKING_USED
+            assert event.status == finance_models.FinanceEventStatus.READY
+            assert event.valueDate == booking.dateUsed != None
+            assert event.venueId == booking.venueId
+            assert event.pricingPointId == booking.venueId
+            assert event.pricingOrderingDate == finance_api.get_pricing_ordering_date(booking)
+        assert booking_without_pricing_point.status is BookingStatus.USED
+        event = finance_models.FinanceEvent.query.filter_by(booking=booking_without_pricing_point).one()
+        assert event.status == finance_models.FinanceEventStatus.PENDING
+        assert event.pricingPointId is None
+        assert event.pricingOrderingDate is None
+        assert recent_booking.status is BookingStatus.CONFIRMED
+        assert cancelled_booking.status is BookingStatus.CANCELLED
+        assert finance_models.FinanceEvent.query.count() == 4
+
+    @override_features(WIP_CHUNKED_AUTO_MARK_AS_USED=True)
+    def test_by_chunks_collective_bookings(self, caplog):
+        event_date = datetime.utcnow() - timedelta(days=3)
+        booking = educational_factories.CollectiveBookingFactory(
+            collectiveStock__beginningDatetime=event_date,
+            collectiveStock__collectiveOffer__venue__pricing_point="self",
+        )
+        cancelled_booking = educational_factories.CollectiveBookingFactory(
+            collectiveStock__beginningDatetime=event_date, status=CollectiveBookingStatus.CANCELLED
+        )
+
+        with caplog.at_level(logging.INFO):
+            api.auto_mark_as_used_after_event()
+
+        assert booking.status is CollectiveBookingStatus.USED
+        assert cancelled_booking.status is CollectiveBookingStatus.CANCELLED
+        event = finance_models.FinanceEvent.query.one()
+        assert event.collectiveBooking == booking
+        assert event.status == finance_models.FinanceEventStatus.READY
+        assert event.pricingOrderingDate == finance_api.get_pricing_ordering_date(booking)
+        log = [record for record in caplog.records if record.message == "BookingUsed"][0]
+        assert log.extra == {
+            "analyticsSource": "adage",
+            "bookingId": booking.id,
+            "stockId": booking.collectiveStockId,
+        }
+
+    @override_features(WIP_CHUNKED_AUTO_MARK_AS_USED=True)
+    @patch("pcapi.core.bookings.constants.AUTO_USE_AFTER_EVENT_CHUNK_SIZE", 2)
+    def test_by_chunks_num_queries(self):
+        event_date = datetime.utcnow() - timedelta(days=3)
+        bookings_factories.BookingFactory.create_batch(3, stock__beginningDatetime=event_date)
+        educational_factories.CollectiveBookingFactory(collectiveStock__beginningDatetime=event_date)
+
+        queries = 1  # select feature flags
+        queries += 3  # individual bookings: 2 chunks and a last empty one
+        queries += 2  # collective bookings: 1 chunk and a last empty one
+        with assert_num_queries(queries):
+            api.auto_mark_as_used_after_event()
+
 
 @pytest.mark.usefixtures("db_session")
 class GetInvidualBookingsFromStockTest:
@@ -2079,6 +2151,45 @@ class ArchiveOldBookingsTest:
         assert old_booking.displayAsEnded
 
 
+@pytest.mark.usefixtures("db_session")
+class OfferBookingCountTest:
+    def test_backfill(self):
+        now = datetime.utcnow()
+        stock = offers_factories.StockFactory()
+        bookings_factories.BookingFactory(stock=stock, dateCreated=now)
+        bookings_factories.BookingFactory(stock=stock, dateCreated=now)
+        bookings_factories.BookingFactory(stock=stock, dateCreated=now - timedelta(days=1))
+        bookings_factories.CancelledBookingFactory(stock=stock, dateCreated=now)
+        bookings_factories.BookingFactory(stock=stock, dateCreated=now - timedelta(days=10))
+        other_offer = offers_factories.OfferFactory()
+        models.OfferBookingCount.query.delete()
+        # Stale counts, that are fixed by the backfill.
+        db.session.add(models.OfferBookingCount(offerId=stock.offerId, day=now.date(), count=12))
+        db.session.add(models.OfferBookingCount(offerId=other_offer.id, day=now.date(), count=3))
+        db.session.commit()
+
+        api.backfill_offer_booking_counts(days=2)
+
+        counts = {(count.offerId, count.day): count.count for count in models.OfferBookingCount.query.all()}
+        assert counts == {
+            (stock.offerId, now.date()): 2,
+            (stock.offerId, (now - timedelta(days=1)).date()): 1,
+            (other_offer.id, now.date()): 0,
+        }
+
+    def test_delete_old_counts(self):
+        today = datetime.utcnow().date()
+        offer = offers_factories.OfferFactory()
+        recent = models.OfferBookingCount(offerId=offer.id, day=today - timedelta(days=45), count=1)
+        old = models.OfferBookingCount(offerId=offer.id, day=today - timedelta(days=46), count=1)
+        db.session.add_all([recent, old])
+        db.session.commit()
+
+        api.delete_old_offer_booking_counts()
+
+        assert models.OfferBookingCount.query.all() == [recent]
+
+
 @pytest.mark.usefixtures("db_session")
 class PopBarcodesFromQueueAndCancelWastedExternalBookingTest:
     def test_should_not_pop_and_not_try_to_cancel_external_booking_if_minimum_age_not_reached(self, app):
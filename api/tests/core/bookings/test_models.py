@@ -12,6 +12,7 @@ from pcapi.core.bookings.models import BookingStatus
 from pcapi.core.categories import subcategories_v2 as subcategories
 from pcapi.core.finance import factories as finance_factories
 from pcapi.core.finance import models as finance_models
+import pcapi.core.offers.factories as offers_factories
 import pcapi.core.users.factories as users_factories
 from pcapi.core.users.factories import BeneficiaryGrant18Factory
 from pcapi.models import db
@@ -59,6 +60,45 @@ def test_save_cancellation_date_postgresql_function():
     assert booking.cancellationDate is None
 
 
+def test_update_offer_booking_count_postgresql_function():
+    stock = offers_factories.StockFactory()
+    booking = factories.BookingFactory(stock=stock)
+    factories.BookingFactory(stock=stock)
+    factories.CancelledBookingFactory(stock=stock)
+
+    def get_count():
+        return db.session.query(models.OfferBookingCount.count).filter_by(offerId=stock.offerId).scalar()
+
+    assert get_count() == 2
+
+    booking.status = BookingStatus.CANCELLED
+    db.session.flush()
+    assert get_count() == 1
+
+    booking.status = BookingStatus.CONFIRMED
+    db.session.flush()
+    assert get_count() == 2
+
+    # Other status changes do not change the count.
+    booking.status = BookingStatus.USED
+    db.session.flush()
+    assert get_count() == 2
+
+    other_stock = offers_factories.StockFactory()
+    booking.stock = other_stock
+    db.session.flush()
+    assert get_count() == 1
+    assert db.session.query(models.OfferBookingCount.count).filter_by(offerId=other_stock.offerId).scalar() == 1
+
+    booking.stock = stock
+    db.session.flush()
+    assert get_count() == 2
+
+    db.session.delete(booking)
+    db.session.flush()
+    assert get_count() == 1
+
+
 def test_booking_completed_url_gets_normalized():
     booking = factories.BookingFactory(
         token="ABCDEF",
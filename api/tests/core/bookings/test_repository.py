@@ -5,6 +5,7 @@ from datetime import time
 from datetime import timedelta
 from io import BytesIO
 from io import StringIO
+from unittest.mock import patch
 
 from dateutil import tz
 import openpyxl
@@ -3210,6 +3211,76 @@ class GetExcelReportTest:
         assert sheet.cell(row=2, column=18).value == "Non"
 
 
+class ExportInChunksTest:
+    def _create_bookings(self):
+        pro = users_factories.ProFactory()
+        offerer = offerers_factories.OffererFactory()
+        offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+        # The timezone of the venue is not the one of Paris.
+        venue = offerers_factories.VenueFactory(managingOfferer=offerer, postalCode="97300")
+        stock = offers_factories.EventStockFactory(offer__venue=venue, beginningDatetime=datetime(2030, 6, 1, 18))
+        bookings_factories.BookingFactory(stock=stock)
+        bookings_factories.UsedBookingFactory(stock=stock, quantity=2)
+        bookings_factories.CancelledBookingFactory(stock=stock)
+        bookings_factories.ReimbursedBookingFactory(stock=stock)
+        return pro, stock
+
+    @pytest.mark.parametrize("validated_only", [False, True])
+    @patch("pcapi.core.bookings.repository.CSV_EXPORT_CHUNK_SIZE", 1)
+    def test_offer_csv_export(self, validated_only):
+        _pro, stock = self._create_bookings()
+        if validated_only:
+            expected = booking_repository.export_validated_bookings_by_offer_id(
+                stock.offerId, date(2030, 6, 1), BookingExportType.CSV
+            )
+        else:
+            expected = booking_repository.export_bookings_by_offer_id(
+                stock.offerId, date(2030, 6, 1), BookingExportType.CSV
+            )
+
+        chunks = list(
+            booking_repository.export_bookings_by_offer_id_in_chunks(
+                stock.offerId, date(2030, 6, 1), BookingExportType.CSV, validated_only=validated_only
+            )
+        )
+
+        assert len(chunks) > 1
+        assert b"".join(chunks) == expected.encode("utf-8-sig")
+
+    def test_offer_excel_export(self):
+        _pro, stock = self._create_bookings()
+        expected = booking_repository.export_bookings_by_offer_id(
+            stock.offerId, date(2030, 6, 1), BookingExportType.EXCEL
+        )
+
+        chunks = list(
+            booking_repository.export_bookings_by_offer_id_in_chunks(
+                stock.offerId, date(2030, 6, 1), BookingExportType.EXCEL
+            )
+        )
+
+        expected_sheet = openpyxl.load_workbook(BytesIO(expected)).active
+        sheet = openpyxl.load_workbook(BytesIO(b"".join(chunks))).active
+        assert list(sheet.values) == list(expected_sheet.values)
+        assert sheet.max_row == 6  # header, 1 + 2 (duo) + 1 + 1 bookings
+
+    @pytest.mark.parametrize("export_type", [BookingExportType.CSV, BookingExportType.EXCEL])
+    def test_report_export(self, export_type):
+        pro, _stock = self._create_bookings()
+        expected = booking_repository.get_export(user=pro, status_filter=None, export_type=export_type)
+
+        chunks = list(booking_repository.get_export_in_chunks(user=pro, status_filter=None, export_type=export_type))
+
+        # Duo bookings are duplicated at the end of the export, by a
+        # UNION that does not guarantee the order of rows.
+        if export_type == BookingExportType.CSV:
+            assert sorted(b"".join(chunks).splitlines()) == sorted(expected.encode("utf-8-sig").splitlines())
+        else:
+            expected_sheet = openpyxl.load_workbook(BytesIO(expected)).active
+            sheet = openpyxl.load_workbook(BytesIO(b"".join(chunks))).active
+            assert sorted(sheet.values, key=str) == sorted(expected_sheet.values, key=str)
+
+
 class FindSoonToBeExpiredBookingsTest:
     def test_should_return_only_soon_to_be_expired_individual_bookings(self, app: fixture):
         # Given
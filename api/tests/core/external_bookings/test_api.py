@@ -1,5 +1,6 @@
 import datetime
 import json
+from unittest.mock import Mock
 from unittest.mock import patch
 
 import pytest
@@ -10,6 +11,8 @@ from pcapi.core.external_bookings.api import _get_external_bookings_client_api
 from pcapi.core.external_bookings.api import book_event_ticket
 from pcapi.core.external_bookings.api import cancel_event_ticket
 from pcapi.core.external_bookings.api import get_active_cinema_venue_provider
+from pcapi.core.external_bookings.api import get_movie_stocks
+from pcapi.core.external_bookings.api import get_shows_stock
 from pcapi.core.external_bookings.cds.client import CineDigitalServiceAPI
 import pcapi.core.external_bookings.exceptions as external_bookings_exceptions
 import pcapi.core.offerers.factories as offerers_factories
@@ -18,6 +21,7 @@ import pcapi.core.offers.models as offers_models
 import pcapi.core.providers.exceptions as providers_exceptions
 import pcapi.core.providers.factories as providers_factories
 from pcapi.core.providers.repository import get_provider_by_local_class
+from pcapi.core.testing import override_features
 import pcapi.core.users.factories as user_factories
 
 
@@ -102,6 +106,74 @@ class GetExternalBookingsClientApiTest:
         assert str(e.value) == "No row was found when one was required"
 
 
+@pytest.mark.usefixtures("db_session")
+class GetCinemaShowtimesStocksTest:
+    def _create_venue_provider(self, local_class):
+        provider = get_provider_by_local_class(local_class)
+        venue_provider = providers_factories.VenueProviderFactory(provider=provider, venueIdAtOfferProvider="test_id")
+        cinema_provider_pivot = providers_factories.CinemaProviderPivotFactory(
+            venue=venue_provider.venue, provider=provider, idAtProvider=venue_provider.venueIdAtOfferProvider
+        )
+        return venue_provider, cinema_provider_pivot
+
+    @override_features(WIP_CINEMA_SHOWTIMES_SNAPSHOT=True)
+    @patch("pcapi.core.external_bookings.boost.client.BoostClientAPI.get_showtimes")
+    def test_get_movie_stocks_from_cinema_snapshot(self, mocked_get_showtimes):
+        venue_provider, _ = self._create_venue_provider("BoostStocks")
+        mocked_get_showtimes.return_value = [
+            Mock(id=1, numberSeatsRemaining=10, film=Mock(id=207)),
+            Mock(id=2, numberSeatsRemaining=0, film=Mock(id=207)),
+            Mock(id=3, numberSeatsRemaining=5, film=Mock(id=208)),
+        ]
+
+        assert get_movie_stocks(venue_provider.venueId, "207") == {"1": 10, "2": 0}
+        assert get_movie_stocks(venue_provider.venueId, "208") == {"3": 5}
+        assert get_movie_stocks(venue_provider.venueId, "209") == {}
+
+        # All films of the cinema are fetched at once, without filter.
+        mocked_get_showtimes.assert_called_once_with()
+
+    @override_features(WIP_CINEMA_SHOWTIMES_SNAPSHOT=True)
+    @patch("pcapi.core.external_bookings.cds.client.CineDigitalServiceAPI.get_internet_sale_gauge_active")
+    @patch("pcapi.core.external_bookings.cds.client.get_resource")
+    def test_get_shows_stock_from_cinema_snapshot(self, mocked_get_resource, mocked_internet_sale_gauge_active):
+        venue_provider, cinema_provider_pivot = self._create_venue_provider("CDSStocks")
+        providers_factories.CDSCinemaDetailsFactory(cinemaProviderPivot=cinema_provider_pivot)
+        mocked_internet_sale_gauge_active.return_value = True
+        mocked_get_resource.return_value = [
+            {
+                "id": show_id,
+                "remaining_place": 88,
+                "internet_remaining_place": internet_remaining_place,
+                "disableseatmap": False,
+                "showtime": datetime.datetime(2022, 3, 28),
+                "canceled": False,
+                "deleted": False,
+                "seatmap": "[[1,1,1,0]]",
+                "showsTariffPostypeCollection": [{"tariffid": {"id": 2}}],
+                "screenid": {"id": 10},
+                "mediaid": {"id": media_id},
+                "showsMediaoptionsCollection": [{"mediaoptionsid": {"id": 12}}],
+            }
+            for show_id, media_id, internet_remaining_place in ((1, 52, 10), (2, 52, 30), (3, 53, 100))
+        ]
+
+        assert get_shows_stock(venue_provider.venueId, [2, 3]) == {"2": 30, "3": 100}
+        assert get_shows_stock(venue_provider.venueId, [1]) == {"1": 10}
+
+        mocked_get_resource.assert_called_once()
+
+    @override_features(WIP_CINEMA_SHOWTIMES_SNAPSHOT=True)
+    @patch("pcapi.core.external_bookings.ems.client.EMSClientAPI.get_film_showtimes_stocks")
+    def test_get_movie_stocks_without_cinema_snapshot(self, mocked_get_film_showtimes_stocks):
+        venue_provider, _ = self._create_venue_provider("EMSStocks")
+        mocked_get_film_showtimes_stocks.return_value = {"1": 1}
+
+        assert get_movie_stocks(venue_provider.venueId, "207") == {"1": 1}
+
+        mocked_get_film_showtimes_stocks.assert_called_once_with("207")
+
+
 @pytest.mark.usefixtures("db_session")
 class BookEventTicketTest:
 
@@ -0,0 +1,154 @@
+import logging
+
+import pytest
+
+from pcapi.core.external_bookings import circuit_breaker
+from pcapi.core.external_bookings.boost.exceptions import BoostAPIException
+import pcapi.core.external_bookings.exceptions as external_bookings_exceptions
+from pcapi.core.testing import override_features
+from pcapi.core.testing import override_settings
+from pcapi.utils import requests
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def _call(error=None):
+    with circuit_breaker.protect("BoostClientAPI", "cinema1", "book_ticket"):
+        if error:
+            raise error
+
+
+def _fail():
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        _call(requests.exceptions.ReadTimeout())
+
+
+class ComputeTimeoutTest:
+    def test_too_few_latencies(self):
+        assert circuit_breaker.compute_timeout([1.0] * (circuit_breaker.MIN_LATENCY_SAMPLES - 1)) is None
+
+    @override_settings(EXTERNAL_BOOKINGS_MIN_TIMEOUT=2, EXTERNAL_BOOKINGS_MAX_TIMEOUT=10)
+    def test_percentile_of_latencies(self):
+        latencies = [1.0] * 95 + [20.0] * 5
+        assert circuit_breaker.compute_timeout(latencies) == 3.0
+        assert circuit_breaker.compute_timeout([0.1] * 100) == 2
+        assert circuit_breaker.compute_timeout([5.0] * 100) == 10
+
+
+class IsProviderFailureTest:
+    def test_network_errors(self):
+        assert circuit_breaker.is_provider_failure(requests.exceptions.ConnectTimeout())
+        assert circuit_breaker.is_provider_failure(requests.exceptions.ConnectionError())
+
+    def test_wrapped_network_error(self):
+        try:
+            try:
+                raise requests.exceptions.ReadTimeout()
+            except requests.exceptions.RequestException as exc:
+                raise BoostAPIException("Network error on Boost API") from exc
+        except BoostAPIException as exc:
+            assert circuit_breaker.is_provider_failure(exc)
+
+    def test_other_errors(self):
+        assert not circuit_breaker.is_provider_failure(BoostAPIException("Unexpected 400 response"))
+        assert not circuit_breaker.is_provider_failure(external_bookings_exceptions.ExternalBookingSoldOutError())
+
+
+@override_settings(EXTERNAL_BOOKINGS_CIRCUIT_BREAKER_FAILURE_THRESHOLD=3)
+class ProtectTest:
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    def test_open_after_failures(self):
+        _fail()
+        _fail()
+        _call()  # successes do not reset the count of failures
+        _fail()
+
+        with pytest.raises(external_bookings_exceptions.ExternalBookingUnavailableError):
+            _call()
+
+        # Other cinemas and providers are not affected.
+        with circuit_breaker.protect("BoostClientAPI", "cinema2", "book_ticket"):
+            pass
+        with circuit_breaker.protect("CGRClientAPI", "cinema1", "book_ticket"):
+            pass
+
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    def test_other_errors_do_not_open(self):
+        for _ in range(5):
+            with pytest.raises(BoostAPIException):
+                _call(BoostAPIException("Unexpected 400 response"))
+
+        _call()
+
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    def test_half_open_probe_succeeds(self, app):
+        for _ in range(3):
+            _fail()
+        app.redis_client.delete(circuit_breaker._key("BoostClientAPI", "cinema1", "open"))  # open duration has elapsed
+
+        with circuit_breaker.protect("BoostClientAPI", "cinema1", "book_ticket"):
+            # Other calls fail at once while the probe is running.
+            with pytest.raises(external_bookings_exceptions.ExternalBookingUnavailableError):
+                _call()
+
+        _call()
+        _call()
+
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    def test_half_open_probe_fails(self, app):
+        for _ in range(3):
+            _fail()
+        app.redis_client.delete(circuit_breaker._key("BoostClientAPI", "cinema1", "open"))
+
+        _fail()
+
+        with pytest.raises(external_bookings_exceptions.ExternalBookingUnavailableError):
+            _call()
+
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    @override_settings(EXTERNAL_BOOKINGS_MIN_TIMEOUT=0.5)
+    def test_adaptive_timeout(self, app, requests_mock, caplog):
+        requests_mock.get("https://example.com")
+        app.redis_client.lpush(
+            circuit_breaker._latencies_key("BoostClientAPI", "get_shows_remaining_places"),
+            *[0.25] * circuit_breaker.MIN_LATENCY_SAMPLES,
+        )
+
+        with caplog.at_level(logging.INFO):
+            with circuit_breaker.protect("BoostClientAPI", "cinema1", "get_shows_remaining_places"):
+                requests.get("https://example.com")
+
+        assert requests_mock.last_request.timeout == 0.75
+        record = [record for record in caplog.records if record.message == "External bookings call"][0]
+        assert record.provider == "BoostClientAPI"
+        assert record.cinema_id == "cinema1"
+        assert record.endpoint == "get_shows_remaining_places"
+        assert record.breaker_state == "closed"
+        assert record.requests == 1
+        assert record.error is None
+        latencies_key = circuit_breaker._latencies_key("BoostClientAPI", "get_shows_remaining_places")
+        assert app.redis_client.llen(latencies_key) == circuit_breaker.MIN_LATENCY_SAMPLES + 1
+
+    @override_features(WIP_EXTERNAL_BOOKINGS_CIRCUIT_BREAKER=True)
+    @override_settings(EXTERNAL_BOOKINGS_MIN_TIMEOUT=0.5)
+    @pytest.mark.parametrize("endpoint", circuit_breaker.NON_IDEMPOTENT_ENDPOINTS)
+    def test_no_adaptive_timeout_for_non_idempotent_endpoints(self, app, requests_mock, endpoint):
+        requests_mock.get("https://example.com")
+        app.redis_client.lpush(
+            circuit_breaker._latencies_key("BoostClientAPI", endpoint),
+            *[0.25] * circuit_breaker.MIN_LATENCY_SAMPLES,
+        )
+
+        with circuit_breaker.protect("BoostClientAPI", "cinema1", endpoint):
+            requests.get("https://example.com")
+
+        assert requests_mock.last_request.timeout == requests.REQUEST_TIMEOUT_IN_SECOND
+
+
+def test_disabled(app):
+    for _ in range(10):
+        _fail()
+
+    _call()
+    assert not app.redis_client.keys("api:external_bookings:*")
@@ -39,6 +39,7 @@ from pcapi.core.testing import override_features
 from pcapi.core.testing import override_settings
 import pcapi.core.users.factories as users_factories
 import pcapi.core.users.models as users_models
+from pcapi.domain import reimbursement
 from pcapi.models import db
 import pcapi.notifications.push.testing as push_testing
 from pcapi.utils import human_ids
@@ -228,6 +229,18 @@ class PriceEventTest:
         assert pricing2.lines[1].category == models.PricingLineCategory.OFFERER_CONTRIBUTION
         assert pricing2.lines[1].amount == 5 * 100
 
+    @override_features(WIP_USE_PRICING_POINT_REVENUE=True)
+    def test_pricing_individual_with_maintained_revenue(self):
+        user = users_factories.RichBeneficiaryFactory()
+        event1 = self._make_individual_event(price=19_999, user=user)
+        pricing1 = api.price_event(event1)
+        assert pricing1.revenue == 19_999 * 100
+
+        event2 = self._make_individual_event(price=100, user=user, venue=event1.booking.venue)
+        pricing2 = api.price_event(event2)
+        assert pricing2.amount == -(95 * 100)
+        assert pricing2.revenue == pricing1.revenue + (100 * 100)
+
     def test_pricing_collective(self):
         event1 = self._make_collective_event(price=19_999)
         booking1 = event1.collectiveBooking
@@ -857,6 +870,74 @@ class PriceEventTest:
         assert line2.category == models.PricingLineCategory.OFFERER_REVENUE
 
 
+class PriceEventsOfPricingPointTest:
+    def _make_individual_event(self, price, venue=None, used_date=None):
+        stock_kwargs = {"price": price}
+        if venue:
+            stock_kwargs["offer__venue"] = venue
+        booking = bookings_factories.BookingFactory(
+            user=users_factories.RichBeneficiaryFactory(),
+            stock=individual_stock_factory(**stock_kwargs),
+        )
+        with time_machine.travel(used_date or datetime.datetime.utcnow()):
+            bookings_api.mark_as_used(booking, bookings_models.BookingValidationAuthorType.AUTO)
+        return models.FinanceEvent.query.filter_by(booking=booking).one()
+
+    def test_same_result_as_price_event(self):
+        event1 = self._make_individual_event(price=19_999)
+        venue = event1.booking.venue
+        event2 = self._make_individual_event(price=100, venue=venue)
+        collective_booking = educational_factories.UsedCollectiveBookingFactory(
+            dateUsed=datetime.datetime.utcnow(),
+            collectiveStock__collectiveOffer__venue=venue,
+        )
+        api.add_event(models.FinanceEventMotive.BOOKING_USED, booking=collective_booking)
+        event3 = models.FinanceEvent.query.filter_by(collectiveBooking=collective_booking).one()
+        event4 = self._make_individual_event(price=100, venue=venue)
+
+        pricings = api.price_events_of_pricing_point([event1, event2, event3, event4])
+
+        assert [pricing.event for pricing in pricings] == [event1, event2, event3, event4]
+        assert [pricing.revenue for pricing in pricings] == [1_999_900, 2_009_900, 2_009_900, 2_019_900]
+        standard_rules = [pricing.standardRule for pricing in pricings]
+        assert standard_rules == [
+            "Remboursement total pour les offres physiques",
+            "Remboursement à 95% entre 20 000 € et 40 000 € par lieu (>= 2021-09-01)",
+            "Remboursement total pour les offres éducationnelles",
+            "Remboursement à 95% entre 20 000 € et 40 000 € par lieu (>= 2021-09-01)",
+        ]
+        assert pricings[3].amount == -(95 * 100)
+        assert {event.status for event in (event1, event2, event3, event4)} == {models.FinanceEventStatus.PRICED}
+        assert models.Pricing.query.count() == 4
+        assert models.PricingLine.query.count() == 8
+
+    def test_ignore_already_priced_event(self):
+        event1 = self._make_individual_event(price=10)
+        event2 = self._make_individual_event(price=10, venue=event1.booking.venue)
+        pricing1 = api.price_event(event1)
+
+        pricings = api.price_events_of_pricing_point([event1, event2])
+
+        assert [pricing.event for pricing in pricings] == [event2]
+        assert models.Pricing.query.filter_by(event=event1).one() == pricing1
+        assert pricings[0].revenue == 2000
+
+    def test_delete_dependent_pricings(self):
+        now = datetime.datetime.utcnow()
+        event1 = self._make_individual_event(price=10, used_date=now - datetime.timedelta(hours=2))
+        later_event = self._make_individual_event(price=10, venue=event1.booking.venue, used_date=now)
+        api.price_event(later_event)
+        event2 = self._make_individual_event(
+            price=10, venue=event1.booking.venue, used_date=now - datetime.timedelta(hours=1)
+        )
+
+        pricings = api.price_events_of_pricing_point([event1, event2])
+
+        assert [pricing.revenue for pricing in pricings] == [1000, 2000]
+        assert later_event.status == models.FinanceEventStatus.READY
+        assert models.Pricing.query.filter_by(event=later_event).count() == 0
+
+
 class PriceEventsTest:
     few_minutes_ago = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
 
@@ -877,7 +958,84 @@ class PriceEventsTest:
         assert event1.status == models.FinanceEventStatus.PRICED
         assert event2.status == models.FinanceEventStatus.PRICED
 
-    @mock.patch("pcapi.core.finance.api.price_event", lambda booking: None)
+    def test_custom_rules_are_loaded_once(self):
+        event1 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        event2 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        rule = factories.CustomReimbursementRuleFactory(offer=event1.booking.stock.offer, amount=100)
+
+        with mock.patch("pcapi.domain.reimbursement.CustomRuleFinder", wraps=reimbursement.CustomRuleFinder) as finder:
+            api.price_events(min_date=self.few_minutes_ago)
+
+        finder.assert_called_once()
+        assert event1.pricings[0].customRule == rule
+        assert event2.pricings[0].customRule is None
+
+    def test_partition(self):
+        event1 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        event2 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        window = (self.few_minutes_ago, datetime.datetime.utcnow())
+        count = max(event1.pricingPointId, event2.pricingPointId) + 1
+
+        api._price_events(window, batch_size=10, partition=(event1.pricingPointId, count))
+
+        assert event1.status == models.FinanceEventStatus.PRICED
+        assert event2.status == models.FinanceEventStatus.READY
+
+    @override_features(WIP_BATCHED_PRICING=True)
+    def test_batched_pricing(self):
+        event1 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        event2 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue=event1.booking.venue,
+        )
+
+        with mock.patch("pcapi.core.finance.api.price_event") as mocked_price_event:
+            api.price_events(min_date=self.few_minutes_ago)
+
+        mocked_price_event.assert_not_called()
+        assert event1.status == models.FinanceEventStatus.PRICED
+        assert event2.status == models.FinanceEventStatus.PRICED
+
+    @override_features(WIP_BATCHED_PRICING=True)
+    @mock.patch("pcapi.core.finance.api.price_events_of_pricing_point", side_effect=ValueError())
+    def test_batched_pricing_falls_back_to_pricing_one_by_one(self, _mocked):
+        event1 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue__pricing_point="self",
+        )
+        event2 = factories.UsedBookingFinanceEventFactory(
+            booking__dateUsed=self.few_minutes_ago,
+            booking__stock__offer__venue=event1.booking.venue,
+        )
+
+        api.price_events(min_date=self.few_minutes_ago)
+
+        assert event1.status == models.FinanceEventStatus.PRICED
+        assert event2.status == models.FinanceEventStatus.PRICED
+
+    @mock.patch("pcapi.core.finance.api._price_events")
+    def test_multiple_workers(self, mocked_price_events):
+        api.price_events(min_date=self.few_minutes_ago, batch_size=10, workers=3)
+
+        partitions = sorted(call.args[2] for call in mocked_price_events.call_args_list)
+        assert partitions == [(0, 3), (1, 3), (2, 3)]
+
+    @mock.patch("pcapi.core.finance.api.price_event", lambda event, rule_finder: None)
     def test_num_queries(self):
         factories.UsedBookingFinanceEventFactory(
             booking__dateUsed=self.few_minutes_ago,
@@ -891,6 +1049,7 @@ class PriceEventsTest:
         n_queries = 0
         n_queries += 1  # count of events to price
         n_queries += 1  # select events
+        n_queries += 1  # select all CustomReimbursementRule
         with assert_num_queries(n_queries):
             api.price_events(min_date=self.few_minutes_ago)
 
@@ -1443,6 +1602,63 @@ class GetRevenuePeriodTest:
         assert period == (start, end)
 
 
+class PricingPointRevenueTest:
+    def _get_stored_revenue(self, pricing_point, year):
+        revenue = models.PricingPointRevenue.query.filter_by(pricingPointId=pricing_point.id, year=year).one_or_none()
+        return revenue.revenue if revenue else 0
+
+    def test_revenue_is_maintained(self):
+        year = datetime.datetime.utcnow().year
+        pricing_point = offerers_factories.VenueFactory(pricing_point="self")
+        pricing1 = factories.PricingFactory(
+            booking__amount=10, booking__quantity=2, booking__stock__offer__venue=pricing_point
+        )
+        pricing2 = factories.PricingFactory(booking__amount=5, booking__stock__offer__venue=pricing_point)
+        factories.CollectivePricingFactory(pricingPoint=pricing_point)  # not included in revenue
+        assert self._get_stored_revenue(pricing_point, year) == 2500
+
+        pricing1.booking.amount = 12
+        db.session.flush()
+        assert self._get_stored_revenue(pricing_point, year) == 2900
+
+        pricing2.status = models.PricingStatus.PROCESSED
+        db.session.flush()
+        assert self._get_stored_revenue(pricing_point, year) == 2900
+
+        pricing2.status = models.PricingStatus.CANCELLED
+        db.session.flush()
+        assert self._get_stored_revenue(pricing_point, year) == 2400
+
+        models.PricingLine.query.delete()
+        models.Pricing.query.filter_by(id=pricing1.id).delete()
+        assert self._get_stored_revenue(pricing_point, year) == 0
+
+    def test_revenue_by_accounting_year(self):
+        pricing_point = offerers_factories.VenueFactory(pricing_point="self")
+        # 2022 in CET.
+        factories.PricingFactory(
+            booking__amount=10,
+            booking__stock__offer__venue=pricing_point,
+            valueDate=datetime.datetime(2021, 12, 31, 23, 30),
+        )
+        assert self._get_stored_revenue(pricing_point, 2021) == 0
+        assert self._get_stored_revenue(pricing_point, 2022) == 1000
+
+    def test_check_pricing_point_revenues(self):
+        year = datetime.datetime.utcnow().year
+        pricing = factories.PricingFactory(booking__amount=10, booking__stock__offer__venue__pricing_point="self")
+        other_pricing = factories.PricingFactory(booking__amount=10, booking__stock__offer__venue__pricing_point="self")
+        assert api.check_pricing_point_revenues() == {}
+
+        models.PricingPointRevenue.query.filter_by(pricingPointId=pricing.pricingPointId).update({"revenue": 123})
+        assert api.check_pricing_point_revenues(year) == {pricing.pricingPointId: (123, 1000)}
+
+        api.check_pricing_point_revenues(year, fix=True)
+        assert api.check_pricing_point_revenues(year) == {}
+        assert self._get_stored_revenue(pricing.pricingPoint, year) == 1000
+        assert self._get_stored_revenue(other_pricing.pricingPoint, year) == 1000
+
+
 def test_get_next_cashflow_batch_label():
     label = api._get_next_cashflow_batch_label()
     assert label == "VIR1"
@@ -1747,6 +1963,136 @@ class GenerateCashflowsTest:
 
         assert models.Cashflow.query.count() == 2
 
+    @override_features(WIP_SET_BASED_CASHFLOW_GENERATION=True)
+    @mock.patch("pcapi.core.finance.api.CASHFLOW_GENERATION_CHUNK_SIZE", 2)
+    def test_set_based_generation(self):
+        now = datetime.datetime.utcnow()
+        venue1 = offerers_factories.VenueBankAccountLinkFactory().venue
+        venue2 = offerers_factories.VenueBankAccountLinkFactory().venue
+        venue_positive_total = offerers_factories.VenueBankAccountLinkFactory().venue
+        pricing11 = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__offer__venue=venue1,
+            amount=-1000,
+        )
+        collective_pricing12 = factories.CollectivePricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            collectiveBooking__collectiveStock__collectiveOffer__venue=venue1,
+            collectiveBooking__collectiveStock__beginningDatetime=now - datetime.timedelta(days=1),
+            amount=-500,
+        )
+        pricing_future_event = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__beginningDatetime=now + datetime.timedelta(days=1),
+            booking__stock__offer__venue=venue1,
+        )
+        pricing2 = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__offer__venue=venue2,
+            amount=-3000,
+        )
+        pricing_positive_total = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__offer__venue=venue_positive_total,
+            amount=1000,
+        )
+        # A venue whose booking amount changed after it has been priced.
+        venue_integrity_error = offerers_factories.VenueFactory(pricing_point="self")
+        offerers_factories.VenueBankAccountLinkFactory(venue=venue_integrity_error)
+        finance_event = factories.UsedBookingFinanceEventFactory(booking__stock__offer__venue=venue_integrity_error)
+        pricing_integrity_error = api.price_event(finance_event)
+        finance_event.booking.amount -= 1
+        db.session.flush()
+
+        api.generate_cashflows(cutoff=datetime.datetime.utcnow())
+
+        assert models.Cashflow.query.count() == 2
+        assert pricing11.cashflows == collective_pricing12.cashflows
+        assert pricing11.cashflows[0].amount == -1500
+        assert pricing11.cashflows[0].bankAccount == venue1.current_bank_account_link.bankAccount
+        assert pricing11.cashflows[0].status == models.CashflowStatus.PENDING
+        assert pricing2.cashflows[0].amount == -3000
+        for pricing in (pricing11, collective_pricing12, pricing2):
+            assert pricing.status == models.PricingStatus.PROCESSED
+            assert len(pricing.logs) == 1
+            assert pricing.logs[0].statusBefore == models.PricingStatus.VALIDATED
+            assert pricing.logs[0].statusAfter == models.PricingStatus.PROCESSED
+            assert pricing.logs[0].reason == models.PricingLogReason.GENERATE_CASHFLOW
+        # Processed one by one, and postponed since there is no
+        # previous cashflow.
+        assert not pricing_positive_total.cashflows
+        assert pricing_positive_total.status == models.PricingStatus.VALIDATED
+        assert not pricing_integrity_error.cashflows
+        assert pricing_integrity_error.status == models.PricingStatus.VALIDATED
+        assert not pricing_future_event.cashflows
+        assert not pricing_future_event.logs
+
+    @override_features(WIP_SET_BASED_CASHFLOW_GENERATION=True)
+    def test_set_based_generation_can_be_resumed(self):
+        venue1 = offerers_factories.VenueBankAccountLinkFactory().venue
+        venue2 = offerers_factories.VenueBankAccountLinkFactory().venue
+        pricing1 = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__offer__venue=venue1,
+            amount=-1000,
+        )
+        cutoff = datetime.datetime.utcnow()
+        batch = factories.CashflowBatchFactory(cutoff=cutoff)
+        api._generate_cashflows(batch)
+        assert len(pricing1.cashflows) == 1
+
+        # The generation stopped before a pricing of another bank
+        # account could be processed: it is resumed on the same batch.
+        pricing2 = factories.PricingFactory(
+            status=models.PricingStatus.VALIDATED,
+            booking__stock__offer__venue=venue2,
+            valueDate=cutoff - datetime.timedelta(seconds=1),
+            amount=-2000,
+        )
+        api._generate_cashflows(batch)
+
+        assert models.Cashflow.query.count() == 2
+        assert len(pricing1.cashflows) == 1
+        assert pricing2.cashflows[0].batch == batch
+        assert pricing2.cashflows[0].amount == -2000
+
+    @override_features(WIP_SET_BASED_CASHFLOW_GENERATION=True)
+    def test_set_based_generation_num_queries(self):
+        for _ in range(2):
+            venue = offerers_factories.VenueBankAccountLinkFactory().venue
+            factories.PricingFactory(
+                status=models.PricingStatus.VALIDATED,
+                booking__stock__offer__venue=venue,
+            )
+            factories.PricingFactory(
+                status=models.PricingStatus.VALIDATED,
+                booking__stock__offer__venue=venue,
+            )
+
+        cutoff = datetime.datetime.utcnow()
+
+        n_queries = 0
+        n_queries += 1  # compute next CashflowBatch.label
+        n_queries += 1  # insert CashflowBatch
+        n_queries += 1  # select CashflowBatch again after commit
+        n_queries += 1  # select feature flags
+        n_queries += 1  # select bank account ids to process
+        n_queries += sum(  # 1 chunk
+            (
+                1,  # create staging table
+                1,  # empty staging table
+                1,  # insert pricings into staging table
+                1,  # check integrity of pricings
+                1,  # select bank accounts with a positive total
+                1,  # insert Cashflow's and CashflowPricing's, update Pricing.status and insert PricingLog's
+            )
+        )
+
+        with assert_num_queries(n_queries):
+            api.generate_cashflows(cutoff)
+
+        assert models.Cashflow.query.count() == 2
+
 
 @clean_temporary_files
 @time_machine.travel(datetime.datetime(2023, 2, 1, 12, 34, 56))
@@ -2150,6 +2496,26 @@ def test_generate_payments_file():
     } in rows
 
 
+@clean_temporary_files
+@override_settings(FINANCE_CSV_COMPRESSION_LEVEL=1)
+def test_write_compressed_csv():
+    def rows():
+        for i in range(10_000):
+            yield (i, f"row {i}")
+
+    path = api._write_csv("example", ("id", "label"), rows=rows(), compress=True)
+
+    assert path.suffix == ".zip"
+    with zipfile.ZipFile(path) as zfile:
+        (info,) = zfile.infolist()
+        assert info.filename == path.stem
+        assert info.compress_type == zipfile.ZIP_DEFLATED
+        with zfile.open(info) as csv_bytefile:
+            reader = csv.reader(io.TextIOWrapper(csv_bytefile), quoting=csv.QUOTE_NONNUMERIC)
+            assert next(reader) == ["id", "label"]
+            assert list(reader) == [[i, f"row {i}"] for i in range(10_000)]
+
+
 @clean_temporary_files
 def test_generate_invoice_file():
     first_siret = "12345678900"
@@ -2503,6 +2869,59 @@ class GenerateInvoicesTest:
         pricing = cashflow.pricings[0]
         assert pricing.booking == booking
 
+    # Renderers run in other processes, where HTTP requests cannot be
+    # mocked: use an HTML document without any external resource.
+    @mock.patch("pcapi.core.finance.api._generate_invoice_html", return_value="<p>Trust me, I am an invoice.</p>")
+    @mock.patch("pcapi.core.finance.api._upload_invoice_pdf")
+    @clean_temporary_files
+    def test_renderer_pool(self, mocked_upload_invoice_pdf, _mocked_generate_invoice_html):
+        for _ in range(3):
+            finance_event = factories.UsedBookingFinanceEventFactory(booking__stock=individual_stock_factory())
+            offerers_factories.VenueBankAccountLinkFactory(venue=finance_event.booking.venue)
+            api.price_event(finance_event)
+        batch = api.generate_cashflows_and_payment_files(datetime.datetime.utcnow())
+
+        api.generate_invoices(batch, workers=2)
+
+        invoices = models.Invoice.query.all()
+        assert len(invoices) == 3
+        assert mocked_upload_invoice_pdf.call_count == 3
+        uploaded = {
+            call.kwargs["invoice_storage_id"]: call.kwargs["invoice_pdf"]
+            for call in mocked_upload_invoice_pdf.call_args_list
+        }
+        assert uploaded.keys() == {invoice.storage_object_id for invoice in invoices}
+        assert all(pdf_content.startswith(b"%PDF") for pdf_content in uploaded.values())
+
+    @mock.patch("pcapi.core.finance.api._generate_invoice_html")
+    @mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+    @clean_temporary_files
+    @override_features(WIP_USE_STORED_REIMBURSEMENT_DETAILS=True)
+    def test_store_reimbursement_details(self, _mocked1, _mocked2):
+        finance_event = factories.UsedBookingFinanceEventFactory(booking__stock=individual_stock_factory())
+        booking = finance_event.booking
+        offerers_factories.VenueBankAccountLinkFactory(venue=booking.venue)
+        api.price_event(finance_event)
+        batch = api.generate_cashflows_and_payment_files(datetime.datetime.utcnow())
+
+        api.generate_invoices(batch)
+
+        invoice = models.Invoice.query.one()
+        details = models.InvoiceReimbursementDetails.query.one()
+        assert details.invoiceId == invoice.id
+        assert details.cashflowBatchId == batch.id
+        assert len(details.rows) == 1
+        row = details.rows[0]
+        assert row[1] == str(invoice.date.date())
+        assert row[2] == invoice.reference
+        assert row[3] == batch.label
+        assert row[15] == booking.token
+        assert row[16] == str(booking.dateUsed.replace(microsecond=0))
+
+        # Already stored details are not stored again.
+        with assert_num_queries(1):
+            api.store_reimbursement_details(batch)
+
 
 class GenerateInvoiceTest:
     EXPECTED_NUM_QUERIES = (
@@ -3314,6 +3733,23 @@ class StoreInvoicePdfTest:
         assert (self.INVOICES_DIR / f"{invoice.storage_object_id}").exists()
         assert (self.INVOICES_DIR / f"{invoice.storage_object_id}.type").exists()
 
+    @mock.patch("pcapi.core.mails.transactional.send_invoice_available_to_pro_email")
+    @mock.patch("pcapi.core.finance.api._generate_invoice_html", return_value="<p>Trust me, I am an invoice.<p>")
+    @override_settings(OBJECT_STORAGE_URL=STORAGE_DIR)
+    def test_store_missing_invoice_pdfs(self, _mocked_generate_html, mocked_send_email, clear_tests_invoices_bucket):
+        batch = factories.CashflowBatchFactory()
+        stored_invoice = factories.InvoiceFactory(cashflows=[factories.CashflowFactory(batch=batch)])
+        missing_invoice = factories.InvoiceFactory(cashflows=[factories.CashflowFactory(batch=batch)])
+        factories.InvoiceFactory(cashflows=[factories.CashflowFactory()])  # in another batch
+        api._store_invoice_pdf(stored_invoice.storage_object_id, "<p>Already stored.<p>")
+
+        assert api.store_missing_invoice_pdfs(batch) == [missing_invoice.id]
+        assert (self.INVOICES_DIR / f"{missing_invoice.storage_object_id}").exists()
+        mocked_send_email.assert_called_once_with(missing_invoice, batch)
+
+        # PDF invoices are not stored twice.
+        assert api.store_missing_invoice_pdfs(batch) == []
+
 
 def test_merge_cashflow_batches():
     venue = offerers_factories.VenueFactory()
@@ -4170,6 +4606,45 @@ class UserRecreditTest:
             "user_id": user.id,
         }
 
+    def test_dry_run(self):
+        with time_machine.travel("2020-05-01"):
+            user = users_factories.UnderageBeneficiaryFactory(subscription_age=15)
+
+        n_push_requests = len(push_testing.requests)
+
+        with time_machine.travel("2021-05-01"):
+            recredit_counts = api.recredit_underage_users(dry_run=True)
+
+        assert recredit_counts == {models.RecreditType.RECREDIT_16: 1}
+        assert user.deposit.amount == 20
+        assert user.deposit.recredits == []
+        assert user.recreditAmountToShow is None
+        assert len(push_testing.requests) == n_push_requests
+
+    def test_already_recredited_users_are_not_loaded(self):
+        with time_machine.travel("2020-05-01"):
+            users_factories.UnderageBeneficiaryFactory(subscription_age=15)
+        with time_machine.travel("2021-05-01"):
+            api.recredit_underage_users()
+
+            assert api._get_underage_users_to_recredit_ids() == []
+
+    @pytest.mark.parametrize(
+        "now,age,expected",
+        [
+            (datetime.datetime(2021, 5, 1, 12), 16, datetime.date(2005, 5, 1)),
+            (datetime.datetime(2024, 2, 29, 12), 16, datetime.date(2008, 2, 29)),
+            (datetime.datetime(2024, 2, 28, 12), 16, datetime.date(2008, 2, 28)),
+            (datetime.datetime(2025, 2, 28, 12), 17, datetime.date(2008, 2, 29)),
+        ],
+    )
+    def test_get_latest_birth_date_for_age(self, now, age, expected):
+        latest_birth_date = api._get_latest_birth_date_for_age(age, now)
+
+        assert latest_birth_date == expected
+        assert relativedelta(now, latest_birth_date).years == age
+        assert relativedelta(now, latest_birth_date + datetime.timedelta(days=1)).years == age - 1
+
 
 class ValidateFinanceIncidentTest:
     def test_educational_institution_is_recredited(self):
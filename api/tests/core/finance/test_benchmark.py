@@ -0,0 +1,56 @@
+from unittest import mock
+
+import pytest
+
+from pcapi.core.finance import benchmark
+from pcapi.core.finance import models
+from pcapi.core.testing import clean_temporary_files
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+@mock.patch("pcapi.core.finance.api._generate_invoice_html")
+@mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+@clean_temporary_files
+def test_run(_mocked1, _mocked2):
+    stages = benchmark.run(offerers=2, bookings_per_offerer=3)
+
+    assert [(stage.stage, stage.rows) for stage in stages] == [
+        ("price_events", 6),
+        ("generate_cashflows", 2),
+        ("generate_payment_files", 2),
+        ("generate_invoices", 2),
+    ]
+    assert all(stage.queries > 0 for stage in stages)
+    assert models.Invoice.query.count() == 2
+
+
+@mock.patch("pcapi.core.finance.api._generate_invoice_html")
+@mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+@clean_temporary_files
+def test_run_with_custom_rules(_mocked1, _mocked2):
+    stages = benchmark.run(offerers=2, bookings_per_offerer=3, custom_rules=5)
+
+    assert models.CustomReimbursementRule.query.count() == 5
+    assert stages[0].stage == "price_events"
+    assert stages[0].rows == 6
+    # Expired rules do not apply.
+    assert {pricing.amount for pricing in models.Pricing.query} == {-1000}
+
+
+@mock.patch("pcapi.core.finance.api._generate_invoice_html")
+@mock.patch("pcapi.core.finance.api._store_invoice_pdf")
+@clean_temporary_files
+@pytest.mark.parametrize("flag", benchmark.COMPARABLE_FEATURES)
+def test_compare(_mocked1, _mocked2, flag):
+    assert not flag.is_active()
+
+    results = benchmark.compare(flag, offerers=2, bookings_per_offerer=3)
+
+    assert set(results) == {False, True}
+    for stages in results.values():
+        assert [(stage.stage, stage.rows) for stage in stages][:2] == [("price_events", 6), ("generate_cashflows", 2)]
+    assert not flag.is_active()
+    assert models.Pricing.query.count() == 12
+    assert models.Cashflow.query.count() == 4
@@ -0,0 +1,82 @@
+import datetime
+import logging
+
+import pytest
+import sqlalchemy as sqla
+
+from pcapi.core.finance import api
+from pcapi.core.finance import factories
+from pcapi.core.finance import metrics
+import pcapi.core.offerers.factories as offerers_factories
+from pcapi.models import db
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+class MeasureStageTest:
+    def test_basics(self, caplog):
+        venue = offerers_factories.VenueFactory()
+
+        with caplog.at_level(logging.INFO):
+            with metrics.record_stages() as stages:
+                with metrics.measure_stage("some_stage", {"batch": 1}):
+                    api.lock_pricing_point(venue.id)
+                    db.session.execute(sqla.text("SELECT 1"))
+                    metrics.add_rows(3)
+
+        [stage] = stages
+        assert stage.stage == "some_stage"
+        assert stage.rows == 3
+        assert stage.queries == 2  # lock and SELECT
+        assert stage.lock_waits == 1
+        assert stage.elapsed >= stage.lock_wait_time > 0
+        record = [record for record in caplog.records if record.message == "Measured finance pipeline stage"][-1]
+        assert record.extra["stage"] == "some_stage"
+        assert record.extra["batch"] == 1
+        assert record.extra["rows"] == 3
+
+    def test_nested_stages(self):
+        with metrics.record_stages() as stages:
+            with metrics.measure_stage("outer"):
+                db.session.execute(sqla.text("SELECT 1"))
+                with metrics.measure_stage("inner"):
+                    db.session.execute(sqla.text("SELECT 1"))
+                    metrics.add_rows(1)
+
+        assert [(stage.stage, stage.rows, stage.queries) for stage in stages] == [("inner", 1, 1), ("outer", 0, 1)]
+
+    def test_listen_to_queries_only_within_stages(self):
+        def is_listening():
+            return sqla.event.contains(sqla.engine.Engine, "after_cursor_execute", metrics._count_query)
+
+        assert not is_listening()
+        with metrics.measure_stage("outer"):
+            with metrics.measure_stage("inner"):
+                assert is_listening()
+            assert is_listening()
+        assert not is_listening()
+
+    def test_outside_any_stage(self):
+        venue = offerers_factories.VenueFactory()
+        with metrics.record_stages() as stages:
+            api.lock_pricing_point(venue.id)
+            metrics.add_rows(1)
+        assert stages == []
+
+    def test_price_events(self):
+        few_minutes_ago = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+        for _ in range(2):
+            factories.UsedBookingFinanceEventFactory(
+                booking__dateUsed=few_minutes_ago,
+                booking__stock__offer__venue__pricing_point="self",
+            )
+
+        with metrics.record_stages() as stages:
+            api.price_events(min_date=few_minutes_ago)
+
+        [stage] = stages
+        assert stage.stage == "price_events"
+        assert stage.rows == 2
+        assert stage.lock_waits == 2
+        assert stage.queries > 0
@@ -3124,6 +3124,39 @@ class UpdateStockQuantityToMatchCinemaVenueProviderRemainingPlacesTest:
         )
 
 
+@pytest.mark.usefixtures("db_session")
+class RefreshCinemaStockQuantityTest:
+    @patch("pcapi.core.offers.api.update_stock_quantity_to_match_cinema_venue_provider_remaining_places")
+    def test_update_synchronously(self, mocked_update):
+        offer = factories.EventOfferFactory()
+
+        api.refresh_cinema_stock_quantity(offer)
+
+        mocked_update.assert_called_once_with(offer)
+
+    @override_features(WIP_ASYNC_CINEMA_STOCK_REFRESH=True)
+    @patch("pcapi.workers.refresh_cinema_stock_quantity_job.refresh_cinema_stock_quantity_job.delay")
+    @patch("pcapi.core.offers.api.update_stock_quantity_to_match_cinema_venue_provider_remaining_places")
+    def test_enqueue_job_once_per_interval(self, mocked_update, mocked_delay, app):
+        offer = factories.EventOfferFactory()
+        other_offer = factories.EventOfferFactory()
+
+        api.refresh_cinema_stock_quantity(offer)
+        api.refresh_cinema_stock_quantity(offer)
+        api.refresh_cinema_stock_quantity(other_offer)
+
+        mocked_update.assert_not_called()
+        assert mocked_delay.call_args_list == [((offer.id,),), ((other_offer.id,),)]
+        ttl = app.redis_client.ttl(f"{api.CINEMA_STOCK_REFRESH_KEY_PREFIX}{offer.id}")
+        assert 0 < ttl <= settings.CINEMA_STOCK_REFRESH_INTERVAL
+
+        # Once the interval has elapsed, the job is enqueued again.
+        app.redis_client.delete(f"{api.CINEMA_STOCK_REFRESH_KEY_PREFIX}{offer.id}")
+        api.refresh_cinema_stock_quantity(offer)
+        assert mocked_delay.call_args_list[-1] == ((offer.id,),)
+        assert mocked_delay.call_count == 3
+
+
 @pytest.mark.usefixtures("db_session")
 class ApproveProductAndRejectedOffersTest:
     @mock.patch("pcapi.core.search.async_index_offer_ids")
@@ -308,6 +308,18 @@ class IndexOffersInQueueTest:
         assert mocked_reindex_offer_ids.call_count == 3
         assert app.redis_client.scard(queue) == 0
 
+    def test_multiple_workers(self, mocked_reindex_offer_ids, app):
+        queue = algolia.REDIS_OFFER_IDS_NAME
+        items = list(range(1, 21))
+        app.redis_client.sadd(queue, *items)
+
+        search.index_offers_in_queue(stop_only_when_empty=True, workers=3)
+
+        # Workers pop disjoint batches: each offer is indexed exactly once.
+        indexed = [offer_id for call in mocked_reindex_offer_ids.call_args_list for offer_id in call.args[0]]
+        assert sorted(indexed) == items
+        assert app.redis_client.scard(queue) == 0
+
 
 @override_features(ENABLE_VENUE_STRICT_SEARCH=True)
 def test_unindex_offer_ids(app):
@@ -404,3 +416,28 @@ def test_booking_count_for_movies():
     search.reindex_offer_ids([offer.id])
 
     assert search_testing.search_store["offers"][offer.id]["offer"].get("last30DaysBookings") == 1
+
+
+@override_features(WIP_USE_OFFER_BOOKING_COUNT=True)
+def test_booking_count_for_movies_from_daily_counts():
+    product = offers_factories.ProductFactory(subcategoryId=subcategories_v2.SEANCE_CINE.id)
+    offer = offers_factories.OfferFactory(product=product)
+    bookings_factories.BookingFactory(stock__offer=offer)
+    bookings_factories.CancelledBookingFactory(stock__offer=offer)
+
+    assert search.get_last_x_days_bookings_for_movies() == {product.id: 1}
+
+
+@override_features(WIP_USE_OFFER_BOOKING_COUNT=True)
+def test_get_offers_booking_count_by_id_from_daily_counts():
+    offer = offers_factories.OfferFactory()
+    bookings_factories.BookingFactory(stock__offer=offer)
+    bookings_factories.BookingFactory(stock__offer=offer)
+    bookings_factories.BookingFactory(
+        stock__offer=offer,
+        dateCreated=datetime.datetime.utcnow() - datetime.timedelta(days=31),
+    )
+    inactive_offer = offers_factories.OfferFactory(isActive=False)
+    bookings_factories.BookingFactory(stock__offer=inactive_offer)
+
+    assert search.get_offers_booking_count_by_id([offer.id, inactive_offer.id]) == {offer.id: 2}
@@ -1,5 +1,6 @@
 import dataclasses
 import datetime
+import re
 
 import pytest
 import requests_mock
@@ -19,6 +20,9 @@ def get_backend():
     return algolia.AlgoliaBackend()
 
 
+GET_OBJECTS_URL = re.compile(r"https://dummy-app-id-dsn\.algolia\.net/1/indexes/(\*|%2A)/objects")
+
+
 @dataclasses.dataclass
 class FakeOffer:
     id: int
@@ -148,6 +152,84 @@ def test_index_offers(app):
     assert backend.check_offer_is_indexed(offer)
 
 
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_skips_or_partially_updates_known_offers(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer], {offer.id: 0})
+        assert posted.call_count == 1
+
+        # Nothing has changed: nothing is sent.
+        backend.index_offers([offer], {offer.id: 0})
+        assert posted.call_count == 1
+
+        # Only the "offer" attribute is sent.
+        mock.post(GET_OBJECTS_URL, json={"results": [{"objectID": str(offer.id)}]})
+        offer.name = "Nouveau nom"
+        backend.index_offers([offer], {offer.id: 0})
+        assert posted.call_count == 2
+        posted_json = posted.last_request.json()
+        assert posted_json["requests"][0]["action"] == "partialUpdateObjectNoCreate"
+        assert posted_json["requests"][0]["body"].keys() == {"objectID", "offer"}
+        assert posted_json["requests"][0]["body"]["offer"]["name"] == "Nouveau nom"
+
+    # Digests are stored apart from the list of indexed offers.
+    assert app.redis_client.hget(algolia.REDIS_HASHMAP_INDEXED_OFFERS_NAME, str(offer.id)) == ""
+    assert app.redis_client.hget(algolia._get_indexed_offer_digests_key(), str(offer.id))
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_fully_saves_offers_when_digests_are_renewed(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer], {offer.id: 0})
+        app.redis_client.delete(algolia._get_indexed_offer_digests_key())  # e.g. a new week has begun
+
+        backend.index_offers([offer], {offer.id: 0})
+
+        assert posted.call_count == 2
+        assert posted.last_request.json()["requests"][0]["action"] == "updateObject"
+
+
+@pytest.mark.usefixtures("db_session")
+def test_index_offers_fully_saves_known_offers_missing_from_algolia(app):
+    backend = get_backend()
+    offer = offers_factories.StockFactory().offer
+    with requests_mock.Mocker() as mock:
+        posted = mock.post("https://dummy-app-id.algolia.net/1/indexes/offers/batch", json={})
+        backend.index_offers([offer], {offer.id: 0})
+        # The digest of the offer is kept, but its document has been
+        # deleted from Algolia (e.g. the deletion has been lost).
+        fetched = mock.post(GET_OBJECTS_URL, json={"results": [None]})
+
+        offer.name = "Nouveau nom"
+        backend.index_offers([offer], {offer.id: 0})
+
+        assert fetched.last_request.json()["requests"][0]["objectID"] == str(offer.id)
+        assert posted.call_count == 2
+        posted_json = posted.last_request.json()
+        assert len(posted_json["requests"]) == 1
+        assert posted_json["requests"][0]["action"] == "updateObject"
+        assert "venue" in posted_json["requests"][0]["body"]
+        assert posted_json["requests"][0]["body"]["offer"]["name"] == "Nouveau nom"
+
+
+def test_get_changed_attributes():
+    previous = {"objectID": 1, "offer": {"name": "A"}, "venue": {"id": 1}}
+    obj = {"objectID": 1, "offer": {"name": "B"}, "venue": {"id": 1}}
+    previous_digest = algolia.get_object_digest(previous)
+    digest = algolia.get_object_digest(obj)
+
+    assert algolia.get_changed_attributes(obj, digest, previous_digest) == ["offer"]
+    assert algolia.get_changed_attributes(obj, digest, digest) == []
+    other = {"objectID": 1, "offer": {"name": "B"}}
+    assert algolia.get_changed_attributes(other, algolia.get_object_digest(other), previous_digest) is None
+
+
 def test_unindex_offer_ids(app):
     backend = get_backend()
     app.redis_client.hset("indexed_offers", "1", "")
@@ -285,6 +367,23 @@ class ProcessingQueueTest:
         # processing queue has been deleted, too.
         assert redis.keys() == []
 
+    @time_machine.travel(datetime.datetime.utcnow(), tick=False)
+    def test_large_batch_is_moved_to_processing_queue(self):
+        # The Lua script adds ids to the processing queue by slices,
+        # make sure that batches larger than a slice are fully moved.
+        backend = get_backend()
+        redis = backend.redis_client
+        queue = algolia.REDIS_OFFER_IDS_NAME
+        redis.sadd(queue, *range(1, 2501))
+
+        with backend.pop_offer_ids_from_queue(2000) as ids:
+            [processing_queue] = redis.keys(f"{queue}:processing:*")
+            assert len(ids) == 2000
+            assert {int(id_) for id_ in redis.smembers(processing_queue)} == ids
+            assert redis.scard(queue) == 500
+
+        assert not redis.exists(processing_queue)
+
     @time_machine.travel(datetime.datetime.utcnow(), tick=False)
     def test_processing_queue_is_kept_upon_error(self):
         backend = get_backend()
@@ -300,18 +399,37 @@ class ProcessingQueueTest:
 
         assert redis.scard(queue) == 0
         timestamp = datetime.datetime.utcnow().timestamp()
-        processing_queue = f"{queue}:processing:{timestamp}"
+        [processing_queue] = redis.keys(f"{queue}:processing:*")
+        assert processing_queue.endswith(f":{timestamp}")
         assert redis.smembers(processing_queue) == {"1", "2", "3"}
 
+    def test_concurrent_pops_use_distinct_processing_queues(self):
+        backend = get_backend()
+        redis = backend.redis_client
+        queue = algolia.REDIS_OFFER_IDS_NAME
+        redis.sadd(queue, "1", "2", "3", "4")
+
+        with time_machine.travel(datetime.datetime.utcnow(), tick=False):
+            with backend.pop_offer_ids_from_queue(2) as first_ids:
+                with backend.pop_offer_ids_from_queue(2) as second_ids:
+                    assert len(redis.keys(f"{queue}:processing:*")) == 2
+                # The first batch is still in its processing queue.
+                [processing_queue] = redis.keys(f"{queue}:processing:*")
+                assert {int(id_) for id_ in redis.smembers(processing_queue)} == first_ids
+
+        assert first_ids | second_ids == {1, 2, 3, 4}
+        assert redis.keys() == []
+
     def test_clean_processing_queues(self):
         backend = get_backend()
         redis = backend.redis_client
         main_queue = algolia.REDIS_OFFER_IDS_NAME
         now = datetime.datetime.utcnow()
         timestamp_old_enough = (now - datetime.timedelta(hours=1)).timestamp()
-        processing_old_enough = f"{main_queue}:processing:{timestamp_old_enough}"
+        processing_old_enough = f"{main_queue}:processing:0123456789abcdef:{timestamp_old_enough}"
         redis.sadd(processing_old_enough, "1", "2", "3")
         timestamp_too_recent = (now - datetime.timedelta(seconds=1)).timestamp()
+        # Queues created before processing queues had a unique suffix.
         processing_too_recent = f"{main_queue}:processing:{timestamp_too_recent}"
         redis.sadd(processing_too_recent, "4", "5", "6")
 
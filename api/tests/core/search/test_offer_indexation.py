@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+from pcapi.core.categories import subcategories_v2 as subcategories
+import pcapi.core.criteria.factories as criteria_factories
+import pcapi.core.offers.factories as offers_factories
+from pcapi.core.search import offer_indexation
+from pcapi.core.search.backends import algolia
+from pcapi.core.testing import assert_num_queries
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def _make_offers():
+    future = datetime.datetime.utcnow() + datetime.timedelta(days=10)
+    past = datetime.datetime.utcnow() - datetime.timedelta(days=10)
+
+    book = offers_factories.OfferFactory(
+        extraData={"author": "Author", "ean": "2221001648", "rayon": "Petits prix "},
+        subcategoryId=subcategories.LIVRE_PAPIER.id,
+        rankingWeight=2,
+        criteria=[
+            criteria_factories.CriterionFactory(name="Coup de coeur"),
+            criteria_factories.CriterionFactory(name="A la une"),
+        ],
+    )
+    offers_factories.StockFactory(offer=book, price=10)
+    offers_factories.StockFactory(offer=book, price=12.5)
+    offers_factories.StockFactory(offer=book, price=5, isSoftDeleted=True)
+
+    event = offers_factories.EventOfferFactory()
+    offers_factories.EventStockFactory(offer=event, beginningDatetime=future, price=0)
+    offers_factories.EventStockFactory(offer=event, beginningDatetime=past)
+    offers_factories.MediationFactory(offer=event, thumbCount=2)
+
+    product = offers_factories.ProductFactory(thumbCount=1)
+    with_product = offers_factories.ThingStockFactory(offer__product=product).offer
+
+    unbookable = offers_factories.OfferFactory()
+
+    return [book, event, with_product, unbookable]
+
+
+def test_same_documents_as_orm_path():
+    offers = _make_offers()
+    offer_ids = [offer.id for offer in offers]
+    expected = {
+        offer.id: algolia.AlgoliaBackend.serialize_offer(offer, 3) for offer in offers if offer.is_eligible_for_search
+    }
+
+    offers_data = offer_indexation.get_offers_data_for_indexation(offer_ids)
+
+    assert {data.id: data.is_eligible_for_search for data in offers_data} == {
+        offer.id: offer.is_eligible_for_search for offer in offers
+    }
+    serialized = {
+        data.id: algolia.AlgoliaBackend.serialize_offer_data(data, 3)
+        for data in offers_data
+        if data.is_eligible_for_search
+    }
+    assert serialized == expected
+    # Tags are sorted in both paths, whatever their insertion order.
+    assert serialized[offers[0].id]["offer"]["tags"] == ["A la une", "Coup de coeur"]
+
+
+def test_number_of_queries():
+    offer_ids = [offer.id for offer in _make_offers()]
+
+    # 1 query for offers and their related data
+    # 1 query for book macro sections
+    with assert_num_queries(2):
+        offer_indexation.get_offers_data_for_indexation(offer_ids)
@@ -8,6 +8,7 @@ import pcapi.core.bookings.factories as bookings_factories
 from pcapi.core.bookings.models import Booking
 from pcapi.core.categories import subcategories_v2 as subcategories
 import pcapi.core.educational.factories as educational_factories
+import pcapi.core.finance.api as finance_api
 import pcapi.core.finance.factories as finance_factories
 import pcapi.core.finance.models as finance_models
 import pcapi.core.offerers.factories as offerers_factories
@@ -461,6 +462,34 @@ class CustomRuleFinderTest:
         assert finder.get_rule(ancient_booking) is None  # outside `rule.timespan`
         assert finder.get_rule(another_booking) is None  # no rule for this offer
 
+    def test_successive_rules(self):
+        now = datetime.utcnow()
+        booking = bookings_factories.UsedBookingFactory(stock__offer__venue__pricing_point="self")
+        old_booking = bookings_factories.UsedBookingFactory(stock=booking.stock, dateUsed=now - timedelta(days=15))
+        ancient_booking = bookings_factories.UsedBookingFactory(stock=booking.stock, dateUsed=now - timedelta(days=45))
+        ancient_rule = finance_factories.CustomReimbursementRuleFactory(
+            venue=booking.venue, rate=Decimal("0.5"), timespan=(now - timedelta(days=60), now - timedelta(days=30))
+        )
+        current_rule = finance_factories.CustomReimbursementRuleFactory(
+            venue=booking.venue, rate=Decimal("0.7"), timespan=(now - timedelta(days=10), None)
+        )
+
+        finder = reimbursement.CustomRuleFinder()
+        assert finder.get_rule(booking) == current_rule
+        assert finder.get_rule(old_booking) is None  # between both rules
+        assert finder.get_rule(ancient_booking) == ancient_rule
+
+    def test_is_outdated(self):
+        offer = offers_factories.OfferFactory()
+        finder = reimbursement.CustomRuleFinder()
+        assert not finder.is_outdated()
+
+        start_date = datetime.utcnow() + timedelta(days=2)
+        finance_api.create_offer_reimbursement_rule(offer.id, amount=Decimal(5), start_date=start_date)
+
+        assert finder.is_outdated()
+        assert not reimbursement.CustomRuleFinder().is_outdated()
+
 
 def assert_total_reimbursement(booking_reimbursement, rule, booking):
     assert booking_reimbursement.booking == booking
@@ -8,8 +8,10 @@ import pcapi.core.offers.factories as offers_factories
 import pcapi.core.offers.models as offers_models
 import pcapi.core.providers.factories as providers_factories
 import pcapi.core.providers.models as providers_models
+from pcapi.core.testing import override_features
 from pcapi.local_providers.local_provider import _upload_thumb
 from pcapi.local_providers.providable_info import ProvidableInfo
+from pcapi.local_providers.thumb_pipeline import ThumbPipeline
 from pcapi.models.api_errors import ApiErrors
 from pcapi.repository import repository
 from pcapi.utils.human_ids import humanize
@@ -111,6 +113,33 @@ class UpdateObjectsTest:
         assert product.name == "Old product name"
         assert product.dateModifiedAtLastProvider == datetime(2020, 1, 1)
 
+    @override_features(WIP_LOCAL_PROVIDERS_BATCH_LOOKUP=True)
+    @patch("tests.local_providers.provider_test_utils.TestLocalProvider.__next__")
+    def test_batch_lookup_of_existing_objects(self, next_function):
+        provider = providers_factories.AllocineProviderFactory(localClass="TestLocalProvider")
+        providable_infos = [
+            ProvidableInfo(id_at_providers=str(i), date_modified_at_provider=datetime(2018, 1, 1)) for i in range(3)
+        ]
+        for providable_info in providable_infos[:2]:
+            offers_factories.ThingProductFactory(
+                dateModifiedAtLastProvider=datetime(2000, 1, 1),
+                lastProvider=provider,
+                idAtProviders=providable_info.id_at_providers,
+                name="Old product name",
+            )
+        local_provider = provider_test_utils.TestLocalProvider()
+        next_function.side_effect = [providable_infos]
+
+        with patch.object(local_provider, "get_existing_objects", wraps=local_provider.get_existing_objects) as lookup:
+            local_provider.updateObjects()
+
+        lookup.assert_called_once()
+        assert local_provider.updatedObjects == 2
+        assert local_provider.createdObjects == 1
+        products = offers_models.Product.query.order_by(offers_models.Product.idAtProviders).all()
+        assert [product.idAtProviders for product in products] == ["0", "1", "2"]
+        assert {product.name for product in products} == {"New Product"}
+
     @patch("tests.local_providers.provider_test_utils.TestLocalProvider.__next__")
     def test_does_not_update_objects_when_venue_provider_is_not_active(self, next_function):
         # Given
@@ -277,6 +306,48 @@ class HandleThumbTest:
         assert local_provider.createdThumbs == 1
         assert product.thumbCount == 1
 
+    @override_features(WIP_CONCURRENT_PROVIDER_THUMBS=True)
+    @patch("tests.local_providers.provider_test_utils.TestLocalProviderWithThumb.__next__")
+    def test_thumbs_are_processed_in_pipeline(self, next_function):
+        provider = providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithThumb")
+        providable_info = ProvidableInfo(date_modified_at_provider=datetime(2018, 1, 1))
+        product = offers_factories.ThingProductFactory(
+            dateModifiedAtLastProvider=datetime(2000, 1, 1),
+            idAtProviders=providable_info.id_at_providers,
+            lastProvider=provider,
+            thumbCount=0,
+        )
+        local_provider = provider_test_utils.TestLocalProviderWithThumb()
+        next_function.side_effect = [[providable_info]]
+
+        local_provider.updateObjects()
+
+        product = offers_models.Product.query.one()
+        assert product.thumbCount == 1
+        assert local_provider.checkedThumbs == 1
+        assert local_provider.createdThumbs == 1
+        assert local_provider.erroredThumbs == 0
+
+    @override_features(WIP_CONCURRENT_PROVIDER_THUMBS=True)
+    @patch("tests.local_providers.provider_test_utils.TestLocalProviderWithThumb.__next__")
+    def test_thumb_pipeline_is_shut_down_on_error(self, next_function):
+        provider = providers_factories.AllocineProviderFactory(localClass="TestLocalProviderWithThumb")
+        providable_info = ProvidableInfo(date_modified_at_provider=datetime(2018, 1, 1))
+        offers_factories.ThingProductFactory(
+            dateModifiedAtLastProvider=datetime(2000, 1, 1),
+            idAtProviders=providable_info.id_at_providers,
+            lastProvider=provider,
+            thumbCount=0,
+        )
+        local_provider = provider_test_utils.TestLocalProviderWithThumb()
+        next_function.side_effect = [[providable_info], ValueError("provider error")]
+
+        with patch.object(ThumbPipeline, "shutdown", autospec=True, side_effect=ThumbPipeline.shutdown) as shutdown:
+            with pytest.raises(ValueError):
+                local_provider.updateObjects()
+
+        shutdown.assert_called_once()
+
 
 @pytest.mark.usefixtures("db_session")
 class UploadThumbTest:
@@ -5,13 +5,16 @@ import flask
 import pytest
 
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_settings
 from pcapi.models import db
+from pcapi.models import feature as feature_module
 from pcapi.models.feature import FEATURES_DISABLED_BY_DEFAULT
 from pcapi.models.feature import Feature
 from pcapi.models.feature import FeatureToggle
 from pcapi.models.feature import check_feature_flags_completeness
 from pcapi.models.feature import clean_feature_flags
 from pcapi.models.feature import install_feature_flags
+from pcapi.models.feature import invalidate_features_cache
 from pcapi.repository import repository
 
 
@@ -59,7 +62,7 @@ class FeatureToggleTest:
         repository.save(feature)
         context = flask._request_ctx_stack.pop()
 
-        # we don't cache yet outside the scope of a request so it'll be 3 DB queries
+        # the snapshot of features is disabled in tests (FEATURES_CACHE_TTL=0), so it'll be 3 DB queries
         try:
             with assert_num_queries(3):
                 FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
@@ -76,6 +79,58 @@ class FeatureToggleTest:
             FeatureToggle.ALGOLIA_BOOKINGS_NUMBER_COMPUTATION.is_active()
 
 
+@pytest.mark.usefixtures("db_session")
+@override_settings(FEATURES_CACHE_TTL=60, FEATURES_CACHE_MAX_AGE=300)
+class FeaturesSnapshotTest:
+    @pytest.fixture(autouse=True)
+    def outside_request_context(self):
+        invalidate_features_cache()
+        context = flask._request_ctx_stack.pop()
+        try:
+            yield
+        finally:
+            flask._request_ctx_stack.push(context)
+
+    def test_snapshot_is_shared_outside_request_context(self):
+        with assert_num_queries(1):
+            FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+            FeatureToggle.DISABLE_CGR_EXTERNAL_BOOKINGS.is_active()
+
+    def test_invalidation(self):
+        Feature.query.filter_by(name=FeatureToggle.SYNCHRONIZE_ALLOCINE.name).update({"isActive": True})
+        assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+        Feature.query.filter_by(name=FeatureToggle.SYNCHRONIZE_ALLOCINE.name).update({"isActive": False})
+        assert FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()  # not reloaded yet
+
+        invalidate_features_cache()
+        assert not FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_version_is_checked_after_ttl(self, app):
+        with patch("time.monotonic", return_value=1000):
+            FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+        # Same version: no query
+        with patch("time.monotonic", return_value=1061):
+            with assert_num_queries(0):
+                FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+        # Another process has toggled a flag.
+        app.redis_client.incr(feature_module.FEATURES_VERSION_KEY)
+        with patch("time.monotonic", return_value=1122):
+            with assert_num_queries(1):
+                FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+    def test_snapshot_is_reloaded_after_max_age(self):
+        with patch("time.monotonic", return_value=1000):
+            FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+        with patch("time.monotonic", return_value=1301):
+            with assert_num_queries(1):
+                FeatureToggle.SYNCHRONIZE_ALLOCINE.is_active()
+
+
 @pytest.mark.usefixtures("db_session")
 class FeatureTest:
     def test_features_installation(self):
@@ -1129,6 +1129,35 @@ class OffersV2Test:
         assert stock.remainingQuantity == 0
         assert response.json["stocks"][0]["isSoldOut"]
 
+    @override_features(ENABLE_CDS_IMPLEMENTATION=True, WIP_ASYNC_CINEMA_STOCK_REFRESH=True)
+    @patch("pcapi.workers.refresh_cinema_stock_quantity_job.refresh_cinema_stock_quantity_job.delay")
+    @patch("pcapi.core.offers.api.external_bookings_api.get_shows_stock")
+    def test_get_cds_sync_offer_enqueues_stock_refresh(self, mocked_get_shows_stock, mocked_delay, client):
+        cds_provider = get_provider_by_local_class("CDSStocks")
+        venue_provider = providers_factories.VenueProviderFactory(provider=cds_provider)
+        cinema_provider_pivot = providers_factories.CinemaProviderPivotFactory(
+            venue=venue_provider.venue,
+            provider=venue_provider.provider,
+            idAtProvider=venue_provider.venueIdAtOfferProvider,
+        )
+        providers_factories.CDSCinemaDetailsFactory(cinemaProviderPivot=cinema_provider_pivot)
+
+        offer_id_at_provider = f"54%{venue_provider.venue.siret}"
+        offer = offers_factories.OfferFactory(
+            subcategoryId=subcategories.SEANCE_CINE.id,
+            idAtProvider=offer_id_at_provider,
+            lastProviderId=venue_provider.providerId,
+            venue=venue_provider.venue,
+        )
+        offers_factories.EventStockFactory(offer=offer, idAtProviders=f"{offer_id_at_provider}#5008", quantity=10)
+
+        response = client.get(f"/native/v2/offer/{offer.id}")
+
+        assert response.status_code == 200
+        assert not response.json["stocks"][0]["isSoldOut"]
+        mocked_get_shows_stock.assert_not_called()
+        mocked_delay.assert_called_once_with(offer.id)
+
     @time_machine.travel("2023-01-01")
     @override_features(ENABLE_BOOST_API_INTEGRATION=True)
     @patch("pcapi.connectors.boost.requests.get")
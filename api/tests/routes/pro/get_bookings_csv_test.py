@@ -1,7 +1,11 @@
+import datetime
+
 import pytest
 
+import pcapi.core.bookings.factories as bookings_factories
 import pcapi.core.offerers.factories as offerers_factories
 from pcapi.core.offers import factories as offers_factories
+from pcapi.core.testing import override_features
 
 
 pytestmark = pytest.mark.usefixtures("db_session")
@@ -18,3 +22,22 @@ class Returns401Test:
         )
         assert response.status_code == 403
         assert response.json == {"global": "You are not allowed to access this offer"}
+
+
+class Returns200Test:
+    def test_streamed_export(self, client):
+        user_offerer = offerers_factories.UserOffererFactory()
+        stock = offers_factories.EventStockFactory(
+            offer__venue__managingOfferer=user_offerer.offerer, beginningDatetime=datetime.datetime(2030, 6, 1, 18)
+        )
+        bookings_factories.BookingFactory(stock=stock)
+        url = f"/bookings/offer/{stock.offerId}/csv?event_date=2030-06-01&status=all"
+        client = client.with_session_auth(user_offerer.user.email)
+        expected = client.get(url).data
+
+        with override_features(WIP_STREAMED_BOOKING_EXPORTS=True):
+            response = client.get(url)
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "text/csv; charset=utf-8;"
+        assert response.data == expected
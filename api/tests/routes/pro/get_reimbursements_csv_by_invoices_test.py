@@ -6,13 +6,16 @@ import pytest
 
 from pcapi.core.bookings import models as bookings_models
 from pcapi.core.educational import models as educational_models
+import pcapi.core.finance.api as finance_api
 import pcapi.core.finance.factories as finance_factories
 import pcapi.core.finance.models as finance_models
 import pcapi.core.offerers.factories as offerers_factories
 from pcapi.core.offers import models as offers_models
 from pcapi.core.testing import AUTHENTICATION_QUERIES
 from pcapi.core.testing import assert_num_queries
+from pcapi.core.testing import override_features
 import pcapi.core.users.factories as users_factories
+from pcapi.models import db
 from pcapi.routes.serialization.reimbursement_csv_serialize import ReimbursementDetails
 from pcapi.utils.date import utc_datetime_to_department_timezone
 
@@ -111,6 +114,47 @@ def test_with_pricings(client):
     assert row["Montant remboursé"] == "{:.2f}".format(-pricing.amount / 100).replace(".", ",")
 
 
+@override_features(WIP_USE_STORED_REIMBURSEMENT_DETAILS=True)
+def test_with_stored_reimbursement_details(client):
+    offerer = offerers_factories.OffererFactory()
+    batch = finance_factories.CashflowBatchFactory()
+    invoices = []
+    for _ in range(2):
+        venue = offerers_factories.VenueFactory(managingOfferer=offerer, pricing_point="self")
+        bank_account = finance_factories.BankAccountFactory(offerer=offerer)
+        invoice = finance_factories.InvoiceFactory(bankAccount=bank_account)
+        cashflow = finance_factories.CashflowFactory(batch=batch, bankAccount=bank_account, invoices=[invoice])
+        finance_factories.PricingFactory(
+            booking__stock__offer__venue=venue, status=finance_models.PricingStatus.INVOICED, cashflows=[cashflow]
+        )
+        invoices.append(invoice)
+    pro = users_factories.ProFactory()
+    offerers_factories.UserOffererFactory(user=pro, offerer=offerer)
+    client = client.with_session_auth(pro.email)
+    url = f"/v2/reimbursements/csv?invoicesReferences={invoices[0].reference}"
+
+    # Details have not been stored yet: they are computed.
+    computed_csv = client.get(url).data
+
+    finance_api.store_reimbursement_details(batch)
+    # Stored details are not computed again.
+    invoices[0].bankAccount.label = "Nouvel intitulé"
+    db.session.flush()
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.data == computed_csv
+    assert b"Nouvel intitul" not in response.data
+
+    # An invoice without stored details is computed.
+    finance_models.InvoiceReimbursementDetails.query.filter_by(invoiceId=invoices[1].id).delete()
+    response = client.get(f"{url}&invoicesReferences={invoices[1].reference}")
+
+    rows = list(csv.DictReader(StringIO(response.data.decode("utf-8-sig")), delimiter=";"))
+    assert [row["N° du justificatif"] for row in rows] == [invoice.reference for invoice in invoices]
+    assert rows[1]["Intitulé du compte bancaire"] == invoices[1].bankAccount.label
+
+
 def test_with_pricings_collective_use_case(client):
     offerer = offerers_factories.OffererFactory()
     venue1 = offerers_factories.VenueFactory(managingOfferer=offerer, pricing_point="self")
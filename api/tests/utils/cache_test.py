@@ -1,7 +1,12 @@
+import json
+import time
 from unittest.mock import MagicMock
+from unittest.mock import patch
 
 from pcapi.routes.serialization import BaseModel
+from pcapi.utils import cache as cache_module
 from pcapi.utils.cache import _CacheProxy
+from pcapi.utils.cache import _LocalCache
 from pcapi.utils.cache import _compute_arguments_hash
 from pcapi.utils.cache import _view_retriever
 from pcapi.utils.cache import cached_view
@@ -172,3 +177,131 @@ class GetFromCacheTest:
         assert result1 != result2
         assert result2 == "pouet2"
         retriever.assert_called_once()
+
+
+class LocalCacheTest:
+    def test_local_cache(self, app):
+        retriever = MagicMock(return_value="pouet")
+        result1 = get_from_cache(key_template="test_local_cache", retriever=retriever, local_ttl=60)
+        app.redis_client.set("test_local_cache", "pouet2")
+        result2 = get_from_cache(key_template="test_local_cache", retriever=retriever, local_ttl=60)
+        result3 = get_from_cache(key_template="test_local_cache", retriever=retriever)
+
+        assert result1 == result2 == "pouet"
+        assert result3 == "pouet2"
+        retriever.assert_called_once()
+
+    def test_local_cache_is_updated_on_force_update(self):
+        get_from_cache(key_template="test_local_cache", retriever=MagicMock(return_value="pouet"), local_ttl=60)
+        get_from_cache(
+            key_template="test_local_cache",
+            retriever=MagicMock(return_value="pouet2"),
+            local_ttl=60,
+            force_update=True,
+        )
+        result = get_from_cache(key_template="test_local_cache", retriever=MagicMock(), local_ttl=60)
+
+        assert result == "pouet2"
+
+    def test_parsed_data_is_shared(self):
+        retriever = MagicMock(return_value=DummySerializer(one=1, two="2"))
+        result1 = get_from_cache(
+            key_template="test_local_cache", retriever=retriever, return_type=BaseModel, local_ttl=60
+        )
+        result2 = get_from_cache(
+            key_template="test_local_cache", retriever=retriever, return_type=BaseModel, local_ttl=60
+        )
+
+        assert result1 is result2
+        assert result2.one == 1
+
+    def test_lru_eviction(self):
+        cache = _LocalCache(max_size=2)
+        cache.set("a", _CacheProxy("1"), ttl=60)
+        cache.set("b", _CacheProxy("2"), ttl=60)
+        cache.get("a")
+        cache.set("c", _CacheProxy("3"), ttl=60)
+
+        assert cache.get("a").json() == "1"
+        assert cache.get("b") is None
+        assert cache.get("c").json() == "3"
+
+    def test_expiration(self):
+        cache = _LocalCache(max_size=2)
+        cache.set("a", _CacheProxy("1"), ttl=60)
+
+        with patch("time.monotonic", return_value=time.monotonic() + 61):
+            assert cache.get("a") is None
+
+    def test_invalidation(self):
+        cache_module._local_cache.set("a", _CacheProxy("1"), ttl=60)
+
+        cache_module._on_invalidation({"type": "message", "channel": cache_module.INVALIDATION_CHANNEL, "data": "a"})
+
+        assert cache_module._local_cache.get("a") is None
+
+
+class SingleFlightTest:
+    def _store_expired(self, app, key, data):
+        metadata = json.dumps({"expires_at": time.time() - 1, "compute_duration": 0.1})
+        app.redis_client.set(key, data)
+        app.redis_client.set(f"{key}:metadata", metadata)
+
+    def test_fresh_data(self, app):
+        get_from_cache(key_template="test_single_flight", retriever=MagicMock(return_value="pouet"), single_flight=True)
+        retriever = MagicMock(return_value="pouet2")
+        result = get_from_cache(key_template="test_single_flight", retriever=retriever, single_flight=True)
+
+        assert result == "pouet"
+        retriever.assert_not_called()
+        assert app.redis_client.ttl("test_single_flight") > 60 * 60 * 24
+        assert not app.redis_client.exists("test_single_flight:lock")
+
+    def test_expired_data_is_recomputed(self, app):
+        self._store_expired(app, "test_single_flight", "pouet")
+
+        result = get_from_cache(
+            key_template="test_single_flight", retriever=MagicMock(return_value="pouet2"), single_flight=True
+        )
+
+        assert result == "pouet2"
+        metadata = json.loads(app.redis_client.get("test_single_flight:metadata"))
+        assert metadata["expires_at"] > time.time()
+        assert not app.redis_client.exists("test_single_flight:lock")
+
+    def test_stale_data_is_served_while_recomputed(self, app):
+        self._store_expired(app, "test_single_flight", "pouet")
+        app.redis_client.set("test_single_flight:lock", "1")
+        retriever = MagicMock(return_value="pouet2")
+
+        result = get_from_cache(key_template="test_single_flight", retriever=retriever, single_flight=True)
+
+        assert result == "pouet"
+        retriever.assert_not_called()
+
+    @patch("pcapi.utils.cache.SINGLE_FLIGHT_LOCK_TIMEOUT", 0)
+    def test_missing_data_with_stale_lock(self, app):
+        app.redis_client.set("test_single_flight:lock", "1")
+
+        result = get_from_cache(
+            key_template="test_single_flight", retriever=MagicMock(return_value="pouet"), single_flight=True
+        )
+
+        assert result == "pouet"
+        # The lock is not ours.
+        assert app.redis_client.exists("test_single_flight:lock")
+
+    def test_lock_taken_by_another_caller_is_not_released(self, app):
+        def retriever():
+            # Our lock has expired while computing, and another caller has taken it.
+            app.redis_client.set("test_single_flight:lock", "other")
+            return "pouet"
+
+        result = get_from_cache(key_template="test_single_flight", retriever=retriever, single_flight=True)
+
+        assert result == "pouet"
+        assert app.redis_client.get("test_single_flight:lock") == "other"
+
+    def test_early_refresh(self):
+        assert not cache_module._should_refresh_early(expires_at=time.time() + 60 * 60, compute_duration=0.1)
+        assert cache_module._should_refresh_early(expires_at=time.time() - 1, compute_duration=0.1)
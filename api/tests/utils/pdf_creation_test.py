@@ -50,3 +50,31 @@ class GeneratePdfFromHtmlTest:
         # the first run, but it often failed on CI, even though
         # debugging statements showed that the cache was used (and
         # thus that the second run should be faster).
+
+    def test_shared_cache(self, tmp_path, css_font_http_request_mock):
+        fetcher = pdf.CachingUrlFetcher(cache_dir=tmp_path)
+        url = "https://fonts.googleapis.com/css2?family=Montserrat"
+        fetcher.fetch_url(url)
+
+        # Another fetcher (of another process) uses the same cache.
+        with mock.patch("weasyprint.default_url_fetcher") as mocked_fetcher:
+            result = pdf.CachingUrlFetcher(cache_dir=tmp_path).fetch_url(url)
+        mocked_fetcher.assert_not_called()
+        assert result["string"] == b""
+
+        fetcher.delete_cache()
+        assert list(tmp_path.iterdir())  # a shared cache is not deleted
+
+
+class PdfRendererPoolTest:
+    def test_basics(self):
+        # Renderers run in other processes, where HTTP requests cannot
+        # be mocked: use an HTML document without any external resource.
+        html = "<p>Trust me, I am an invoice.</p>"
+        with pdf.PdfRendererPool(max_workers=2, warmup_html=html) as pool:
+            futures = [pool.submit(html) for _ in range(3)]
+            results = [future.result() for future in futures]
+
+        for result in results:
+            assert result.content.startswith(b"%PDF")
+            assert result.elapsed > 0
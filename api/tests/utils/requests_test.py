@@ -67,6 +67,21 @@ def test_wrapper_keeps_timeout_if_given(requests_mock):
     assert requests_mock.last_request.timeout == 2
 
 
+def test_track_calls(requests_mock):
+    requests_mock.get("https://example.com")
+
+    with requests.track_calls(default_timeout=3) as durations:
+        requests.get("https://example.com")
+        assert requests_mock.last_request.timeout == 3
+        requests.get("https://example.com", timeout=2)
+        assert requests_mock.last_request.timeout == 2
+
+    assert len(durations) == 2
+    requests.get("https://example.com")
+    assert requests_mock.last_request.timeout == 10
+    assert len(durations) == 2
+
+
 @pytest.mark.parametrize("verb", ["get", "post", "put", "delete"])
 def test_wrapper_is_used_when_calling_verbs(requests_mock, caplog, verb):
     getattr(requests_mock, verb)("https://example.com", text="response")
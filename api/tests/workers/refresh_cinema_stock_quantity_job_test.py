@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+import pytest
+
+import pcapi.core.offers.factories as offers_factories
+import pcapi.core.providers.factories as providers_factories
+from pcapi.core.providers.repository import get_provider_by_local_class
+from pcapi.core.testing import override_features
+from pcapi.workers.refresh_cinema_stock_quantity_job import refresh_cinema_stock_quantity_job
+
+
+pytestmark = pytest.mark.usefixtures("db_session")
+
+
+def _create_cds_offer(**kwargs):
+    cds_provider = get_provider_by_local_class("CDSStocks")
+    venue_provider = providers_factories.VenueProviderFactory(provider=cds_provider)
+    cinema_provider_pivot = providers_factories.CinemaProviderPivotFactory(
+        venue=venue_provider.venue,
+        provider=venue_provider.provider,
+        idAtProvider=venue_provider.venueIdAtOfferProvider,
+    )
+    providers_factories.CDSCinemaDetailsFactory(cinemaProviderPivot=cinema_provider_pivot)
+    offer_id_at_provider = f"54%{venue_provider.venue.siret}"
+    offer = offers_factories.EventOfferFactory(
+        idAtProvider=offer_id_at_provider,
+        lastProviderId=venue_provider.providerId,
+        venue=venue_provider.venue,
+        **kwargs,
+    )
+    stock = offers_factories.EventStockFactory(offer=offer, idAtProviders=f"{offer_id_at_provider}#5008")
+    return offer, stock
+
+
+@override_features(ENABLE_CDS_IMPLEMENTATION=True)
+@patch("pcapi.core.offers.api.external_bookings_api.get_shows_stock")
+def test_refresh_cinema_stock_quantity_job(mocked_get_shows_stock):
+    mocked_get_shows_stock.return_value = {5008: 0}
+    offer, stock = _create_cds_offer()
+
+    refresh_cinema_stock_quantity_job(offer.id)
+
+    assert stock.remainingQuantity == 0
+
+
+@override_features(ENABLE_CDS_IMPLEMENTATION=True)
+@patch("pcapi.core.offers.api.external_bookings_api.get_shows_stock")
+def test_ignore_inactive_offer(mocked_get_shows_stock):
+    offer, _ = _create_cds_offer(isActive=False)
+
+    refresh_cinema_stock_quantity_job(offer.id)
+
+    mocked_get_shows_stock.assert_not_called()
+
+
+@patch("pcapi.core.offers.api.external_bookings_api.get_shows_stock")
+def test_ignore_unknown_offer(mocked_get_shows_stock):
+    refresh_cinema_stock_quantity_job(0)
+
+    mocked_get_shows_stock.assert_not_called()